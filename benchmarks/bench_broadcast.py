@@ -0,0 +1,141 @@
+"""Cost of re-broadcasting the frames to many local consumers.
+
+A meter decodes synthetic frames fed at a fixed rate, its frames are
+broadcast on a Unix socket to fast clients reading everything and to
+stalled clients that never read. The encoding is timed once per frame and
+the fan-out to the clients separately, for growing client counts. The fast
+clients must receive every frame, the stalled ones a bounded part. In
+JSON, the values of the last message must be the states of the entities.
+
+    python -m benchmarks.bench_broadcast [--protocol standard] [--format json] [--frames 500]
+                                         [--rate 200] [--clients 1 10 100] [--stalled 2]
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import tempfile
+import time
+
+from teleinfo import broadcast
+from teleinfo.const import BROADCAST_FORMATS, TeleinfoProtocolType
+from teleinfo.sensor import TeleinfoIntegration, SerialProtocol
+
+from .emulator import BAUD_RATES
+from .generator import FrameGenerator
+from .stubs import StubHass, stub_entities
+
+
+class Timed:
+    """Time spent in a function, patched on an instance"""
+
+    def __init__(self, function):
+        self._function = function
+        self.elapsed = 0.0
+        self.calls = 0
+
+    def __call__(self, *args):
+        start = time.perf_counter()
+        try:
+            return self._function(*args)
+        finally:
+            self.elapsed += time.perf_counter() - start
+            self.calls += 1
+
+
+async def read_all(reader, separator, counts, index, last):
+    while True:
+        try:
+            last[index] = await reader.readuntil(separator)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return
+        counts[index] += 1
+
+
+async def measure(args, clients):
+    generator = FrameGenerator(args.protocol)
+    integration = TeleinfoIntegration(port="/dev/ttyUSB0", type=args.protocol)
+    serial_protocol = SerialProtocol(integration.on_frame_received)
+    while not integration.initialyzed:
+        serial_protocol.data_received(generator.frame())
+    stub_entities(integration, StubHass())
+
+    path = os.path.join(tempfile.mkdtemp(), "teleinfo.sock")
+    broadcaster = await broadcast.FrameBroadcaster([integration], args.format).start(path=path)
+    publish = broadcaster.publish = Timed(broadcaster.publish) # Fan-out to the clients
+    encode = broadcaster._publish_values = Timed(broadcaster._publish_values) # Encoding, then fan-out
+
+    separator = b"\n" if args.format == "json" else b"\x03"
+    counts = [0] * clients
+    last = [None] * clients
+    readers = []
+    for index in range(clients):
+        reader, writer = await asyncio.open_unix_connection(path)
+        readers.append((asyncio.create_task(read_all(reader, separator, counts, index, last)), writer))
+    stalled = []
+    for _ in range(args.stalled):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        sock.connect(path)
+        stalled.append(sock)
+    await asyncio.sleep(0.1)
+
+    start = time.perf_counter()
+    for frame in range(args.frames):
+        serial_protocol.data_received(generator.frame())
+        await asyncio.sleep(max(0, start + (frame + 1) / args.rate - time.perf_counter()))
+    await asyncio.sleep(0.5) # Last frames read by the clients
+    current = True
+    if args.format == "json" and clients:
+        # The status register is split in several entities, the other values are the states
+        states = {key: integration._sensors[key].state for key in integration.metrics if key != "STGE"}
+        current = all(message and json.loads(message)["values"].items() >= states.items() for message in last)
+
+    queued = sum(len(client._queue) for client in broadcaster._clients)
+    dropped = sum(client.dropped_frames for client in broadcaster._clients)
+    broadcaster.stop()
+    for task, writer in readers:
+        writer.close()
+        task.cancel()
+    for sock in stalled:
+        sock.close()
+    os.unlink(path)
+    os.rmdir(os.path.dirname(path))
+    encoding = encode.elapsed - publish.elapsed if args.format == "json" else 0.0
+    return {
+        "messages": broadcaster.messages,
+        "encode_us": encoding / max(1, publish.calls) * 1e6,
+        "fan_out_us": publish.elapsed / max(1, publish.calls) * 1e6,
+        "received": min(counts) if counts else 0,
+        "queued": queued,
+        "dropped": dropped,
+        "current": current,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--protocol", choices=list(BAUD_RATES), default=TeleinfoProtocolType.STANDARD)
+    parser.add_argument("--format", choices=BROADCAST_FORMATS, default="json")
+    parser.add_argument("--frames", type=int, default=500)
+    parser.add_argument("--rate", type=float, default=200, help="Frames per second fed to the meter")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 10, 100], help="Fast client counts")
+    parser.add_argument("--stalled", type=int, default=2, help="Clients that never read")
+    args = parser.parse_args()
+
+    print(f"{args.protocol}, {args.format}, {args.frames} frames at {args.rate:g}/s, {args.stalled} stalled clients")
+    print(f"{'clients':>8}{'encode us':>12}{'fan-out us':>12}{'received':>10}{'stalled queue':>15}{'dropped':>10}{'current':>9}")
+    failed = False
+    for clients in args.clients:
+        result = asyncio.run(measure(args, clients))
+        print(f"{clients:8d}{result['encode_us']:12.1f}{result['fan_out_us']:12.1f}{result['received']:10d}{result['queued']:15d}{result['dropped']:10d}{str(result['current']):>9}")
+        failed |= result["received"] < result["messages"] or result["queued"] > args.stalled * broadcast.BROADCAST_QUEUE_FRAMES or not result["current"]
+    if failed:
+        print("Frames lost by a fast client, unbounded queue, or stale values")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
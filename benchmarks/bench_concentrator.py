@@ -0,0 +1,50 @@
+"""CPU cost of a concentrator entry with simulated serial ports.
+
+Each simulated port delivers its own meter stream in serial sized chunks,
+the ports being interleaved like concurrent reads on the event loop.
+
+    python -m benchmarks.bench_concentrator [--meters 1 4 12 32] [--frames N]
+"""
+import argparse
+import time
+
+from teleinfo.const import TeleinfoProtocolType
+from teleinfo.sensor import TeleinfoIntegration, SerialProtocol
+
+from .frames import standard_frames, chunked
+from .stubs import StubHass, stub_entities
+
+
+def simulate(meters, frames, chunk_size):
+    hass = StubHass()
+    ports = []
+    for meter in range(meters):
+        integration = TeleinfoIntegration(port=f"/dev/ttyUSB{meter}", type=TeleinfoProtocolType.STANDARD)
+        protocol = SerialProtocol(integration.on_frame_received)
+        stream = standard_frames(frames + 1, adsc=f"0418760973{meter:02d}")
+        protocol.data_received(stream[0]) # Initialization frame
+        stub_entities(integration, hass)
+        ports.append((protocol, chunked(b"".join(stream[1:]), chunk_size)))
+
+    start = time.process_time()
+    for reads in zip(*(chunks for _, chunks in ports)):
+        for (protocol, _), data in zip(ports, reads):
+            protocol.data_received(data)
+    return time.process_time() - start, hass.writes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--meters", type=int, nargs="+", default=[1, 4, 12, 32])
+    parser.add_argument("--frames", type=int, default=500, help="Frames per meter")
+    parser.add_argument("--chunk", type=int, default=64)
+    args = parser.parse_args()
+
+    for meters in args.meters:
+        elapsed, writes = simulate(meters, args.frames, args.chunk)
+        frames = meters * args.frames
+        print(f"{meters:3d} meters: {elapsed * 1e6 / frames:7.1f} us CPU/frame, {elapsed * 1e3 / args.frames:7.2f} ms CPU per frame period, {writes / frames:5.1f} writes/frame")
+
+
+if __name__ == "__main__":
+    main()
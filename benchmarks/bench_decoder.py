@@ -0,0 +1,117 @@
+"""Compare frame decoding with the previous str based parse_line.
+
+    python -m benchmarks.bench_decoder [--frames N] [--corruption RATE]
+"""
+import argparse
+import random
+import time
+
+from teleinfo.const import TELEINFO_KEY, TeleinfoProtocolType
+from teleinfo.sensor import TeleinfoIntegration
+
+from .frames import standard_frame, historique_frame
+
+
+class ChecksumValidationError(Exception):
+    pass
+
+
+class LegacyParser:
+    """Frame decoding before the compiled decoders and bytes checksums"""
+
+    METADATA = {}
+    for k, v in TELEINFO_KEY.items():
+        METADATA[k] = dict(v, payload_length=len(k) + 1 + (14 if v.get("timestamp") else 0) + v["metric_length"] + 1)
+
+    def __init__(self):
+        self._checksum_control_mode = None
+
+    @staticmethod
+    def _validate_checksum(data, check):
+        chksum = sum([ord(c) for c in data])
+        chksum = (chksum & 0x3F) + 0x20
+        if chr(chksum) == check:
+            return True
+        raise ChecksumValidationError()
+
+    def validate_checksum(self, data, check):
+        if self._checksum_control_mode == 2:
+            return self._validate_checksum(data, check)
+        elif self._checksum_control_mode == 1:
+            return self._validate_checksum(data[:-1], check)
+        try:
+            self._validate_checksum(data, check)
+            self._checksum_control_mode = 2
+        except ChecksumValidationError:
+            self._validate_checksum(data[:-1], check)
+            self._checksum_control_mode = 1
+        return True
+
+    def parse_line(self, line):
+        ar = line.split()
+        key = ar[0]
+        try:
+            metadata = self.METADATA[key]
+            if len(ar) == 4:
+                ts, value, checksum = ar[1], ar[2], ar[3]
+            elif len(ar) == 3:
+                value, checksum, ts = ar[1], ar[2], None
+            else:
+                return None
+            self.validate_checksum(line[:metadata["payload_length"]], checksum)
+            return (key, metadata["content_type"](value.strip()), ts)
+        except (KeyError, ValueError, IndexError, ChecksumValidationError):
+            return None
+
+    def parse_frame(self, frame):
+        return [self.parse_line(l) for l in str(frame, "ascii").split("\r\n")]
+
+
+class CurrentParser(TeleinfoIntegration):
+
+    def parse_frame(self, frame):
+        lines = bytes(frame).split(b"\r\n")
+        return [self.parse_line(line) if valid else None for line, valid in zip(lines, self._checksum.validate(lines))]
+
+
+def corrupt(frame, rate, rng):
+    """Flip one bit in the value of a rate fraction of the lines"""
+    lines = frame.split(b"\r\n")
+    for i, line in enumerate(lines):
+        if rng.random() < rate:
+            position = rng.randrange(len(line) // 2, len(line) - 2)
+            lines[i] = line[:position] + bytes((line[position] ^ 0x01,)) + line[position + 1:]
+    return b"\r\n".join(lines)
+
+
+def run(parser, frames):
+    parse_frame = parser.parse_frame
+    start = time.perf_counter()
+    for frame in frames:
+        parse_frame(frame)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=5000)
+    parser.add_argument("--corruption", type=float, default=0.0, help="Fraction of lines with a checksum error")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    for protocol, frame in ((TeleinfoProtocolType.STANDARD, standard_frame()), (TeleinfoProtocolType.HISTORIQUE, historique_frame())):
+        frame = frame[2:-2] # What parse_frame receives
+        frames = [corrupt(frame, args.corruption, rng) for _ in range(args.frames)]
+        legacy, current = LegacyParser(), CurrentParser(type=protocol)
+        for old, new in zip(legacy.parse_frame(frame), current.parse_frame(frame)):
+            if old != new:
+                print(f"    decoded differently, legacy {old} now {new}")
+        lines = frame.count(b"\r\n") + 1
+        print(f"{protocol}: {lines} lines/frame, {args.corruption:.0%} corrupted lines")
+        for name, instance in (("legacy", legacy), ("current", current)):
+            elapsed = run(instance, frames)
+            print(f"{name:>12}: {lines * args.frames / elapsed:10.0f} lines/s")
+
+
+if __name__ == "__main__":
+    main()
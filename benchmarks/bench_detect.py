@@ -0,0 +1,145 @@
+"""Time to detect the protocol of recorded streams, on a simulated serial line.
+
+A recorded stream is sent in 7E1 at the baud rate of its protocol and read
+by a simulated UART at the baud rate the detection samples. At the wrong
+rate, bytes start on the falling edges of the line like on a real UART,
+bytes with a parity or framing error are read as NUL. The detection runs
+on a virtual clock, from random times in the stream.
+
+    python -m benchmarks.bench_detect [--trials 50] [--first standard|historique]
+                                      [--capture standard=FILE] [--capture historique=FILE]
+"""
+import argparse
+import math
+import random
+import statistics
+
+from teleinfo.const import BAUD_RATES, DETECTION_TIMEOUT, TeleinfoProtocolType
+from teleinfo.detection import detect_protocol
+
+from .generator import FrameGenerator
+
+
+def line_levels(data):
+    """Level of the line for each bit of the 7E1 bytes: start, 7 data bits LSB first, even parity, stop"""
+    levels = bytearray()
+    for byte in data:
+        bits = [(byte >> i) & 1 for i in range(7)]
+        levels += bytes((0, *bits, sum(bits) & 1, 1))
+    return levels
+
+
+class VirtualClock:
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class SimulatedPort:
+    """pyserial like port receiving a line at its baudrate attribute"""
+
+    timeout = 0.1
+
+    def __init__(self, levels, line_baudrate, clock):
+        self._levels = levels
+        self._bit_time = 1 / line_baudrate
+        self._clock = clock
+        self._cursor = clock() # Time from which the next start bit is looked for
+        self._received = bytearray()
+        self.baudrate = line_baudrate
+
+    def _level(self, time):
+        index = int(time / self._bit_time)
+        return self._levels[index] if index < len(self._levels) else 1
+
+    def _next_byte(self):
+        """Start time, received byte and time its stop bit is sampled, of the byte starting after the cursor"""
+        index = self._levels.find(b"\x01\x00", max(0, math.ceil(self._cursor / self._bit_time) - 1))
+        if index == -1:
+            return None
+        start = (index + 1) * self._bit_time
+        bit_time = 1 / self.baudrate
+        bits = [self._level(start + (position + 0.5) * bit_time) for position in range(1, 10)]
+        value = sum(bit << position for position, bit in enumerate(bits[:7]))
+        valid = sum(bits[:8]) % 2 == 0 and bits[8] == 1
+        return start, value if valid else 0, start + 9.5 * bit_time
+
+    def _receive(self):
+        """Receive the bytes whose stop bit was sampled before now"""
+        now = self._clock()
+        while (received := self._next_byte()) is not None and received[2] <= now:
+            self._received.append(received[1])
+            self._cursor = received[2]
+
+    @property
+    def in_waiting(self):
+        self._receive()
+        return len(self._received)
+
+    def reset_input_buffer(self):
+        self._received.clear()
+        self._cursor = self._clock()
+
+    def read(self, size=1):
+        self._receive()
+        if not self._received:
+            # Wait for the next byte, up to the timeout
+            received = self._next_byte()
+            self._clock.now = min(received[2], self._clock.now + self.timeout) if received else self._clock.now + self.timeout
+            self._receive()
+        data = bytes(self._received[:size])
+        del self._received[:size]
+        return data
+
+    def close(self):
+        pass
+
+
+def measure(protocol, stream, trials, first, rng):
+    levels = line_levels(stream)
+    duration = len(levels) / BAUD_RATES[protocol]
+    times = []
+    errors = 0
+    for _ in range(trials):
+        clock = VirtualClock(rng.uniform(0, duration - DETECTION_TIMEOUT))
+        start = clock()
+        detected = detect_protocol(lambda: SimulatedPort(levels, BAUD_RATES[protocol], clock), first=first, clock=clock)
+        if detected == protocol:
+            times.append(clock() - start)
+        else:
+            errors += 1
+    return times, errors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trials", type=int, default=50)
+    parser.add_argument("--first", choices=list(BAUD_RATES), help="Protocol sampled first, e.g. the one of the previous run")
+    parser.add_argument("--capture", action="append", default=[], help="protocol=FILE, recorded stream replacing the generated one")
+    args = parser.parse_args()
+
+    captures = dict(capture.split("=", 1) for capture in args.capture)
+    rng = random.Random(0)
+    print(f"{args.trials} trials per protocol, {DETECTION_TIMEOUT}s timeout, {args.first or 'no protocol'} sampled first")
+    print(f"{'':>12}{'p50 s':>10}{'p95 s':>10}{'max s':>10}{'failures':>10}")
+    for protocol in (TeleinfoProtocolType.STANDARD, TeleinfoProtocolType.HISTORIQUE):
+        if protocol in captures:
+            with open(captures[protocol], "rb") as f:
+                stream = f.read()
+        else:
+            generator = FrameGenerator(protocol)
+            stream = bytearray()
+            while len(stream) * 10 / BAUD_RATES[protocol] < 2 * DETECTION_TIMEOUT:
+                stream += generator.frame()
+        times, errors = measure(protocol, bytes(stream), args.trials, args.first, rng)
+        if times:
+            print(f"{protocol:>12}{statistics.median(times):10.2f}{statistics.quantiles(times, n=20)[18] if len(times) > 1 else times[0]:10.2f}{max(times):10.2f}{errors:10d}")
+        else:
+            print(f"{protocol:>12}{'':>30}{errors:10d}")
+
+
+if __name__ == "__main__":
+    main()
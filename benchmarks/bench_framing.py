@@ -0,0 +1,82 @@
+"""Compare the frame splitter with the previous bytes concatenation implementation.
+
+    python -m benchmarks.bench_framing [--frames N] [--chunk SIZE]
+"""
+import argparse
+import time
+import tracemalloc
+
+from teleinfo.framing import FrameSplitter
+from teleinfo.const import START_FRAME_DELIMITER, END_FRAME_DELIMITER
+
+from .frames import standard_frame, chunked
+
+
+class LegacySplitter:
+    """SerialProtocol buffer handling before FrameSplitter"""
+
+    def __init__(self, callback):
+        self._callback = callback
+        self._buffer = b""
+
+    def feed(self, data):
+        self._buffer += data
+        while START_FRAME_DELIMITER in self._buffer:
+            start_index = self._buffer.find(START_FRAME_DELIMITER)
+            self._buffer = self._buffer[start_index:]
+            end_index = self._buffer.find(END_FRAME_DELIMITER)
+            if end_index != -1:
+                self._callback(self._buffer[1:end_index])
+                self._buffer = self._buffer[end_index + 1:]
+            else:
+                break
+
+
+def run(factory, chunks, frames):
+    received = []
+    splitter = factory(lambda frame: received.append(len(frame)))
+    start = time.perf_counter()
+    for chunk in chunks:
+        splitter.feed(chunk)
+    elapsed = time.perf_counter() - start
+
+    # Transient memory allocated while feeding, measured separately since tracing slows down the run
+    splitter = factory(lambda frame: None)
+    tracemalloc.start()
+    allocated = 0
+    for chunk in chunks[:1000]:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        splitter.feed(chunk)
+        allocated += tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    traced_frames = max(1, frames * min(len(chunks), 1000) // len(chunks))
+    return len(received), elapsed, allocated / traced_frames
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=20000)
+    parser.add_argument("--chunk", type=int, default=32, help="Size of the chunks returned by the serial port")
+    args = parser.parse_args()
+
+    stream = standard_frame() * args.frames
+    chunks = chunked(stream, args.chunk)
+    print(f"{args.frames} frames, {len(stream)} bytes, chunks of {args.chunk} bytes")
+    for name, factory in (("legacy", LegacySplitter), ("splitter", FrameSplitter)):
+        count, elapsed, allocated = run(factory, chunks, args.frames)
+        assert count == args.frames, f"{name} returned {count} frames"
+        print(f"{name:>10}: {len(stream) / elapsed / 1e6:8.2f} MB/s {count / elapsed:10.0f} frames/s {allocated:10.0f} B allocated/frame")
+
+    # Line noise without any STX, the legacy buffer keeps growing
+    noise = chunked(b"\x7f" * (args.chunk * 10000), args.chunk)
+    legacy, splitter = LegacySplitter(None), FrameSplitter(None)
+    for chunk in noise:
+        legacy.feed(chunk)
+        splitter.feed(chunk)
+    print(f"After {len(noise) * args.chunk} bytes of noise: legacy buffer {len(legacy._buffer)} bytes, "
+          f"splitter buffer {splitter.pending} bytes ({splitter.dropped_bytes} bytes dropped)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Import time of the integration modules, measured with python -X importtime.
+
+Home Assistant modules the integration needs anyway are imported first,
+so the reported time is the cost of the integration itself. Each run is
+a fresh interpreter, the median of the runs is kept.
+
+    python -m benchmarks.bench_import [--module teleinfo.sensor] [--runs 5]
+                                      [--include-homeassistant] [--budget-ms N]
+
+Exits with status 1 when the median import time is over --budget-ms.
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+
+# Imported by Home Assistant before the integration is loaded
+PRELOADED = [
+    "homeassistant.core",
+    "homeassistant.config_entries",
+    "homeassistant.components.sensor",
+    "homeassistant.helpers.config_validation",
+    "homeassistant.helpers.event",
+    "homeassistant.helpers.storage",
+]
+
+# Modules that must not be imported with the integration
+LAZY = ["serial", "serial_asyncio", "teleinfo.euridis"]
+
+
+def import_times(module, preload):
+    """Return {module: (self us, cumulative us)} of the modules imported by a fresh interpreter"""
+    code = "".join(f"import {name}; " for name in preload) + f"import sys; sys.stderr.write('---\\n'); import {module}"
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.partition("---\n")[2].splitlines():
+        if not line.startswith("import time:") or "|" not in line or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--module", default="teleinfo.sensor")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--include-homeassistant", action="store_true", help="Don't preload the Home Assistant modules")
+    parser.add_argument("--budget-ms", type=float, default=0)
+    args = parser.parse_args()
+
+    preload = [] if args.include_homeassistant else PRELOADED
+    runs = [import_times(args.module, preload) for _ in range(args.runs)]
+    total_ms = statistics.median(times[args.module][1] for times in runs) / 1000
+
+    print(f"{args.module}: {total_ms:.1f} ms, median of {args.runs} runs")
+    times = runs[-1]
+    for name, (self_us, cumulative_us) in sorted(times.items(), key=lambda item: -item[1][0])[:10]:
+        print(f"{name:>40}: {self_us / 1000:8.2f} ms self {cumulative_us / 1000:8.2f} ms cumulative")
+    if loaded := [name for name in LAZY if name in times]:
+        print(f"Imported although lazy: {', '.join(loaded)}")
+
+    if args.budget_ms and total_ms > args.budget_ms:
+        print(f"Regression: {total_ms:.1f} ms over the {args.budget_ms:.1f} ms budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
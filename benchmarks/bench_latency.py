@@ -0,0 +1,101 @@
+"""Latency from the ETX byte written on the wire to the entity states written.
+
+An emulated meter streams frames on a pseudo-terminal opened by
+TeleinfoIntegration.setup_serial, at increasing line rate multipliers to
+find the highest sustainable frame rate. --replay runs the same
+measurement through a replay:// capture instead of the pty, --network
+through a local TCP server standing in for ser2net or a TIC bridge, read
+--read-size bytes at once.
+
+    python -m benchmarks.bench_latency [--protocol standard] [--frames N] [--speeds 1 4 16 64]
+                                       [--replay | --network [--read-size BYTES]]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+import serial
+
+from teleinfo import transport
+from teleinfo.const import TeleinfoProtocolType
+from teleinfo.sensor import TeleinfoIntegration
+
+from .emulator import MeterEmulator, TcpMeterEmulator, BAUD_RATES, pty_accepts_7e1
+from .generator import FrameGenerator
+from .stubs import StubHass, stub_entities
+
+
+async def measure(protocol, frames, speed, replay=False, network=False):
+    generator = FrameGenerator(protocol)
+    initialized = asyncio.Event()
+    processed = []
+
+    if replay:
+        capture = tempfile.NamedTemporaryFile(suffix=".tic", delete=False)
+        capture.write(generator.stream(frames + 1))
+        capture.close()
+        port, emulator = f"replay://{capture.name}?speed={speed}", None
+    else:
+        emulator_class = TcpMeterEmulator if network else MeterEmulator
+        emulator = emulator_class((generator.frame() for _ in range(frames + 1)), BAUD_RATES[protocol], speed)
+        port = emulator.port
+
+    integration = TeleinfoIntegration(port=port, type=protocol)
+    integration.on_initialized_change = initialized.set
+    integration.add_frame_listener(lambda sequence, changed: processed.append(time.perf_counter()))
+    await integration.setup_serial()
+    if emulator:
+        emulator.start()
+    await asyncio.wait_for(initialized.wait(), 10)
+    stub_entities(integration, StubHass())
+
+    period = (len(generator.frame()) * 10 / BAUD_RATES[protocol]) / speed
+    deadline = time.perf_counter() + period * (frames + 2) + 2
+    while len(processed) < frames and time.perf_counter() < deadline:
+        await asyncio.sleep(period)
+    await integration.cleanup()
+
+    if emulator:
+        emulator.close()
+        # The first frame written initialized the integration, without frame listener call
+        latencies = [(done - sent) * 1000 for sent, done in zip(emulator.frame_end_times[1:], processed)]
+    else:
+        os.unlink(capture.name)
+        latencies = []
+    return len(processed), period, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--protocol", choices=list(BAUD_RATES), default=TeleinfoProtocolType.STANDARD)
+    parser.add_argument("--frames", type=int, default=20)
+    parser.add_argument("--speeds", type=float, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--replay", action="store_true", help="Replay a capture file instead of the pty emulator")
+    parser.add_argument("--network", action="store_true", help="Read a local TCP server instead of the pty emulator")
+    parser.add_argument("--read-size", type=int, help="Bytes read at once from the socket, 262144 is the asyncio default")
+    args = parser.parse_args()
+
+    if args.read_size:
+        transport.NETWORK_READ_SIZE = args.read_size
+    if not (args.replay or args.network) and not pty_accepts_7e1():
+        # The line timing is emulated by the emulator, the pty doesn't need the 7E1 settings
+        print("The kernel rejects 7E1 on pseudo-terminals, the port is opened in 8N1")
+        TeleinfoIntegration.SERIAL_BYTE_SIZE = serial.EIGHTBITS
+        TeleinfoIntegration.SERIAL_PARITY = serial.PARITY_NONE
+
+    for speed in args.speeds:
+        received, period, latencies = asyncio.run(measure(args.protocol, args.frames, speed, args.replay, args.network))
+        line = f"x{speed:<5g} {1 / period:7.1f} frames/s sent, {received:4d}/{args.frames} processed"
+        if latencies:
+            line += f", latency p50 {statistics.median(latencies):6.2f} ms max {max(latencies):6.2f} ms"
+        print(line)
+        if received < args.frames:
+            print("Frame rate not sustained")
+            break
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Throughput of the decoding hot path on synthetic frames, without Home Assistant.
+
+Frames go through SerialProtocol.data_received, the frame splitter,
+TeleinfoIntegration.parse_frame and the entity writes to a stub hass.
+
+    python -m benchmarks.bench_parser [--protocol standard] [--frames N] [--chunk SIZE]
+                                      [--corruption RATE] [--keys all|default|K1,K2...]
+                                      [--min-frames-per-sec N]
+
+Exits with status 1 when --min-frames-per-sec is not reached.
+"""
+import argparse
+import itertools
+import statistics
+import sys
+import time
+import timeit
+import tracemalloc
+
+from teleinfo.const import TeleinfoProtocolType
+from teleinfo.sensor import TeleinfoIntegration, SerialProtocol
+from teleinfo.utils import StatusRegisterParser
+
+from .generator import FrameGenerator, STANDARD_KEYS, HISTORIQUE_KEYS
+from .stubs import StubHass, stub_entities
+
+
+def setup(protocol, generator):
+    integration = TeleinfoIntegration(type=protocol)
+    serial_protocol = SerialProtocol(integration.on_frame_received)
+    while not integration.initialyzed:
+        serial_protocol.data_received(generator.frame())
+    hass = StubHass()
+    stub_entities(integration, hass)
+    return integration, serial_protocol, hass
+
+
+def measure(args, keys):
+    generator = FrameGenerator(args.protocol, keys=keys, corruption=args.corruption)
+    integration, serial_protocol, hass = setup(args.protocol, generator)
+    chunks = generator.chunks(args.frames, args.chunk)
+    lines_per_frame = len(generator.keys)
+
+    # Time spent in each frame callback
+    latencies = []
+    on_frame_received = integration.on_frame_received
+    def timed(frame):
+        start = time.perf_counter_ns()
+        on_frame_received(frame)
+        latencies.append(time.perf_counter_ns() - start)
+    serial_protocol.splitter._callback = timed
+
+    start = time.perf_counter()
+    for chunk in chunks:
+        serial_protocol.data_received(chunk)
+    elapsed = time.perf_counter() - start
+    frames = len(latencies)
+
+    serial_protocol.splitter._callback = on_frame_received
+    tracemalloc.start()
+    allocated = 0
+    for chunk in chunks[:2000]:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        serial_protocol.data_received(chunk)
+        allocated += tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    traced_frames = max(1, frames * min(len(chunks), 2000) // len(chunks))
+
+    return {
+        "frames/s": frames / elapsed,
+        "lines/s": frames * lines_per_frame / elapsed,
+        "B allocated/frame": allocated / traced_frames,
+        "p50 us/frame": statistics.median(latencies) / 1000,
+        "p99 us/frame": statistics.quantiles(latencies, n=100)[98] / 1000,
+        "writes/frame": hass.writes / frames,
+        "checksum errors": integration.checksum_sensor.state,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--protocol", choices=[TeleinfoProtocolType.STANDARD, TeleinfoProtocolType.HISTORIQUE], default=TeleinfoProtocolType.STANDARD)
+    parser.add_argument("--frames", type=int, default=5000)
+    parser.add_argument("--chunk", type=int, default=64, help="Size of the serial reads")
+    parser.add_argument("--corruption", type=float, default=0.0, help="Fraction of lines with a wrong byte")
+    parser.add_argument("--keys", default="default", help="default, all, or comma separated labels")
+    parser.add_argument("--min-frames-per-sec", type=float, default=0)
+    args = parser.parse_args()
+
+    if args.keys == "all":
+        keys = STANDARD_KEYS if args.protocol == TeleinfoProtocolType.STANDARD else HISTORIQUE_KEYS
+    elif args.keys == "default":
+        keys = None
+    else:
+        keys = args.keys.split(",")
+
+    result = measure(args, keys)
+    print(f"{args.protocol}, {args.frames} frames, chunks of {args.chunk} bytes, {args.corruption:.1%} corrupted lines")
+    for name, value in result.items():
+        print(f"{name:>20}: {value:12.1f}")
+
+    status_parser = StatusRegisterParser()
+    registers = itertools.cycle(["003A0001", "013A0001"]) # couleur_jour flips on each parse
+    status = timeit.timeit(lambda: [status_parser.field(name) for name in status_parser.parse_str(next(registers))], number=100000)
+    print(f"{'STGE parses/s':>20}: {100000 / status:12.1f}")
+
+    if result["frames/s"] < args.min_frames_per_sec:
+        print(f"Regression: {result['frames/s']:.0f} frames/s below {args.min_frames_per_sec:.0f}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Recovery of a meter whose USB dongle is unplugged and plugged again.
+
+An emulated meter streams frames on a pseudo-terminal reached through a
+stable symlink, read by TeleinfoIntegration.setup_serial under a
+ConnectionSupervisor. The pty is closed for a while and a new one is
+opened, like a reset dongle enumerated again. The recovery time, from the
+connection lost to the first frame processed on the new port, is the one
+reported by the reconnects and recovery_time diagnostic sensors. The
+entities must be the same objects before and after, and written again.
+With --network, the meter is behind a local TCP server closed and reopened
+like a TIC bridge powered off and on.
+
+    python -m benchmarks.bench_reconnect [--protocol standard] [--cycles 5] [--unplugged 2] [--streaming] [--network]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import serial
+
+from teleinfo.const import CONF_STREAMING, TeleinfoProtocolType
+from teleinfo.sensor import TeleinfoIntegration
+from teleinfo.supervisor import ConnectionSupervisor
+
+from .emulator import MeterEmulator, TcpMeterEmulator, BAUD_RATES, pty_accepts_7e1
+from .generator import FrameGenerator
+from .stubs import StubHass, stub_entities
+
+FRAMES_BETWEEN_CYCLES = 3
+
+
+async def wait_for(condition, timeout):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        await asyncio.sleep(0.01)
+    return True
+
+
+async def measure(args):
+    generator = FrameGenerator(args.protocol)
+    link = os.path.join(tempfile.mkdtemp(), "ttyTIC")
+    if args.network:
+        emulator = TcpMeterEmulator(iter(generator.frame, None), BAUD_RATES[args.protocol])
+    else:
+        emulator = MeterEmulator(iter(generator.frame, None), BAUD_RATES[args.protocol], link=link)
+    hass = StubHass()
+    initialized = asyncio.Event()
+    integration = TeleinfoIntegration(port=emulator.port, type=args.protocol, options={CONF_STREAMING: args.streaming})
+    integration.on_initialized_change = initialized.set
+    await integration.setup_serial()
+    supervisor = ConnectionSupervisor(integration).start()
+    emulator.start()
+    await asyncio.wait_for(initialized.wait(), 10)
+    stub_entities(integration, hass)
+    entities = dict(integration._sensors)
+    period = len(generator.frame()) * 10 / BAUD_RATES[args.protocol]
+
+    results = []
+    for cycle in range(args.cycles):
+        frames = integration.stats.frames
+        await wait_for(lambda: integration.stats.frames >= frames + FRAMES_BETWEEN_CYCLES, FRAMES_BETWEEN_CYCLES * period + 5)
+        writes, recoveries = hass.writes, integration.stats.recovery_time.count
+        emulator.unplug()
+        await asyncio.sleep(args.unplugged)
+        replugged = time.monotonic()
+        emulator.replug()
+        if not await wait_for(lambda: integration.stats.recovery_time.count > recoveries, args.timeout):
+            print(f"cycle {cycle + 1}: not recovered after {args.timeout}s")
+            results.append(None)
+            continue
+        after_replug = time.monotonic() - replugged
+        recovery_time = integration.stats.last_recovery_time / 1000
+        print(f"cycle {cycle + 1}: recovered in {recovery_time:6.2f}s, {after_replug:5.2f}s after the replug, {hass.writes - writes} states written")
+        results.append((recovery_time, after_replug))
+
+    supervisor.stop()
+    await integration.cleanup()
+    emulator.close()
+    os.rmdir(os.path.dirname(link)) # The link is removed on unplug
+    kept = integration._sensors == entities and all(integration._sensors[key] is entity for key, entity in entities.items())
+    return results, integration.stats.reconnects, kept
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--protocol", choices=list(BAUD_RATES), default=TeleinfoProtocolType.STANDARD)
+    parser.add_argument("--cycles", type=int, default=5)
+    parser.add_argument("--unplugged", type=float, default=2.0, help="Seconds the dongle stays unplugged")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Seconds to recover after the replug")
+    parser.add_argument("--streaming", action="store_true")
+    parser.add_argument("--network", action="store_true", help="Meter behind a local TCP server instead of a pty")
+    args = parser.parse_args()
+
+    if not args.network and not pty_accepts_7e1():
+        # The line timing is emulated by the emulator, the pty doesn't need the 7E1 settings
+        print("The kernel rejects 7E1 on pseudo-terminals, the port is opened in 8N1")
+        TeleinfoIntegration.SERIAL_BYTE_SIZE = serial.EIGHTBITS
+        TeleinfoIntegration.SERIAL_PARITY = serial.PARITY_NONE
+
+    print(f"{args.protocol}, {args.cycles} cycles unplugged {args.unplugged}s")
+    results, reconnects, kept = asyncio.run(measure(args))
+    recovered = [result for result in results if result]
+    if recovered:
+        after_replug = [result[1] for result in recovered]
+        print(f"{len(recovered)}/{args.cycles} recovered, {reconnects} reconnects, after the replug p50 {statistics.median(after_replug):.2f}s max {max(after_replug):.2f}s")
+    print(f"Entities kept: {kept}")
+    if len(recovered) < args.cycles or not kept:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Memory of long running meters, for the months Home Assistant stays up.
+
+Meters decode a synthetic stream for millions of frames. The memory held
+by each meter once warmed up (rolling windows filled, caches and counters
+of every label created) is measured with tracemalloc. The long run is
+checked with the count of allocated blocks sampled at regular checkpoints
+after a garbage collection, tracemalloc slowing the decoding down tenfold.
+A last window of frames is traced to point at the lines holding memory.
+
+    python -m benchmarks.bench_soak [--protocol standard] [--meters 2] [--frames 1000000]
+                                    [--checkpoints 20] [--traced-frames 20000] [--corruption 0.001]
+                                    [--max-growth 65536]
+
+Exits with status 1 when the allocated blocks grow between the first and
+the last checkpoint, or the traced window grows by more than --max-growth
+bytes.
+"""
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+
+from teleinfo.const import TeleinfoProtocolType
+from teleinfo.sensor import TeleinfoIntegration, SerialProtocol
+
+from .emulator import BAUD_RATES
+from .generator import FrameGenerator
+from .stubs import StubHass, stub_entities
+
+WARMUP_FRAMES = 2000
+BLOCKS_TOLERANCE = 256 # Allocated blocks, interpreter caches and free lists settle over the run
+
+
+def traced():
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0]
+
+
+def allocated_blocks():
+    gc.collect()
+    return sys.getallocatedblocks()
+
+
+def setup_meter(args, index, hass):
+    generator = FrameGenerator(args.protocol, corruption=args.corruption, seed=index, device_id=f"0418760973{index:02d}")
+    tracemalloc.start()
+    integration = TeleinfoIntegration(port=f"/dev/ttyUSB{index}", type=args.protocol)
+    serial_protocol = SerialProtocol(integration.on_frame_received)
+    while not integration.initialyzed:
+        serial_protocol.data_received(generator.frame())
+    stub_entities(integration, hass)
+    for _ in range(WARMUP_FRAMES):
+        serial_protocol.data_received(generator.frame())
+    size = traced()
+    tracemalloc.stop()
+    return integration, serial_protocol, generator, size
+
+
+def run(meters, frames):
+    for _ in range(frames):
+        for _, serial_protocol, generator, _ in meters:
+            serial_protocol.data_received(generator.frame())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--protocol", choices=list(BAUD_RATES), default=TeleinfoProtocolType.STANDARD)
+    parser.add_argument("--meters", type=int, default=2)
+    parser.add_argument("--frames", type=int, default=1_000_000, help="Frames decoded by all the meters")
+    parser.add_argument("--checkpoints", type=int, default=20)
+    parser.add_argument("--traced-frames", type=int, default=20000, help="Frames of the traced window")
+    parser.add_argument("--corruption", type=float, default=0.001, help="Fraction of lines with a wrong byte")
+    parser.add_argument("--max-growth", type=int, default=65536, help="Bytes")
+    args = parser.parse_args()
+
+    hass = StubHass()
+    meters = [setup_meter(args, index, hass) for index in range(args.meters)]
+    print(f"{args.protocol}, {args.meters} meters, {args.frames} frames, {args.corruption:.1%} corrupted lines")
+    for integration, _, _, size in meters:
+        print(f"{integration.port:>20}: {size / 1024:10.1f} KiB after {WARMUP_FRAMES} frames")
+
+    per_checkpoint = max(1, args.frames // args.checkpoints // args.meters)
+    blocks = []
+    start = time.perf_counter()
+    for checkpoint in range(args.checkpoints):
+        run(meters, per_checkpoint)
+        blocks.append(allocated_blocks())
+        frames = (checkpoint + 1) * per_checkpoint * args.meters
+        print(f"{frames:>20}: {blocks[-1]:10d} blocks, {frames / (time.perf_counter() - start):8.0f} frames/s")
+    blocks_growth = blocks[-1] - blocks[0]
+    print(f"{'blocks growth':>20}: {blocks_growth:10d}")
+
+    tracemalloc.start()
+    run(meters, 1000) # Objects replaced on the first frames of the window aren't growth
+    before = traced()
+    baseline = tracemalloc.take_snapshot()
+    run(meters, max(1, args.traced_frames // args.meters))
+    growth = traced() - before
+    print(f"{'traced growth':>20}: {growth:10d} B over {args.traced_frames} frames")
+
+    if blocks_growth > BLOCKS_TOLERANCE or growth > args.max_growth:
+        print("Memory grows, largest growths of the traced window:")
+        for stat in tracemalloc.take_snapshot().compare_to(baseline, "lineno")[:10]:
+            print(f"    {stat}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
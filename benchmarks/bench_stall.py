@@ -0,0 +1,87 @@
+"""Lost bytes and checksum errors when the event loop stalls.
+
+An emulated meter with a UART-like receive buffer (bytes beyond it are
+lost) streams frames while the event loop is periodically blocked, like
+during a recorder commit. The asyncio SerialProtocol reader is compared
+with the dedicated reader thread.
+
+    python -m benchmarks.bench_stall [--protocol standard] [--frames N] [--speed 10]
+                                     [--stall 1.0] [--stall-every 2.0] [--rx-buffer 4096]
+"""
+import argparse
+import asyncio
+import time
+
+import serial
+
+from teleinfo.const import TeleinfoProtocolType, CONF_READER_THREAD
+from teleinfo.sensor import TeleinfoIntegration
+
+from .emulator import MeterEmulator, BAUD_RATES, pty_accepts_7e1
+from .generator import FrameGenerator
+from .stubs import StubHass, stub_entities
+
+MODES = {"protocol": False, "thread": True}
+
+
+async def measure(args, reader_thread):
+    generator = FrameGenerator(args.protocol)
+    emulator = MeterEmulator((generator.frame() for _ in range(args.frames + 1)), BAUD_RATES[args.protocol], args.speed, rx_buffer=args.rx_buffer)
+    integration = TeleinfoIntegration(port=emulator.port, type=args.protocol, options={CONF_READER_THREAD: reader_thread})
+    initialized = asyncio.Event()
+    integration.on_initialized_change = initialized.set
+    processed = []
+    integration.add_frame_listener(lambda sequence, changed: processed.append(sequence))
+    await integration.setup_serial()
+    emulator.start()
+    await asyncio.wait_for(initialized.wait(), 10)
+    stub_entities(integration, StubHass())
+
+    # Block the loop periodically until the emulator is done
+    stalled = 0.0
+    while emulator._thread.is_alive():
+        await asyncio.sleep(args.stall_every)
+        stall_end = time.perf_counter() + args.stall
+        while time.perf_counter() < stall_end: # Busy like a long render, Home Assistant forbids time.sleep in the loop
+            pass
+        stalled += args.stall
+    await asyncio.sleep(1)
+    reader, protocol = integration._serial_reader
+    splitter = reader.splitter if reader_thread else protocol.splitter
+    await integration.cleanup()
+    emulator.close()
+    return {
+        "frames sent": args.frames,
+        "frames processed": len(processed),
+        "bytes lost": emulator.lost_bytes,
+        "checksum errors": integration.checksum_sensor.state,
+        "bytes dropped": splitter.dropped_bytes,
+        "frames dropped": reader.dropped_frames if reader_thread else 0,
+        "loop stalled s": stalled,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--protocol", choices=list(BAUD_RATES), default=TeleinfoProtocolType.STANDARD)
+    parser.add_argument("--frames", type=int, default=100)
+    parser.add_argument("--speed", type=float, default=10, help="Line rate multiplier")
+    parser.add_argument("--stall", type=float, default=1.0, help="Seconds the loop is blocked")
+    parser.add_argument("--stall-every", type=float, default=2.0, help="Seconds between two stalls")
+    parser.add_argument("--rx-buffer", type=int, default=4096, help="Receive buffer of the emulated port")
+    args = parser.parse_args()
+
+    if not pty_accepts_7e1():
+        print("The kernel rejects 7E1 on pseudo-terminals, the port is opened in 8N1")
+        TeleinfoIntegration.SERIAL_BYTE_SIZE = serial.EIGHTBITS
+        TeleinfoIntegration.SERIAL_PARITY = serial.PARITY_NONE
+
+    print(f"{args.protocol} x{args.speed:g}, loop blocked {args.stall:g}s every {args.stall_every:g}s, {args.rx_buffer} bytes receive buffer")
+    results = {mode: asyncio.run(measure(args, reader_thread)) for mode, reader_thread in MODES.items()}
+    print(f"{'':>20}" + "".join(f"{mode:>12}" for mode in results))
+    for name in results["protocol"]:
+        print(f"{name:>20}" + "".join(f"{result[name]:12g}" for result in results.values()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Recorder rows per day of the index entities, with and without hourly statistics.
+
+A meter decodes a day of synthetic frames on a virtual clock, the state
+writes of its index entities are counted: each one is a row of the states
+table. Statistics rows are counted from the state class of the entities:
+an index with a state class has 288 short term and 24 hourly statistics
+compiled by the recorder per day, an imported index 24 hourly rows.
+With hourly statistics, HourlyStatistics.import_hour is called on each
+virtual hour, and restarted half-way: the imported states must be the
+states of the index entities, the sums their increase since the first
+hour, carried over the restart from the last imported rows.
+
+    python -m benchmarks.bench_statistics [--protocol standard] [--hours 24]
+"""
+import argparse
+import asyncio
+import datetime
+import sys
+import time
+from types import SimpleNamespace
+
+from teleinfo import sensor, statistics
+from teleinfo.const import CONF_HOURLY_STATISTICS, TELEINFO_KEY, TeleinfoIndex, TeleinfoProtocolType
+from teleinfo.sensor import TeleinfoIntegration, SerialProtocol
+
+from .emulator import BAUD_RATES
+from .generator import FrameGenerator
+from .stubs import StubHass, stub_entities
+
+SHORT_TERM_STATISTICS_PER_HOUR = 12 # Compiled every 5 minutes
+START = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+class VirtualScheduler:
+    """Clock of the integration and async_call_later of its throttled writes"""
+
+    def __init__(self):
+        self.now = 0.0
+        self._pending = []
+
+    def monotonic(self):
+        return self.now
+
+    def call_later(self, hass, delay, action):
+        entry = [self.now + delay, action]
+        self._pending.append(entry)
+        return lambda: self._pending.remove(entry)
+
+    def advance(self, seconds):
+        self.now += seconds
+        due = [entry for entry in self._pending if entry[0] <= self.now]
+        for entry in due:
+            self._pending.remove(entry)
+            entry[1](self.now)
+
+
+def index_rows(protocol, hours, hourly_statistics):
+    scheduler = VirtualScheduler()
+    sensor.time = SimpleNamespace(monotonic=scheduler.monotonic, perf_counter=time.perf_counter)
+    sensor.async_call_later = scheduler.call_later
+    generator = FrameGenerator(protocol)
+    hass = StubHass()
+    integration = TeleinfoIntegration(port="/dev/ttyUSB0", type=protocol, options={CONF_HOURLY_STATISTICS: hourly_statistics})
+    integration.on_snapshot_change = lambda: None
+    serial_protocol = SerialProtocol(integration.on_frame_received)
+    while not integration.initialyzed:
+        serial_protocol.data_received(generator.frame())
+    stub_entities(integration, hass)
+    indexes = {key: entity for key, entity in integration._sensors.items() if TELEINFO_KEY.get(key, {}).get("class") is TeleinfoIndex and entity.state}
+    writes = {entity._attr_unique_id: 0 for entity in indexes.values()}
+
+    def count_write(entity):
+        if entity._attr_unique_id in writes:
+            writes[entity._attr_unique_id] += 1
+    for entity in indexes.values():
+        entity.async_write_ha_state = lambda entity=entity: count_write(entity)
+
+    imports = [] # {statistic id: row} of each hour
+    imported = {} # Rows stored by the recorder, by statistic id
+    statistics.async_add_external_statistics = lambda hass, metadata, rows: imports[-1].update({metadata["statistic_id"]: rows[0]})
+    statistics.get_last_statistics = lambda hass, count, statistic_id, convert, types: {statistic_id: [imported[statistic_id]]} if statistic_id in imported else {}
+    statistics.get_instance = lambda hass: SimpleNamespace(async_add_executor_job=lambda function, *args: asyncio.sleep(0, function(*args)))
+    hourly = statistics.HourlyStatistics(hass, [integration])
+    first = None
+    valid = True
+    hour = 0
+    for _ in range(int(hours * 3600 / generator.period)):
+        serial_protocol.data_received(generator.frame())
+        scheduler.advance(generator.period)
+        if hourly_statistics and scheduler.now >= (hour + 1) * 3600:
+            hour += 1
+            if hour == int(hours / 2) + 1: # Restarted, the sums go on from the last rows
+                imported_before, hourly = hourly.imported, statistics.HourlyStatistics(hass, [integration])
+                hourly.imported = imported_before
+            imports.append({})
+            asyncio.run(hourly.import_hour(START + datetime.timedelta(hours=hour)))
+            imported.update(imports[-1])
+            states = {statistics.statistic_id(integration.device_id, key): entity.state for key, entity in indexes.items()}
+            first = first or states
+            valid &= imports[-1] == {key: {"start": row["start"], "state": state, "sum": state - first[key]} for (key, state), row in zip(states.items(), imports[-1].values())}
+    if hourly_statistics:
+        valid &= len(imports) > 1 and any(previous != current for previous, current in zip(imports, imports[1:]))
+
+    states = sum(writes.values())
+    compiled = sum(1 for entity in indexes.values() if entity._attr_state_class is not None)
+    rows = hours * compiled * (SHORT_TERM_STATISTICS_PER_HOUR + 1) + hourly.imported
+    return len(indexes), states, rows, valid
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--protocol", choices=list(BAUD_RATES), default=TeleinfoProtocolType.STANDARD)
+    parser.add_argument("--hours", type=float, default=24)
+    args = parser.parse_args()
+
+    print(f"{args.protocol}, {args.hours:g} hours")
+    print(f"{'':>20}{'indexes':>10}{'state rows':>12}{'stat rows':>12}{'total':>10}")
+    totals = []
+    for hourly_statistics in (False, True):
+        indexes, states, rows, valid = index_rows(args.protocol, args.hours, hourly_statistics)
+        totals.append(states + rows)
+        print(f"{'hourly statistics' if hourly_statistics else 'every change':>20}{indexes:10d}{states:12d}{rows:12.0f}{states + rows:10.0f}")
+    print(f"{'reduction':>20}{totals[0] / totals[1]:43.0f}x")
+    if not valid:
+        print("Imported states differ from the index states, sums from their increase, or never change")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Frame decoding compared with the streaming line decoder.
+
+The stream is fed by chunks on a virtual clock running at the line rate,
+so the latency of each key is the time from the CR of its line on the wire
+to its entity update, without the noise of a real port. Frames are then
+corrupted (lost STX or ETX, flipped byte) to count the lines recovered.
+
+    python -m benchmarks.bench_streaming [--protocol standard] [--frames N] [--chunk 16]
+                                         [--corruption 0.2] [--keys ADSC,SINSTS,...]
+"""
+import argparse
+import random
+import statistics
+
+from teleinfo.const import TeleinfoProtocolType, CONF_STREAMING
+from teleinfo.sensor import TeleinfoIntegration
+from teleinfo.transport import BITS_PER_BYTE
+
+from .emulator import BAUD_RATES
+from .frames import chunked
+from .generator import FrameGenerator
+from .stubs import StubHass, stub_entities
+
+MODES = {"frame": False, "streaming": True}
+
+
+def line_end_offsets(frame):
+    """Offset of the CR of each line of a frame, by label"""
+    offsets = {}
+    start = 0
+    while (lf := frame.find(b"\n", start)) != -1:
+        cr = frame.find(b"\r", lf)
+        label = frame[lf + 1:cr].partition(b"\t")[0].partition(b" ")[0].decode("ascii")
+        offsets[label] = cr
+        start = cr + 1
+    return offsets
+
+
+def setup(protocol, streaming):
+    integration = TeleinfoIntegration(type=protocol, options={CONF_STREAMING: streaming})
+    serial_protocol = integration.protocol_factory()
+    generator = FrameGenerator(protocol, seed=1)
+    while not integration.initialyzed:
+        serial_protocol.data_received(generator.frame())
+    stub_entities(integration, StubHass())
+    return integration, serial_protocol
+
+
+def measure_latency(args, streaming):
+    integration, serial_protocol = setup(args.protocol, streaming)
+    byte_period = BITS_PER_BYTE / BAUD_RATES[args.protocol]
+    clock = [0.0]
+    updates = []
+    update_entity = integration.update_entity
+    def timed_update(key, value, timestamp):
+        updates.append((integration.frame_sequence, key, clock[0]))
+        update_entity(key, value, timestamp)
+    integration.update_entity = timed_update
+
+    generator = FrameGenerator(args.protocol, seed=2)
+    frames = [generator.frame() for _ in range(args.frames)]
+    line_ends = []
+    offset = 0
+    for frame in frames:
+        line_ends.append({key: (offset + position) * byte_period for key, position in line_end_offsets(frame).items()})
+        offset += len(frame)
+    first_sequence = integration.frame_sequence
+    offset = 0
+    for chunk in chunked(b"".join(frames), args.chunk):
+        offset += len(chunk)
+        clock[0] = offset * byte_period # The chunk is read once its last byte is received
+        serial_protocol.data_received(chunk)
+
+    latencies = {}
+    for sequence, key, time in updates:
+        latencies.setdefault(key, []).append((time - line_ends[sequence - first_sequence][key]) * 1000)
+    return latencies
+
+
+def corrupt(frame, rng):
+    fault = rng.randrange(3)
+    if fault == 0:
+        return frame[:-1] # ETX lost
+    if fault == 1:
+        return frame[1:] # STX lost
+    position = rng.randrange(1, len(frame) - 1)
+    return frame[:position] + bytes((frame[position] ^ 0x01,)) + frame[position + 1:]
+
+
+def measure_recovery(args, streaming):
+    integration, serial_protocol = setup(args.protocol, streaming)
+    seen = [0]
+    changed_lines = integration._line_cache.changed_lines
+    def counted_lines(lines):
+        seen[0] += len(lines)
+        return changed_lines(lines)
+    changed = integration._line_cache.changed
+    def counted_line(line):
+        seen[0] += 1
+        return changed(line)
+    integration._line_cache.changed_lines = counted_lines
+    integration._line_cache.changed = counted_line
+
+    rng = random.Random(3)
+    generator = FrameGenerator(args.protocol, seed=4)
+    sent = corrupted = 0
+    stream = bytearray()
+    for _ in range(args.frames):
+        frame = generator.frame()
+        sent += frame.count(b"\r")
+        if rng.random() < args.corruption:
+            frame = corrupt(frame, rng)
+            corrupted += 1
+        stream += frame
+    errors = integration.checksum_sensor.state
+    for chunk in chunked(bytes(stream), args.chunk):
+        serial_protocol.data_received(chunk)
+    recovered = seen[0] - (integration.checksum_sensor.state - errors)
+    return sent, recovered, corrupted
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--protocol", choices=list(BAUD_RATES), default=TeleinfoProtocolType.STANDARD)
+    parser.add_argument("--frames", type=int, default=500)
+    parser.add_argument("--chunk", type=int, default=16, help="Size of the serial reads")
+    parser.add_argument("--corruption", type=float, default=0.2, help="Fraction of corrupted frames")
+    parser.add_argument("--keys", default="ADSC,EAST,IRMS1,SINSTS,STGE,PRM,PJOURF+1,ADCO,BASE,PAPP,IINST,MOTDETAT")
+    args = parser.parse_args()
+
+    print(f"{args.protocol}, {args.frames} frames, reads of {args.chunk} bytes")
+    latencies = {mode: measure_latency(args, streaming) for mode, streaming in MODES.items()}
+    print(f"{'p50 latency ms':>20}" + "".join(f"{mode:>12}" for mode in MODES))
+    for key in args.keys.split(","):
+        if all(key in result for result in latencies.values()):
+            print(f"{key:>20}" + "".join(f"{statistics.median(result[key]):12.1f}" for result in latencies.values()))
+
+    print(f"{args.corruption:.0%} corrupted frames")
+    results = {mode: measure_recovery(args, streaming) for mode, streaming in MODES.items()}
+    for mode, (sent, recovered, corrupted) in results.items():
+        print(f"{mode:>20}: {recovered}/{sent} lines, {(sent - recovered) / max(1, corrupted):5.1f} lines lost per corrupted frame")
+
+
+if __name__ == "__main__":
+    main()
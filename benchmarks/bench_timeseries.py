@@ -0,0 +1,72 @@
+"""Append throughput and range query latency of the time series files.
+
+Samples are a SINSTS-like random walk at one per second, appended and
+flushed by batches like the integration does every minute. With
+--interval 1800, they are spaced like the CCASN samples.
+
+    python -m benchmarks.bench_timeseries [--days 30] [--batch 60] [--points 500] [--interval 1]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from teleinfo.timeseries import SeriesFile, query_series
+
+RANGES = {"1h": 3600, "1d": 86400, "7d": 7 * 86400, "30d": 30 * 86400}
+
+
+def write(path, samples, batch):
+    series = SeriesFile(path)
+    start = time.perf_counter()
+    for offset in range(0, len(samples), batch):
+        for timestamp, value in samples[offset:offset + batch]:
+            series.append(timestamp, value)
+        series.flush()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=float, default=30)
+    parser.add_argument("--batch", type=int, default=60, help="Samples per flush")
+    parser.add_argument("--points", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--interval", type=float, default=1, help="Seconds between two samples")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    timestamp = 1_700_000_000_000
+    value = 1500
+    samples = []
+    for _ in range(int(args.days * 86400 / args.interval)):
+        timestamp += int(args.interval * 1000) + rng.randint(-20, 20)
+        value = max(0, value + rng.randint(-30, 30))
+        samples.append((timestamp, value))
+    first, last = samples[0][0], samples[-1][0]
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "SINSTS.bin")
+        elapsed = write(path, samples, args.batch)
+        size = os.path.getsize(path)
+        print(f"{len(samples)} samples, {args.days:g} days, flushed by {args.batch}")
+        print(f"{'append samples/s':>20}: {len(samples) / elapsed:12.0f}")
+        print(f"{'bytes/sample':>20}: {size / len(samples):12.2f}")
+        print(f"{'file size MB':>20}: {size / 1e6:12.2f}")
+
+        for name, seconds in RANGES.items():
+            if seconds * 1000 > last - first:
+                continue
+            latencies = []
+            for _ in range(args.queries):
+                start = rng.randint(first, last - seconds * 1000)
+                begin = time.perf_counter()
+                query_series(path, start, start + seconds * 1000, args.points)
+                latencies.append(time.perf_counter() - begin)
+            print(f"{'query ' + name + ' p50 ms':>20}: {statistics.median(latencies) * 1000:12.2f}")
+
+
+if __name__ == "__main__":
+    main()
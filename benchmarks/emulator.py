@@ -0,0 +1,289 @@
+"""Teleinfo meter emulator on a Linux pseudo-terminal.
+
+The slave side of the pty is opened by the integration like a USB TIC
+dongle, frames are written on the master side at the line rate (10 bits
+per byte in 7E1) multiplied by speed. Faults can be injected: noise
+between frames, frames cut before their end and lost STX/ETX delimiters.
+With rx_buffer, bytes that don't fit in the receive buffer of the port are
+dropped like a UART overrun, instead of blocking the writer.
+
+The emulated dongle can be unplugged and plugged again, on a new pty like
+a reset USB dongle. With link, the port is a stable symlink to the current
+pty, like the /dev/serial/by-id paths of the dongles.
+
+TcpMeterEmulator sends the frames to a TCP client instead, like ser2net
+in raw mode or a TIC bridge, on a socket://127.0.0.1:port port.
+
+    python -m benchmarks.emulator [--protocol standard] [--speed 1] [--capture FILE]
+                                  [--noise RATE] [--partial RATE] [--drop-delimiter RATE]
+                                  [--rx-buffer BYTES] [--record FILE] [--tcp]
+"""
+import argparse
+import fcntl
+import os
+import pty
+import random
+import socket
+import struct
+import termios
+import threading
+import time
+import tty
+
+from teleinfo.const import TeleinfoProtocolType
+from teleinfo.transport import BITS_PER_BYTE
+
+from .frames import STX, ETX
+from .generator import FrameGenerator
+
+BAUD_RATES = {
+    TeleinfoProtocolType.STANDARD: 9600,
+    TeleinfoProtocolType.HISTORIQUE: 1200,
+}
+
+
+class MeterEmulator:
+
+    CHUNK_SIZE = 16
+
+    def __init__(self, frames, baudrate, speed=1.0, noise=0.0, partial=0.0, drop_delimiter=0.0, seed=0, rx_buffer=None, link=None):
+        """frames is an iterable of frames, e.g. from FrameGenerator or a split capture"""
+        self._frames = iter(frames)
+        self._byte_period = BITS_PER_BYTE / baudrate / speed
+        self.noise = noise
+        self.partial = partial
+        self.drop_delimiter = drop_delimiter
+        self.rx_buffer = rx_buffer
+        self._random = random.Random(seed)
+        self.link = link
+        self._lock = threading.Lock() # Held while the pty is written, unplugged or plugged
+        self._plugged = False
+        self._plug()
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_write_time = None
+        self.written_bytes = 0
+        self.sent_frames = 0
+        self.injected_faults = 0
+        self.lost_bytes = 0
+        self.frame_end_times = [] # perf_counter() when the ETX of each complete frame is written
+
+    def _fault(self, frame):
+        """Return the bytes written for the frame and whether it is still a valid frame"""
+        rate = self._random.random
+        if self.partial and rate() < self.partial:
+            self.injected_faults += 1
+            return frame[:self._random.randrange(1, len(frame) - 1)], False
+        if self.drop_delimiter and rate() < self.drop_delimiter:
+            self.injected_faults += 1
+            return (frame[1:] if rate() < 0.5 else frame[:-1]), False
+        if self.noise and rate() < self.noise:
+            self.injected_faults += 1
+            noise = bytes(self._random.randrange(0x20, 0x7f) for _ in range(self._random.randrange(1, 32)))
+            return noise + frame, True
+        return frame, True
+
+    def _write(self, data):
+        start = time.perf_counter()
+        for offset in range(0, len(data), self.CHUNK_SIZE):
+            if self._stop.is_set():
+                return
+            chunk = data[offset:offset + self.CHUNK_SIZE]
+            # A chunk is available once its last byte would have been received on the line
+            delay = start + (offset + len(chunk)) * self._byte_period - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            self._last_write_time = time.perf_counter()
+            self._send(chunk)
+
+    def _send(self, chunk):
+        """Write chunk on the master side, waiting for the reader when the pty buffer is full"""
+        while chunk and not self._stop.is_set():
+            with self._lock:
+                if not self._plugged: # Sent on the line, received by nobody
+                    self.lost_bytes += len(chunk)
+                    return
+                if self.rx_buffer:
+                    chunk = self._overrun(chunk)
+                try:
+                    written = os.write(self._master, chunk)
+                except BlockingIOError:
+                    written = 0
+                self.written_bytes += written
+            chunk = chunk[written:]
+            if chunk:
+                time.sleep(self._byte_period)
+
+    def _overrun(self, chunk):
+        """Drop the bytes the reader didn't make room for"""
+        queued = struct.unpack("i", fcntl.ioctl(self._slave, termios.FIONREAD, b"\0\0\0\0"))[0]
+        room = max(0, self.rx_buffer - queued)
+        if room < len(chunk):
+            self.lost_bytes += len(chunk) - room
+            return chunk[:room]
+        return chunk
+
+    def _plug(self):
+        self._master, self._slave = pty.openpty()
+        os.set_blocking(self._master, False) # A full buffer doesn't block unplug
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        if self.link:
+            temporary = f"{self.link}.new"
+            os.symlink(self.port, temporary)
+            os.replace(temporary, self.link)
+            self.port = self.link
+        self._plugged = True
+
+    def unplug(self):
+        """Close the pty, the reader of the port gets an error like on a USB dongle reset"""
+        with self._lock:
+            if not self._plugged:
+                return
+            self._plugged = False
+            os.close(self._master)
+            os.close(self._slave)
+            if self.link:
+                os.unlink(self.link)
+
+    def replug(self):
+        """Open a new pty, the frames are written on it from the next chunk"""
+        with self._lock:
+            if not self._plugged:
+                self._plug()
+
+    def run(self):
+        for frame in self._frames:
+            if self._stop.is_set():
+                break
+            data, complete = self._fault(frame)
+            self._write(data)
+            if complete and data.endswith(ETX):
+                self.frame_end_times.append(self._last_write_time)
+            self.sent_frames += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="teleinfo-emulator", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def close(self):
+        self.stop()
+        self.unplug()
+
+    def wait(self):
+        self._thread.join()
+
+
+class TcpMeterEmulator(MeterEmulator):
+    """Meter behind a ser2net raw port or a TIC bridge, frames sent before a client connects are lost"""
+
+    _tcp_port = 0 # Same port once replugged
+
+    def _plug(self):
+        self._listener = socket.create_server(("127.0.0.1", self._tcp_port))
+        self._listener.setblocking(False)
+        self._tcp_port = self._listener.getsockname()[1]
+        self._client = None
+        self.port = f"socket://127.0.0.1:{self._tcp_port}"
+        self._plugged = True
+
+    def _send(self, chunk):
+        with self._lock:
+            if self._plugged and self._client is None:
+                try:
+                    self._client, _ = self._listener.accept()
+                    self._client.setblocking(True)
+                except BlockingIOError:
+                    pass
+            if self._client is None:
+                self.lost_bytes += len(chunk)
+                return
+            try:
+                self._client.sendall(chunk)
+                self.written_bytes += len(chunk)
+            except OSError: # The client disconnected
+                self._client.close()
+                self._client = None
+                self.lost_bytes += len(chunk)
+
+    def unplug(self):
+        """Close the connection and stop listening, like a bridge powered off"""
+        with self._lock:
+            if not self._plugged:
+                return
+            self._plugged = False
+            if self._client:
+                self._client.close()
+                self._client = None
+            self._listener.close()
+
+
+def pty_accepts_7e1():
+    """Some kernels reject 7 bits and parity settings on pseudo-terminals"""
+    master, slave = pty.openpty()
+    try:
+        attributes = termios.tcgetattr(slave)
+        attributes[2] = (attributes[2] & ~termios.CSIZE) | termios.CS7 | termios.PARENB
+        termios.tcsetattr(slave, termios.TCSANOW, attributes)
+        return True
+    except termios.error:
+        return False
+    finally:
+        os.close(master)
+        os.close(slave)
+
+
+def split_capture(data):
+    """Frames of a raw capture, bytes before the first STX are dropped"""
+    start = data.find(STX)
+    return [STX + frame for frame in data[start + 1:].split(STX) if frame.endswith(ETX)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--protocol", choices=list(BAUD_RATES), default=TeleinfoProtocolType.STANDARD)
+    parser.add_argument("--speed", type=float, default=1.0, help="Line rate multiplier")
+    parser.add_argument("--capture", help="Raw capture to replay instead of generated frames")
+    parser.add_argument("--frames", type=int, default=0, help="Number of frames, 0 for endless")
+    parser.add_argument("--noise", type=float, default=0.0)
+    parser.add_argument("--partial", type=float, default=0.0)
+    parser.add_argument("--drop-delimiter", type=float, default=0.0)
+    parser.add_argument("--rx-buffer", type=int, help="Emulate a receive buffer of this size, overrun bytes are lost")
+    parser.add_argument("--record", help="Write the generated frames to a capture file and exit")
+    parser.add_argument("--tcp", action="store_true", help="Serve the frames on a local TCP port instead of a pty")
+    args = parser.parse_args()
+
+    generator = FrameGenerator(args.protocol)
+    if args.record:
+        with open(args.record, "wb") as f:
+            f.write(generator.stream(args.frames or 100))
+        return
+
+    if args.capture:
+        with open(args.capture, "rb") as f:
+            frames = split_capture(f.read())
+    else:
+        frames = iter(generator.frame, None)
+    if args.frames:
+        frames = (frame for _, frame in zip(range(args.frames), frames))
+
+    emulator_class = TcpMeterEmulator if args.tcp else MeterEmulator
+    emulator = emulator_class(frames, BAUD_RATES[args.protocol], args.speed, args.noise, args.partial, args.drop_delimiter, rx_buffer=args.rx_buffer)
+    print(f"Emulated {args.protocol} meter on {emulator.port}")
+    emulator.start()
+    try:
+        emulator.wait()
+    except KeyboardInterrupt:
+        pass
+    emulator.close()
+    print(f"{emulator.sent_frames} frames, {emulator.written_bytes} bytes, {emulator.injected_faults} faults, {emulator.lost_bytes} bytes lost")
+
+
+if __name__ == "__main__":
+    main()
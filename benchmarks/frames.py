@@ -0,0 +1,99 @@
+"""Sample teleinfo frames used by the benchmarks"""
+
+STX = b"\x02"
+ETX = b"\x03"
+
+STANDARD_LINES = [
+    ("ADSC", None, "041876097314"),
+    ("VTIC", None, "02"),
+    ("DATE", "E230315120005", ""),
+    ("NGTF", None, "     TEMPO      "),
+    ("LTARF", None, "  HP  BLEU      "),
+    ("EAST", None, "012345678"),
+    ("EASF01", None, "004567891"),
+    ("EASF02", None, "007777787"),
+    ("EASF03", None, "000000000"),
+    ("EASF04", None, "000000000"),
+    ("EASF05", None, "000000000"),
+    ("EASF06", None, "000000000"),
+    ("EASF07", None, "000000000"),
+    ("EASF08", None, "000000000"),
+    ("EASF09", None, "000000000"),
+    ("EASF10", None, "000000000"),
+    ("EASD01", None, "004567891"),
+    ("EASD02", None, "007777787"),
+    ("EASD03", None, "000000000"),
+    ("EASD04", None, "000000000"),
+    ("IRMS1", None, "003"),
+    ("URMS1", None, "236"),
+    ("PREF", None, "09"),
+    ("PCOUP", None, "09"),
+    ("SINSTS", None, "00752"),
+    ("SMAXSN", "E230315063251", "03210"),
+    ("SMAXSN-1", "E230314190433", "04782"),
+    ("CCASN", "E230315120000", "00644"),
+    ("CCASN-1", "E230315113000", "00701"),
+    ("UMOY1", "E230315120000", "235"),
+    ("STGE", None, "003A0001"),
+    ("MSG1", None, "PAS DE          MESSAGE         "),
+    ("PRM", None, "01234567890123"),
+    ("RELAIS", None, "000"),
+    ("NTARF", None, "02"),
+    ("NJOURF", None, "00"),
+    ("NJOURF+1", None, "00"),
+    ("PJOURF+1", None, "00008001 06008002 22008001 NONUTILE NONUTILE NONUTILE NONUTILE NONUTILE NONUTILE NONUTILE NONUTILE"),
+]
+
+HISTORIQUE_LINES = [
+    ("ADCO", None, "031762120146"),
+    ("OPTARIF", None, "HC.."),
+    ("ISOUSC", None, "45"),
+    ("HCHC", None, "050237183"),
+    ("HCHP", None, "075436275"),
+    ("PTEC", None, "HP.."),
+    ("IINST", None, "003"),
+    ("IMAX", None, "090"),
+    ("PAPP", None, "00750"),
+    ("HHPHC", None, "A"),
+    ("MOTDETAT", None, "000000"),
+]
+
+
+def checksum(payload):
+    return bytes(((sum(payload) & 0x3F) + 0x20,))
+
+
+def encode_line(label, timestamp, value, separator):
+    fields = [label] if timestamp is None else [label, timestamp]
+    fields.append(value)
+    payload = separator.join(fields).encode("ascii")
+    if separator == "\t": # Standard checksum includes the last separator (mode 2)
+        return payload + b"\t" + checksum(payload + b"\t")
+    return payload + b" " + checksum(payload) # Historique, mode 1
+
+
+def encode_frame(lines, separator):
+    body = b"".join(b"\n" + encode_line(*line, separator) + b"\r" for line in lines)
+    return STX + body + ETX
+
+
+def standard_frame():
+    return encode_frame(STANDARD_LINES, "\t")
+
+
+def historique_frame():
+    return encode_frame(HISTORIQUE_LINES, " ")
+
+
+def chunked(stream, size):
+    return [stream[i:i + size] for i in range(0, len(stream), size)]
+
+
+def standard_frames(count, adsc="041876097314"):
+    """Frames of a meter whose date, power and index change over time"""
+    frames = []
+    for i in range(count):
+        values = {"ADSC": adsc, "SINSTS": f"{700 + i * 7 % 300:05d}", "IRMS1": f"{3 + i % 2:03d}", "EAST": f"{12345678 + i // 10:09d}", "EASF02": f"{7777787 + i // 10:09d}"}
+        lines = [(label, f"E2303151{i % 100000:05d}" if label == "DATE" else timestamp, values.get(label, value)) for label, timestamp, value in STANDARD_LINES]
+        frames.append(encode_frame(lines, "\t"))
+    return frames
@@ -0,0 +1,125 @@
+"""Synthetic teleinfo frames generated from TELEINFO_KEY.
+
+Values follow the metadata of each key: indexes only increase, instantaneous
+metrics drift around a base value, timestamps follow the frame clock and
+every line has a valid checksum unless it is deliberately corrupted.
+"""
+import datetime
+import random
+
+from homeassistant.components.sensor import SensorStateClass
+
+from teleinfo.const import TELEINFO_KEY, TeleinfoProtocolType, TeleinfoIndex
+
+from .frames import STANDARD_LINES, HISTORIQUE_LINES, STX, ETX, encode_line, chunked
+
+_labels = list(TELEINFO_KEY)
+HISTORIQUE_KEYS = _labels[_labels.index("ADCO"):]
+STANDARD_KEYS = _labels[:_labels.index("ADCO")]
+
+# Keys of a typical single phase meter
+DEFAULT_KEYS = {
+    TeleinfoProtocolType.STANDARD: [label for label, _, _ in STANDARD_LINES],
+    TeleinfoProtocolType.HISTORIQUE: [label for label, _, _ in HISTORIQUE_LINES],
+}
+
+SEPARATORS = {
+    TeleinfoProtocolType.STANDARD: "\t",
+    TeleinfoProtocolType.HISTORIQUE: " ",
+}
+
+# Seconds between two frames at the protocol baud rate
+FRAME_PERIODS = {
+    TeleinfoProtocolType.STANDARD: 1.0,
+    TeleinfoProtocolType.HISTORIQUE: 1.5,
+}
+
+# Values that must have a meaning for the integration
+STR_VALUES = {
+    "ADSC": "041876097314",
+    "ADCO": "031762120146",
+    "STGE": "003A0001",
+    "OPTARIF": "HC..",
+    "PTEC": "HP..",
+    "NGTF": "     TEMPO      ",
+    "LTARF": "  HP  BLEU      ",
+    "MSG1": "PAS DE          MESSAGE         ",
+    "DEMAIN": "----",
+    "HHPHC": "A",
+    "PPOT": "00",
+}
+
+
+class FrameGenerator:
+
+    def __init__(self, protocol=TeleinfoProtocolType.STANDARD, keys=None, corruption=0.0, seed=0, start=None, device_id=None):
+        self.protocol = protocol
+        self.keys = keys or DEFAULT_KEYS[protocol]
+        self.corruption = corruption
+        self.separator = SEPARATORS[protocol]
+        self.period = FRAME_PERIODS[protocol]
+        self.time = start or datetime.datetime(2023, 3, 15, 12, 0, 0)
+        self._random = random.Random(seed)
+        self._values = {key: self._initial_value(key) for key in self.keys}
+        if device_id:
+            self._values["ADSC" if protocol == TeleinfoProtocolType.STANDARD else "ADCO"] = device_id
+        self.frames = 0
+        self.corrupted_lines = 0
+
+    def _initial_value(self, key):
+        metadata = TELEINFO_KEY[key]
+        if metadata["content_type"] is str:
+            return STR_VALUES.get(key, "0" * metadata["metric_length"])
+        length = metadata["metric_length"]
+        if metadata.get("class") is TeleinfoIndex:
+            return self._random.randrange(10 ** (length - 2))
+        return self._random.randrange(1, min(10 ** length, 1000))
+
+    def _next_value(self, key, value):
+        metadata = TELEINFO_KEY[key]
+        if metadata["content_type"] is str or key == "VTIC":
+            return value
+        properties_class = metadata.get("class")
+        if properties_class is TeleinfoIndex:
+            return value + self._random.randrange(2) # About 1 Wh per frame
+        if properties_class is not None and properties_class._attr_state_class == SensorStateClass.MEASUREMENT and not metadata.get("timestamp"):
+            return max(0, min(10 ** metadata["metric_length"] - 1, value + self._random.randint(-10, 10)))
+        return value
+
+    def _format(self, key, value):
+        if isinstance(value, str):
+            return value
+        return f"{value:0{TELEINFO_KEY[key]['metric_length']}d}"
+
+    def _timestamp(self):
+        return "E" + self.time.strftime("%y%m%d%H%M%S") # E: summer time
+
+    def _corrupt(self, line):
+        self.corrupted_lines += 1
+        position = self._random.randrange(len(line) - 1)
+        return line[:position] + bytes((line[position] ^ 0x01,)) + line[position + 1:]
+
+    def lines(self):
+        lines = []
+        timestamp = self._timestamp()
+        for key in self.keys:
+            value = self._values[key] = self._next_value(key, self._values[key])
+            metadata = TELEINFO_KEY[key]
+            line = encode_line(key, timestamp if metadata.get("timestamp") else None, "" if key == "DATE" else self._format(key, value), self.separator)
+            if self.corruption and self._random.random() < self.corruption:
+                line = self._corrupt(line)
+            lines.append(line)
+        return lines
+
+    def frame(self):
+        frame = STX + b"".join(b"\n" + line + b"\r" for line in self.lines()) + ETX
+        self.frames += 1
+        self.time += datetime.timedelta(seconds=self.period)
+        return frame
+
+    def stream(self, frames):
+        return b"".join(self.frame() for _ in range(frames))
+
+    def chunks(self, frames, chunk_size):
+        """Stream of frames split like serial port reads"""
+        return chunked(self.stream(frames), chunk_size)
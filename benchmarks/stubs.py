@@ -0,0 +1,28 @@
+"""Run the integration without Home Assistant: entities are written to a dict"""
+import time
+from types import SimpleNamespace
+
+from teleinfo.sensor import TeleinfoMetricSensor, TeleinfoChecksumErrorSensor, TeleinfoDiagnosticSensor
+
+
+class StubHass:
+    def __init__(self):
+        self.states = {}
+        self.writes = 0
+        self.loop = SimpleNamespace(time=time.monotonic)
+
+
+def write_state(self):
+    self.hass.writes += 1
+    self.hass.states[self._attr_unique_id] = self.state
+
+
+def stub_entities(integration, hass):
+    """Attach the entities of an initialized integration to the stub hass"""
+    for entity in integration.get_entities():
+        entity.hass = hass
+
+
+TeleinfoMetricSensor.async_write_ha_state = write_state
+TeleinfoChecksumErrorSensor.async_write_ha_state = write_state
+TeleinfoDiagnosticSensor.async_write_ha_state = write_state
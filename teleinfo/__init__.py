@@ -1,31 +1,116 @@
+import asyncio
+import functools
 import logging
 
+import voluptuous as vol
+
 from homeassistant import config_entries, core
 from homeassistant.const import Platform
+from homeassistant.exceptions import HomeAssistantError
+import homeassistant.helpers.config_validation as cv
+import homeassistant.util.dt as dt_util
 
-from .const import DOMAIN, TELEINFO_KEY
+from .const import DOMAIN, TIMESERIES_KEYS, SERVICE_QUERY_TIMESERIES, SERVICE_PROFILE
 
 _LOGGER = logging.getLogger(__name__)
 
-def init_teleinfo_metadata():
-    # Calculate the length of payload checksum validation
-    for k, v in TELEINFO_KEY.items():
-        if v.get("timestamp", False):
-            payload_length = len(k) + 1 + 13 + 1 + v["metric_length"] + 1
-            v["payload_length"] = payload_length
-        else:
-            payload_length = len(k) + 1 + v["metric_length"] + 1
-            v["payload_length"] = payload_length
-
 async def async_setup_entry(
     hass: core.HomeAssistant, entry: config_entries.ConfigEntry
 ) -> bool:
     """Set up platform from a ConfigEntry."""
-    init_teleinfo_metadata()
-    hass.data.setdefault(DOMAIN, {})[entry.entry_id] = {"port": entry.data["serial_port"], "type": entry.data["teleinfo_type"]}
+    # A concentrator entry reads several meters, one per serial port
+    ports = entry.data.get("serial_ports") or [entry.data["serial_port"]]
+    hass.data.setdefault(DOMAIN, {})[entry.entry_id] = {"ports": ports, "type": entry.data["teleinfo_type"], "options": dict(entry.options)}
+    entry.async_on_unload(entry.add_update_listener(async_update_options))
+    if not hass.services.has_service(DOMAIN, SERVICE_QUERY_TIMESERIES):
+        hass.services.async_register(DOMAIN, SERVICE_QUERY_TIMESERIES, functools.partial(async_query_timeseries, hass), schema=QUERY_TIMESERIES_SCHEMA, supports_response=core.SupportsResponse.ONLY)
+    if not hass.services.has_service(DOMAIN, SERVICE_PROFILE):
+        hass.services.async_register(DOMAIN, SERVICE_PROFILE, functools.partial(async_profile, hass), schema=PROFILE_SCHEMA, supports_response=core.SupportsResponse.OPTIONAL)
     # Forward the setup to the sensor platform.
     hass.async_create_task(
         hass.config_entries.async_forward_entry_setup(entry, Platform.SENSOR)
     )
     
     return True
+
+
+async def async_update_options(hass: core.HomeAssistant, entry: config_entries.ConfigEntry):
+    """Apply the options to the running integration, without reloading the entry."""
+    config = hass.data[DOMAIN][entry.entry_id]
+    config["options"] = dict(entry.options)
+    for integration in config.get("integrations", []):
+        integration.set_options(config["options"])
+
+
+QUERY_TIMESERIES_SCHEMA = vol.Schema({
+    vol.Required("meter"): cv.string,
+    vol.Required("key"): vol.In(TIMESERIES_KEYS),
+    vol.Required("start"): cv.datetime,
+    vol.Optional("end"): cv.datetime,
+    vol.Optional("points", default=500): vol.All(vol.Coerce(int), vol.Range(min=1, max=10000)),
+})
+
+
+async def async_query_timeseries(hass: core.HomeAssistant, call: core.ServiceCall) -> core.ServiceResponse:
+    """Down-sampled range of the time series of a meter, read without loading the whole file."""
+    meter = call.data["meter"]
+    recorders = [config["timeseries"] for config in hass.data.get(DOMAIN, {}).values() if "timeseries" in config]
+    if not recorders:
+        raise HomeAssistantError("No teleinfo time series recorded, check the retention option")
+    start = dt_util.as_utc(call.data["start"])
+    end = dt_util.as_utc(call.data["end"]) if "end" in call.data else dt_util.utcnow()
+    for recorder in recorders:
+        await hass.async_add_executor_job(recorder.flush) # Samples of the last minute included
+    points = await hass.async_add_executor_job(
+        recorders[0].query, meter, call.data["key"], int(start.timestamp() * 1000), int(end.timestamp() * 1000), call.data["points"]
+    )
+    for point in points:
+        point["time"] = dt_util.utc_from_timestamp(point["time"] / 1000).isoformat()
+    return {"points": points}
+
+
+PROFILE_SCHEMA = vol.Schema({
+    vol.Optional("meter"): cv.string,
+    vol.Optional("frames", default=100): vol.All(vol.Coerce(int), vol.Range(min=1, max=100000)),
+    vol.Optional("seconds", default=300): vol.All(vol.Coerce(float), vol.Range(min=1, max=3600)),
+    vol.Optional("allocations", default=False): cv.boolean,
+})
+
+
+async def async_profile(hass: core.HomeAssistant, call: core.ServiceCall) -> core.ServiceResponse:
+    """Profile the frame processing for a number of frames or seconds, and write a report to the config directory."""
+    integrations = [
+        integration
+        for config in hass.data.get(DOMAIN, {}).values()
+        for integration in config.get("integrations", [])
+        if "meter" not in call.data or integration.device_id == call.data["meter"]
+    ]
+    if not integrations:
+        raise HomeAssistantError("No teleinfo meter is running")
+    if any(integration.profiling for integration in integrations):
+        raise HomeAssistantError("A profile is already running")
+    if not any(integration.frame_callbacks() for integration in integrations):
+        raise HomeAssistantError("No teleinfo meter is connected, no frame to profile")
+    # Only imported when profiling, like cProfile and tracemalloc
+    from .profiling import FrameProfiler, write_report
+
+    profiler = FrameProfiler(call.data["frames"], call.data["allocations"])
+    done = asyncio.Event()
+    profiler.on_done = done.set
+    await hass.async_add_executor_job(profiler.start)
+    for integration in integrations:
+        integration.start_profiling(profiler)
+    try:
+        await asyncio.wait_for(done.wait(), call.data["seconds"])
+    except asyncio.TimeoutError:
+        _LOGGER.info(f"Profile stopped after {call.data['seconds']}s, {profiler.profiled_frames} frames profiled")
+    finally:
+        for integration in integrations:
+            integration.stop_profiling()
+    elapsed = profiler.elapsed
+    profile, allocations = await hass.async_add_executor_job(profiler.stop)
+    pstats_path, report_path = await hass.async_add_executor_job(
+        write_report, hass.config.path(DOMAIN, "profiles"), f"profile_{dt_util.now():%Y%m%d_%H%M%S}", profile, allocations, profiler.profiled_frames, elapsed
+    )
+    _LOGGER.info(f"Profile of {profiler.profiled_frames} frames written to {report_path}")
+    return {"frames": profiler.profiled_frames, "seconds": round(elapsed, 1), "pstats": pstats_path, "report": report_path}
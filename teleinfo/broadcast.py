@@ -0,0 +1,130 @@
+"""Re-broadcast of the frames of the meters to local consumers.
+
+A serial port can only be opened by one process. The frames processed by
+the integration are served on a TCP port and/or a Unix socket, as JSON
+lines of the values or as raw frames. Each frame is encoded once and the
+same bytes are handed to every client, whatever their number, and nothing
+is encoded while no client is connected. A slow client gets a bounded
+queue of frames, the oldest are dropped.
+"""
+import asyncio
+import collections
+import functools
+import json
+import logging
+import time
+
+from .const import BROADCAST_QUEUE_FRAMES, BROADCAST_WRITE_BUFFER
+
+logger = logging.getLogger(__name__)
+
+
+class BroadcastClient(asyncio.Protocol):
+    """Connection of a consumer, frames are queued while its transport is paused"""
+
+    def __init__(self, broadcaster):
+        self._broadcaster = broadcaster
+        self._transport = None
+        self._queue = collections.deque(maxlen=BROADCAST_QUEUE_FRAMES)
+        self._paused = False
+        self.dropped_frames = 0
+
+    def connection_made(self, transport):
+        self._transport = transport
+        transport.set_write_buffer_limits(high=BROADCAST_WRITE_BUFFER)
+        self._broadcaster.add_client(self)
+
+    def connection_lost(self, exc):
+        self._broadcaster.remove_client(self)
+
+    def data_received(self, data):
+        pass # Nothing is expected from the consumers
+
+    def pause_writing(self):
+        self._paused = True
+
+    def resume_writing(self):
+        self._paused = False
+        queue = self._queue
+        while queue and not self._paused:
+            self._transport.write(queue.popleft())
+
+    def send(self, message):
+        if self._paused or self._queue: # Frames kept in order
+            if len(self._queue) == BROADCAST_QUEUE_FRAMES:
+                self.dropped_frames += 1
+            self._queue.append(message)
+        else:
+            self._transport.write(message)
+
+    def close(self):
+        self._transport.close()
+
+
+class FrameBroadcaster:
+    """Servers sharing the frames of the integrations with their clients"""
+
+    def __init__(self, integrations, format="json"):
+        self._integrations = integrations
+        self._format = format
+        self._clients = set()
+        self._servers = []
+        self._remove_listeners = []
+        self.messages = 0 # Frames encoded, once for all the clients
+        self.dropped_frames = 0 # Of the disconnected clients
+
+    @property
+    def clients(self):
+        return len(self._clients)
+
+    async def start(self, host=None, port=0, path=None):
+        loop = asyncio.get_running_loop()
+        if port:
+            self._servers.append(await loop.create_server(functools.partial(BroadcastClient, self), host, port))
+            logger.info(f"Broadcasting teleinfo frames as {self._format} on {host or '*'}:{port}")
+        if path:
+            self._servers.append(await loop.create_unix_server(functools.partial(BroadcastClient, self), path))
+            logger.info(f"Broadcasting teleinfo frames as {self._format} on {path}")
+        return self
+
+    def stop(self):
+        for server in self._servers:
+            server.close()
+        self._servers = []
+        for client in list(self._clients):
+            client.close()
+
+    def add_client(self, client):
+        if not self._clients:
+            self._subscribe()
+        self._clients.add(client)
+
+    def remove_client(self, client):
+        self._clients.discard(client)
+        self.dropped_frames += client.dropped_frames
+        if not self._clients:
+            self._unsubscribe()
+
+    def _subscribe(self):
+        for integration in self._integrations:
+            if self._format == "raw":
+                integration.on_raw_frame = self.publish
+            else:
+                self._remove_listeners.append(integration.add_frame_listener(functools.partial(self._publish_values, integration)))
+
+    def _unsubscribe(self):
+        for integration in self._integrations:
+            integration.on_raw_frame = None
+        for remove in self._remove_listeners:
+            remove()
+        self._remove_listeners = []
+
+    def _publish_values(self, integration, sequence, changed):
+        values = {key: metric.value for key, metric in integration.metrics.items()} # Last decoded values
+        message = {"port": integration.port, "device_id": integration.device_id, "sequence": sequence, "time": round(time.time(), 3), "values": values}
+        self.publish(json.dumps(message, default=str).encode() + b"\n")
+
+    def publish(self, message):
+        self.messages += 1
+        for client in self._clients:
+            client.send(message)
@@ -1,5 +1,4 @@
-import serial.tools.list_ports
-
+import importlib
 import logging
 
 from typing import Any, Dict, Optional
@@ -9,7 +8,8 @@ import homeassistant.helpers.config_validation as cv
 
 import voluptuous as vol
 
-from .const import DOMAIN
+from .transport import is_socket_port, is_rfc2217_port, parse_socket_port
+from .const import DOMAIN, THROTTLED_METRIC_CLASSES, CONF_MIN_INTERVAL, CONF_DEADBAND, CONF_RELATIVE_DEADBAND, CONF_READER_THREAD, CONF_STREAMING, CONF_BROADCAST_HOST, CONF_BROADCAST_PORT, CONF_BROADCAST_SOCKET, CONF_BROADCAST_FORMAT, BROADCAST_FORMATS, CONF_HOURLY_STATISTICS, CONF_TIMESERIES_RETENTION, TIMESERIES_RETENTION
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -19,18 +19,30 @@ class TeleinfoSerialConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     # Home Assistant will call your migrate method if the version changes
     VERSION = 1
 
+    @staticmethod
+    @core.callback
+    def async_get_options_flow(config_entry: config_entries.ConfigEntry):
+        return TeleinfoOptionsFlow(config_entry)
+
     async def async_step_user(self, user_input: Optional[Dict[str, Any]] = None):
+        # A single meter, or a concentrator reading several meters of the same type
+        return self.async_show_menu(step_id="user", menu_options=["meter", "concentrator", "network"])
+
+    async def _list_ports(self):
+        # pyserial is imported when the ports are listed, not when the integration is loaded
+        list_ports = await self.hass.async_add_executor_job(importlib.import_module, "serial.tools.list_ports")
+        available_ports = await self.hass.async_add_executor_job(list_ports.comports)
+        return [port.device for port in available_ports]
+
+    async def async_step_meter(self, user_input: Optional[Dict[str, Any]] = None):
         errors: Dict[str, str] = {}
         config_entry = dict()
         
         
-        available_ports = await self.hass.async_add_executor_job(serial.tools.list_ports.comports)
-        port_options = []
-        teleinfo_type_options = ['historique', 'standard']
+        port_options = await self._list_ports()
+        teleinfo_type_options = ['auto', 'historique', 'standard']
 
         config_fieldset = dict()
-        for port in available_ports:
-            port_options.append(port.device)
 
         if not port_options:
             # No serial ports found
@@ -45,12 +57,92 @@ class TeleinfoSerialConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             data = config_entry | user_input
             return self.async_create_entry(title=f"Teleinfo serial", data=data)
         
-        config_fieldset[vol.Required("teleinfo_type")] = vol.In(teleinfo_type_options)
+        config_fieldset[vol.Required("teleinfo_type", default="auto")] = vol.In(teleinfo_type_options)
         
         CONFIG_SCHEMA  = vol.Schema(config_fieldset)
 
         return self.async_show_form(
-            step_id="user", 
+            step_id="meter", 
+            data_schema=CONFIG_SCHEMA,
+            errors=errors
+        )
+
+    async def async_step_concentrator(self, user_input: Optional[Dict[str, Any]] = None):
+        errors: Dict[str, str] = {}
+        port_options = await self._list_ports()
+        if not port_options:
+            return self.async_abort(reason="no_ports")
+
+        if user_input is not None:
+            if user_input["serial_ports"]:
+                return self.async_create_entry(title=f"Teleinfo concentrator ({len(user_input['serial_ports'])} meters)", data=user_input)
+            errors["serial_ports"] = "no_port_selected"
+
+        CONFIG_SCHEMA = vol.Schema({
+            vol.Required("serial_ports", default=port_options): cv.multi_select(port_options),
+            vol.Required("teleinfo_type", default="auto"): vol.In(['auto', 'historique', 'standard'])
+        })
+
+        return self.async_show_form(
+            step_id="concentrator",
             data_schema=CONFIG_SCHEMA,
             errors=errors
         )
+
+
+    async def async_step_network(self, user_input: Optional[Dict[str, Any]] = None):
+        # A meter behind ser2net or a TIC bridge, not listed with the local serial ports
+        errors: Dict[str, str] = {}
+        if user_input is not None:
+            port = user_input["serial_port"]
+            try:
+                if not (is_socket_port(port) or is_rfc2217_port(port)):
+                    raise ValueError(port)
+                parse_socket_port(port)
+            except ValueError:
+                errors["serial_port"] = "invalid_url"
+            else:
+                return self.async_create_entry(title=f"Teleinfo {port}", data=user_input)
+
+        CONFIG_SCHEMA = vol.Schema({
+            vol.Required("serial_port", default="socket://"): str,
+            vol.Required("teleinfo_type", default="auto"): vol.In(['auto', 'historique', 'standard'])
+        })
+
+        return self.async_show_form(
+            step_id="network",
+            data_schema=CONFIG_SCHEMA,
+            errors=errors
+        )
+
+
+class TeleinfoOptionsFlow(config_entries.OptionsFlow):
+
+    def __init__(self, config_entry: config_entries.ConfigEntry):
+        self.config_entry = config_entry
+
+    async def async_step_init(self, user_input: Optional[Dict[str, Any]] = None):
+        if user_input is not None:
+            return self.async_create_entry(title="", data=user_input)
+
+        options = self.config_entry.options
+        positive_float = vol.All(vol.Coerce(float), vol.Range(min=0))
+        options_fieldset = dict()
+        # State writes throttling per metric class, 0 disables it
+        for properties_class in THROTTLED_METRIC_CLASSES:
+            for suffix, validator in ((CONF_MIN_INTERVAL, cv.positive_int), (CONF_DEADBAND, positive_float), (CONF_RELATIVE_DEADBAND, positive_float)):
+                option = f"{properties_class.throttle_option}_{suffix}"
+                options_fieldset[vol.Optional(option, default=options.get(option, 0))] = validator
+        options_fieldset[vol.Optional(CONF_READER_THREAD, default=options.get(CONF_READER_THREAD, False))] = cv.boolean
+        options_fieldset[vol.Optional(CONF_STREAMING, default=options.get(CONF_STREAMING, False))] = cv.boolean
+        options_fieldset[vol.Optional(CONF_HOURLY_STATISTICS, default=options.get(CONF_HOURLY_STATISTICS, False))] = cv.boolean
+        options_fieldset[vol.Optional(CONF_TIMESERIES_RETENTION, default=options.get(CONF_TIMESERIES_RETENTION, TIMESERIES_RETENTION))] = cv.positive_int
+        options_fieldset[vol.Optional(CONF_BROADCAST_HOST, default=options.get(CONF_BROADCAST_HOST, "127.0.0.1"))] = str
+        options_fieldset[vol.Optional(CONF_BROADCAST_PORT, default=options.get(CONF_BROADCAST_PORT, 0))] = vol.All(vol.Coerce(int), vol.Range(min=0, max=65535))
+        options_fieldset[vol.Optional(CONF_BROADCAST_SOCKET, default=options.get(CONF_BROADCAST_SOCKET, ""))] = str
+        options_fieldset[vol.Optional(CONF_BROADCAST_FORMAT, default=options.get(CONF_BROADCAST_FORMAT, "json"))] = vol.In(BROADCAST_FORMATS)
+
+        return self.async_show_form(
+            step_id="init",
+            data_schema=vol.Schema(options_fieldset)
+        )
@@ -1,3 +1,5 @@
+from datetime import timedelta
+
 from homeassistant.const import UnitOfElectricCurrent, UnitOfElectricPotential, UnitOfEnergy, UnitOfPower, UnitOfApparentPower
 from homeassistant.components.sensor import (
     SensorDeviceClass,
@@ -8,6 +10,34 @@ from homeassistant.components.sensor import (
 
 DOMAIN = "teleinfo"
 
+STORAGE_VERSION = 1
+INITIALIZATION_TIMEOUT = 30 # Seconds waited for the first frame of a meter during setup
+SNAPSHOT_SAVE_DELAY = 10 # Seconds
+SNAPSHOT_SAVE_INTERVAL = timedelta(minutes=15)
+DERIVED_POWER_WINDOW = 8 # Index changes (Wh) the derived power is computed over
+ROLLING_WINDOWS = {"1m": 60, "15m": 900, "1h": 3600} # Seconds of the min/max/mean attributes of instantaneous metrics
+ROLLING_WINDOW_BUCKETS = 60
+TIMESERIES_KEYS = ("SINSTS", "PAPP", "CCASN") # Every sample kept in the time series files
+TIMESERIES_FLUSH_INTERVAL = timedelta(minutes=1)
+TIMESERIES_RETENTION = 0 # Days of samples kept by default, the time series files are opt-in
+SERVICE_QUERY_TIMESERIES = "query_timeseries"
+SERVICE_PROFILE = "profile"
+DIAGNOSTICS_UPDATE_INTERVAL = timedelta(minutes=1)
+# Diagnostic sensors of the frame processing, disabled by default: unit, state class
+DIAGNOSTIC_SENSORS = {
+	"bytes_received": ("B", SensorStateClass.TOTAL_INCREASING),
+	"frames_per_second": ("frames/s", SensorStateClass.MEASUREMENT),
+	"framing_resyncs": (None, SensorStateClass.TOTAL_INCREASING),
+	"buffer_high_water": ("B", SensorStateClass.MEASUREMENT),
+	"parse_time": ("ms", SensorStateClass.MEASUREMENT),
+	"checksum_errors_by_key": (None, SensorStateClass.TOTAL_INCREASING),
+	"unknown_keys": (None, SensorStateClass.TOTAL_INCREASING),
+	"state_writes_per_second": ("writes/s", SensorStateClass.MEASUREMENT),
+	"write_latency": ("ms", SensorStateClass.MEASUREMENT),
+	"reconnects": (None, SensorStateClass.TOTAL_INCREASING),
+	"recovery_time": ("ms", SensorStateClass.MEASUREMENT),
+}
+
 
 START_FRAME_DELIMITER = b'\x02'
 END_FRAME_DELIMITER = b'\x03'
@@ -15,6 +45,12 @@ END_FRAME_DELIMITER = b'\x03'
 class TeleinfoProtocolType:
     HISTORIQUE = "historique"
     STANDARD = "standard"
+    AUTO = "auto" # Detected from the port at setup
+
+BAUD_RATES = {
+	TeleinfoProtocolType.STANDARD: 9600,
+	TeleinfoProtocolType.HISTORIQUE: 1200,
+}
 
 class TeleinfoMetricBase:
 
@@ -41,6 +77,7 @@ class TeleinfoApparentPowerMetric(TeleinfoMetricBase):
 	_attr_device_class = SensorDeviceClass.ENERGY
 	_attr_native_unit_of_measurement = UnitOfApparentPower.VOLT_AMPERE
 	_attr_state_class = SensorStateClass.MEASUREMENT
+	throttle_option = "apparent_power"
 
 class TeleinfoPowerMetric(TeleinfoMetricBase):
 	_attr_device_class = SensorDeviceClass.ENERGY
@@ -51,6 +88,35 @@ class TeleinfoAmpereMetric(TeleinfoMetricBase):
 	_attr_device_class = SensorDeviceClass.ENERGY
 	_attr_native_unit_of_measurement = UnitOfElectricCurrent.AMPERE
 	_attr_state_class = SensorStateClass.MEASUREMENT
+	throttle_option = "current"
+
+# Metric classes whose state writes can be throttled from the options flow
+THROTTLED_METRIC_CLASSES = (TeleinfoApparentPowerMetric, TeleinfoAmpereMetric)
+
+# Throttle option suffixes, prefixed by the metric class throttle_option
+CONF_MIN_INTERVAL = "min_interval" # Minimum seconds between two state writes
+CONF_DEADBAND = "deadband" # Absolute change below which the state is not written
+CONF_RELATIVE_DEADBAND = "relative_deadband" # Same as a percentage of the last written value
+
+CONF_READER_THREAD = "reader_thread" # Read the serial port in a dedicated thread, applied on restart
+CONF_STREAMING = "streaming" # Decode each line as soon as it is received, applied on restart
+# Re-broadcast of the frames to local consumers, applied on restart
+CONF_BROADCAST_HOST = "broadcast_host"
+CONF_BROADCAST_PORT = "broadcast_port" # TCP port, 0 disables the TCP server
+CONF_BROADCAST_SOCKET = "broadcast_socket" # Unix socket path, empty disables the Unix server
+CONF_BROADCAST_FORMAT = "broadcast_format"
+BROADCAST_FORMATS = ("json", "raw") # JSON line of the values, or frame bytes
+BROADCAST_QUEUE_FRAMES = 32 # Frames queued for a slow client, the oldest are dropped beyond
+BROADCAST_WRITE_BUFFER = 65536 # Bytes buffered by a client transport before frames are queued
+CONF_HOURLY_STATISTICS = "hourly_statistics" # Import the hourly statistics of the indexes, applied on restart
+HOURLY_STATISTICS_STATE_INTERVAL = 3600 # Seconds between two state writes of an index with hourly statistics
+CONF_TIMESERIES_RETENTION = "timeseries_retention" # Days of samples in the time series files, 0 disables them, applied on restart
+SERIAL_READ_TIMEOUT = 0.1 # Seconds, bounds the time to stop the reader thread
+DETECTION_TIMEOUT = 20 # Seconds to detect the protocol of a port, before falling back to the last known one
+PROTOCOL_MISMATCH_FRAMES = 3 # Frames without a valid line after a restore, before the protocol is detected again
+NETWORK_CONNECT_TIMEOUT = 10 # Seconds, socket:// ports of ser2net or TIC bridges
+NETWORK_KEEPALIVE = (10, 5, 3) # Idle seconds, seconds between probes and probes before a dead bridge is detected
+NETWORK_READ_SIZE = 4096 # Bytes per recv, a few frames instead of the 256 KiB asyncio default
 
 
 TELEINFO_KEY = {
@@ -286,125 +352,3 @@ TELEINFO_STATUS_REGISTER = {
 	"preavis_pm": TELEINFO_STEG14,
 	"pm": TELEINFO_STEG15
 }
-
-EURIDIS_MANUFACTURER = {'01': 'CROUZET / MONETEL',
- '02': 'SAGEM / SAGEMCOM',
- '03': 'SCHLUMBERGER / ACTARIS / ITRON',
- '04': 'LANDIS ET GYR / SIEMENS METERING / LANDIS+GYR',
- '05': 'SAUTER / STEPPER ENERGIE France / ZELLWEGER',
- '06': 'ITRON',
- '07': 'MAEC',
- '08': 'MATRA-CHAUVIN ARNOUX / ENERDIS',
- '09': 'FAURE-HERMAN',
- '10': 'SEVME / SIS',
- '11': 'MAGNOL / ELSTER / HONEYWELL',
- '12': 'GAZ THERMIQUE',
- '14': 'GHIELMETTI / DIALOG E.S. / MICRONIQUE',
- '15': 'MECELEC',
- '16': 'LEGRAND / BACO',
- '17': 'SERD-SCHLUMBERGER',
- '18': 'SCHNEIDER / MERLIN GERIN / GARDY',
- '19': 'GENERAL ELECTRIC / POWER CONTROL / ABB',
- '20': 'NUOVO PIGNONE / DRESSER',
- '21': 'SCLE',
- '22': 'EDF',
- '23': 'GDF / GDF-SUEZ',
- '24': 'HAGER - GENERAL ELECTRIC',
- '25': 'DELTA-DORE',
- '26': 'RIZ',
- '27': 'ISKRAEMECO',
- '28': 'GMT',
- '29': 'ANALOG DEVICE',
- '30': 'MICHAUD',
- '31': 'HEXING ELECTRICAL CO. Ltd',
- '32': 'SIAME',
- '33': 'LARSEN & TOUBRO Limited',
- '34': 'ELSTER / HONEYWELL',
- '35': 'ELECTRONIC AFZAR AZMA',
- '36': 'ADVANCED ELECTRONIC COMPAGNY Ldt',
- '37': 'AEM',
- '38': 'ZHEJIANG CHINT INSTRUMENT & METER CO. Ldt',
- '39': 'ZIV',
- '70': 'LANDIS et GYR (export ou régie)',
- '71': 'STEPPER ENERGIE France (export ou régie)',
- '81': 'SAGEM / SAGEMCOM',
- '82': 'LANDIS ET GYR / SIEMENS METERING / LANDIS+GYR',
- '83': 'ELSTER / HONEYWELL',
- '84': 'SAGEM / SAGEMCOM',
- '85': 'ITRON'}
-
-EURIDIS_DEVICE = {'01': 'Compteur bleu monophasé multitarif électronique (BBR) - 1ère génération', 
-			'02': 'Centrale de mesure G3 - Poste HTA/BT', 
-			'03': 'Concentrateur multi-compteurs / électrique + 2 fluides', 
-			'04': 'Concentrateur simplifié / élec', 
-			'05': 'Compteur bleu monophasé simple tarif électronique - 1ère génération', 
-			'06': 'Compteur jaune électronique / tarif modulable', 
-			'07': 'Compteur électronique universel (PRISME ou ICE)', 
-			'08': 'Compteur sauter modifié EURIDIS', 
-			'09': 'Compteur bleu triphasé électronique - 1ère génération', 
-			'10': 'Compteur jaune électronique 2ème génération', 
-			'11': 'Compteur bleu monophasé simple tarif FERRARIS', 
-			'12': 'Compteur prisme', 
-			'13': 'Centrale de mesure G1 - Poste HTA/BT', 
-			'14': 'Analyseur de courbe de charge (panel BT)', 
-			'15': 'Compteur bleu monophasé multitarif électronique sans BBR', 
-			'16': 'Compteur bleu expérimentation « 10000 ICC »', 
-			'17': 'ICC expérimentation « 10000 ICC »', 
-			'18': 'Détecteur de défauts / HTA ', 
-			'19': 'Concentrateur multi-compteurs / 3 fluides indifférenciés', 
-			'20': 'Compteur bleu monophasé multitarif ½ taux - 1ère génération', 
-			'21': 'Compteur bleu triphasé ½ taux - 1ére génération', 
-			'22': 'Compteur bleu monophasé multitarif - 2ème génération', 
-			'23': 'Compteur bleu monophasé multitarif ½ taux - 2ème génération', 
-			'25': 'Compteur bleu monophasé simple tarif - 2ème génération', 
-			'26': 'Compteur bleu triphasé - palier 2000 - 2ème génération', 
-			'27': 'Compteur bleu triphasé - palier 2000 1?2 taux - 2ème génération', 
-			'28': 'Compteur bleu monophasé multitarif - palier 2007 - 3ème génération', 
-			'29': 'Compteur bleu monophasé multitarif ½ taux - palier 2007 - 3ème génération', '30': 'Compteur bleu triphasé - palier 2007 - 3ème génération',
-			'31': 'Compteur bleu triphasé ½ taux - palier 2007 - 3ème génération',
-			'32': 'Compteur bleu triphasé télétotalisation',
-			'33': 'Compteur jaune électronique branchement direct',
-			'34': 'Compteur ICE 4 quadrants',
-			'35': 'Compteur trimaran 2P classe 0',
-			'36': 'Compteur PME-PMI BT > 36kva',
-			'37': 'Compteur prépaiement',
-			'38': 'Compteur triphasé HXE34 de HECL',
-			'40': "Système d'affichage multiusage (SAM)",
-			'42': 'Compteur monophasé export (ACTARIS)',
-			'43': 'Compteur monophasé export (ACTARIS)',
-			'44': 'Compteur triphasé export ACTARIS',
-			'46': 'Modem EURIDIS pour compteur PME-PMI',
-			'52': 'Concentrateur simplifié / gaz ou Transpondeur Gaz EURIDIS',
-			'53': 'Concentrateur multi-compteurs / VGR',
-			'54': 'Concentrateur multi-compteurs / gaz',
-			'58': 'Baie prisme de télétotalisation (1 exemplaire à ce jour) expérimentation Lyon',
-			'60': 'Compteur monophasé 60A LINKY - généralisation G1 - arrivée basse',
-			'61': 'Compteur monophasé 60A LINKY - généralisation G3 - arrivée haute',
-			'62': 'Compteur monophasé 90A LINKY - généralisation G1 - arrivée basse',
-			'63': 'Compteur triphasé 60A LINKY - généralisation G1 - arrivée basse',
-			'64': 'Compteur monophasé 60A LINKY - généralisation G3 - arrivée  basse',
-			'65': 'Compteur monophasé 90A LINKY expérimentation CPL G3 (2000 ex.)',
-			'66': 'Module du compteur modulaire généralisation',
-			'68': 'Compteur triphasé 60A LINKY - pilote G1 - arrivée basse',
-			'70': 'Compteur monophasé 60A LINKY - interopérabilité G3 - arrivée basse',
-			'71': 'Compteur triphasé 60A LINKY - interopérabilité G3 - arrivée basse',
-			'72': 'Compteur monophasé HXE12K 10-80A 4 tarifs (Hexing Electrical co',
-			'74': 'Compteur triphasé HXE34K 230/400V 10-80A 4 tarifs (Hexing Electrical co',
-			'75': 'Compteur monophasé 90A LINKY - palier 1 G3 - arrivée basse',
-			'76': 'Compteur triphasé 60A LINKY - palier 1 G3 - arrivée basse',
-			'86': 'Compteur numérique SEI monophasé 60A 230V - G3 - arrivée basse - 60Hz',
-			'87': 'Compteur numérique SEI triphasé 60A 230/400V - G3 - 60Hz',
-			'88': 'Compteur monophasé PLC DSMR2.2 (Actaris)',
-			'89': 'Compteur triphasé PLC DSMR2.2 (Actaris)',
-			'90': 'Compteur monophasé CPL intégré 1ère génération',
-			'91': 'Compteur triphasé CPL intégré 2ème génération',
-			'92': 'Compteur monophasé 90A LINKY ORES - G3 Palier 1',
-			'93': 'Compteur triphasé 60A 3 fils LINKY ORES - G3 Palier 1',
-			'94': 'Compteur triphasé 60A 4 fils LINKY ORES - G3 Palier 1',
-			'98': 'BCPL  G0 pour compteur CJE et CBE',
-			'AA': 'Coupleur EURIDIS bluetooth (PKE)',
-			'DC': 'BCPL G1 LINKY pour compteur CJE',
-			'45': 'Compteur triphasé AECL',
-			'67': 'Module du compteur modulaire expérimentation (non déployé)'}
-
-LINKY_CODE = ["61", "62", "63", "64", "67", "68", "70", "71", "75", "76"]
\ No newline at end of file
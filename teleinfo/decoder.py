@@ -0,0 +1,188 @@
+import functools
+import logging
+
+from .const import TELEINFO_KEY, TeleinfoProtocolType
+
+logger = logging.getLogger(__name__)
+
+# Separator between the fields of a line (label, timestamp, value, checksum)
+SEPARATORS = {
+    TeleinfoProtocolType.STANDARD: b"\t",
+    TeleinfoProtocolType.HISTORIQUE: b" "
+}
+
+# Checksum mode detected per protocol type
+# mode 1: checksum computed up to the value, mode 2: separator before the checksum included
+CHECKSUM_MODES = {}
+CHECKSUM_REDETECT_FRAMES = 3 # Frames without any valid line before the checksum mode is detected again
+
+
+def _decode_str(value):
+    return value.decode("ascii").strip()
+
+
+def _make_decoder(key, converter, separator, timestamp):
+    """Return a function decoding the fields following the label of a line.
+
+    The fields are received without the checksum and its separator, the
+    value is everything after the label (and timestamp) so values with
+    embedded spaces like LTARF are kept whole.
+    """
+    if timestamp:
+        def decode(fields):
+            ts, _, value = fields.partition(separator)
+            return key, converter(value), ts.decode("ascii")
+    else:
+        def decode(fields):
+            return key, converter(fields), None
+    return decode
+
+
+def protocol_keys(protocol_type):
+    """Labels sent by the meters of the protocol type, historique labels start at ADCO in TELEINFO_KEY"""
+    labels = list(TELEINFO_KEY)
+    start = labels.index("ADCO")
+    return labels[:start] if protocol_type == TeleinfoProtocolType.STANDARD else labels[start:]
+
+
+def build_line_decoders(separator, keys=TELEINFO_KEY):
+    decoders = {}
+    for key in keys:
+        metadata = TELEINFO_KEY[key]
+        content_type = metadata["content_type"]
+        converter = _decode_str if content_type is str else content_type # int() accepts padded bytes
+        decoders[key.encode("ascii")] = _make_decoder(key, converter, separator, metadata.get("timestamp", False))
+    return decoders
+
+
+@functools.cache
+def get_line_decoders(protocol_type):
+    """Decoders of the labels of a protocol type, compiled on first use and shared by its meters"""
+    return build_line_decoders(SEPARATORS[protocol_type], protocol_keys(protocol_type))
+
+
+def detect_checksum_mode(line):
+    if len(line) < 3:
+        return None
+    checksum = line[-1]
+    total = sum(line[:-2])
+    if (total & 0x3F) + 0x20 == checksum:
+        return 1
+    if ((total + line[-2]) & 0x3F) + 0x20 == checksum:
+        return 2
+    return None
+
+
+def validate_checksums(lines, mode):
+    """Return the checksum validity of each line"""
+    end = -1 if mode == 2 else -2
+    return [len(line) > 2 and (sum(line[:end]) & 0x3F) + 0x20 == line[-1] for line in lines]
+
+
+class ChecksumValidator:
+
+    def __init__(self, protocol_type):
+        self._protocol_type = protocol_type
+        self._separator = SEPARATORS[protocol_type]
+        self._labels = get_line_decoders(protocol_type)
+        self._invalid_frames = 0
+
+    @property
+    def mode(self):
+        return CHECKSUM_MODES.get(self._protocol_type)
+
+    def line_mode(self, line):
+        """Checksum mode of a line of the protocol: its separator before the checksum and a known label, else None"""
+        if len(line) > 2 and line[-2] == self._separator[0] and line.partition(self._separator)[0] in self._labels:
+            return detect_checksum_mode(line)
+        return None
+
+    def protocol_lines(self, lines):
+        """Lines of the protocol with a valid checksum in any mode, the shared mode is left unchanged"""
+        return [line for line in lines if self.line_mode(line)]
+
+    def detect_mode(self, lines):
+        return next(filter(None, map(self.line_mode, lines)), None)
+
+    def validate(self, lines):
+        mode = CHECKSUM_MODES.get(self._protocol_type)
+        if mode is None:
+            mode = self.detect_mode(lines)
+            if mode is None:
+                return [False] * len(lines)
+            CHECKSUM_MODES[self._protocol_type] = mode
+            logger.debug(f"Set checksum control method to mode {mode} for {self._protocol_type}")
+        valid = validate_checksums(lines, mode)
+        if lines and not any(valid):
+            self._invalid_frames += 1
+            if self._invalid_frames >= CHECKSUM_REDETECT_FRAMES:
+                # Shared by the meters of the protocol, a wrong mode would fail all of them
+                logger.debug(f"No valid checksum in {self._invalid_frames} frames, detecting the checksum mode of {self._protocol_type} again")
+                CHECKSUM_MODES.pop(self._protocol_type, None)
+                self._invalid_frames = 0
+        else:
+            self._invalid_frames = 0
+        return valid
+
+
+class Metric:
+    """Last decoded value of a label, kept to create the entities and restore them on the next start"""
+
+    __slots__ = ("key", "value", "timestamp")
+
+    def __init__(self, key, value, timestamp=None):
+        self.key = key
+        self.value = value
+        self.timestamp = timestamp
+
+    def __iter__(self):
+        # Unpacked like the (key, value, timestamp) returned by the decoders
+        return iter((self.key, self.value, self.timestamp))
+
+    def __repr__(self):
+        return f"Metric({self.key!r}, {self.value!r}, {self.timestamp!r})"
+
+
+class LineCache:
+    """Last valid raw line received for each label.
+
+    A line identical to the previous one of its label holds the same value,
+    it doesn't need to be validated, decoded nor dispatched again. The
+    cached lines are also kept in a set, an unchanged line is found without
+    splitting its label out.
+    """
+
+    def __init__(self, separator):
+        self._separator = separator
+        self._lines = {}
+        self._cached = set()
+        self.hits = 0
+        self.misses = 0
+
+    def changed_lines(self, lines):
+        """Return the (label, line) of the lines that differ from the cached ones"""
+        cached = self._cached
+        separator = self._separator
+        changed = [(line.partition(separator)[0], line) for line in lines if line not in cached]
+        self.misses += len(changed)
+        self.hits += len(lines) - len(changed)
+        return changed
+
+    def changed(self, line):
+        """Single line version of changed_lines, for lines decoded as they are received"""
+        if line not in self._cached:
+            self.misses += 1
+            return True
+        self.hits += 1
+        return False
+
+    def store(self, key, line):
+        previous = self._lines.get(key)
+        if previous is not None:
+            self._cached.discard(previous)
+        self._lines[key] = line
+        self._cached.add(line)
+
+    def clear(self):
+        self._lines.clear()
+        self._cached.clear()
@@ -0,0 +1,116 @@
+from array import array
+
+# Derived sensor of the active power of the meter, from its total index
+ACTIVE_POWER = "active_power"
+
+# Standard meters send their total index, historique ones only per tariff indexes
+TOTAL_INDEX = "EAST"
+
+
+def index_power_key(index_key):
+    """Derived sensor of the rate of an index"""
+    return f"{index_key}_power"
+
+
+class RingBuffer:
+    """Fixed size buffer of floats, the oldest value is overwritten once full"""
+
+    def __init__(self, size):
+        self._values = array("d", bytes(8 * size))
+        self._size = size
+        self._start = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def append(self, value):
+        end = self._start + self._count
+        if self._count < self._size:
+            self._count += 1
+        else:
+            self._start = (self._start + 1) % self._size
+        self._values[end % self._size] = value
+
+    def first(self):
+        return self._values[self._start]
+
+    def last(self):
+        return self._values[(self._start + self._count - 1) % self._size]
+
+    def clear(self):
+        self._start = 0
+        self._count = 0
+
+
+class IndexRate:
+    """Rate of an index in W, from the times the index changed.
+
+    Only the changes are kept: the rate between the first and last change of
+    the window has no quantization error, and the window adapts to the
+    consumption (size Wh). When the index stops changing the rate decays,
+    the next Wh can't come sooner than the time elapsed since the last one.
+    """
+
+    def __init__(self, size):
+        self._times = RingBuffer(size)
+        self._values = RingBuffer(size)
+
+    def add(self, value, now):
+        values = self._values
+        if len(values):
+            if value == values.last():
+                return
+            if value < values.last(): # Meter replaced or index reset
+                self._times.clear()
+                values.clear()
+        self._times.append(now)
+        values.append(value)
+
+    def rate(self, now):
+        if len(self._values) < 2:
+            return None
+        elapsed = self._times.last() - self._times.first()
+        rate = (self._values.last() - self._values.first()) * 3600 / elapsed
+        idle = now - self._times.last()
+        if idle > elapsed / (len(self._values) - 1):
+            rate = min(rate, 3600 / idle)
+        return round(rate)
+
+
+class DerivedPowerEngine:
+    """Active power and per index rates of a meter, updated on each frame"""
+
+    def __init__(self, size):
+        self._size = size
+        self._rates = {}
+        self._indexes = {}
+        self._changed = False
+        self._total = IndexRate(size)
+
+    @property
+    def index_keys(self):
+        return self._rates.keys()
+
+    def add_index(self, key, value):
+        self._rates[key] = IndexRate(self._size)
+        self._indexes[key] = value
+        self._changed = True
+
+    def set_index(self, key, value):
+        if key in self._indexes:
+            self._indexes[key] = value
+            self._changed = True
+
+    def compute(self, now):
+        """Return the (derived key, value) of the frame received at now, in seconds"""
+        indexes = self._indexes
+        if self._changed:
+            self._changed = False
+            for key, rate in self._rates.items():
+                rate.add(indexes[key], now)
+            total = indexes[TOTAL_INDEX] if TOTAL_INDEX in indexes else sum(indexes.values())
+            self._total.add(total, now)
+        derived = [(index_power_key(key), rate.rate(now)) for key, rate in self._rates.items()]
+        derived.append((ACTIVE_POWER, self._total.rate(now)))
+        return derived
@@ -0,0 +1,119 @@
+"""Detection of the protocol of a meter from the bytes read at each baud rate.
+
+A port read at the wrong baud rate gives bytes with parity or framing
+errors, read as NUL by the serial driver, without the LF/CR structure of
+the lines, or lines whose checksum fails. Each candidate protocol is
+sampled in 7E1 at its baud rate and scored on its lines: separator, known
+label and valid checksum (mode 1 or 2). A candidate is detected after a
+few valid lines, and rejected on errors, invalid lines or when too many
+bytes were read without valid lines, so a meter is usually detected in
+less than a second.
+"""
+import logging
+import time
+
+from .const import BAUD_RATES, DETECTION_TIMEOUT, TeleinfoProtocolType
+from .decoder import SEPARATORS, get_line_decoders, detect_checksum_mode, validate_checksums
+from .framing import LineSplitter
+
+logger = logging.getLogger(__name__)
+
+# Standard first, 9600 bauds is the fastest to rule out
+CANDIDATES = (TeleinfoProtocolType.STANDARD, TeleinfoProtocolType.HISTORIQUE)
+MIN_VALID_LINES = 4
+REJECT_BYTES = 512 # Several frames at the right baud rate
+REJECT_ERRORS = 16 # NUL bytes, never sent by a meter
+REJECT_LINES = 2 * MIN_VALID_LINES # Invalid lines, e.g. the separator of the other protocol
+DETECTION_WINDOW = 3 # Seconds a candidate is sampled on a silent port
+
+
+class CandidateScore:
+    """Validity of the lines read at the baud rate of a candidate protocol"""
+
+    def __init__(self, protocol_type):
+        self.protocol_type = protocol_type
+        self._separator = SEPARATORS[protocol_type]
+        self._labels = get_line_decoders(protocol_type)
+        self._splitter = LineSplitter(self._on_line, self._on_frame_end)
+        self._mode = None
+        self.valid_lines = 0
+        self.invalid_lines = 0
+        self.frames = 0
+        self.errors = 0
+
+    @property
+    def received_bytes(self):
+        return self._splitter.received_bytes
+
+    @property
+    def detected(self):
+        return self.valid_lines >= MIN_VALID_LINES and self.valid_lines >= 3 * self.invalid_lines
+
+    @property
+    def rejected(self):
+        if self.detected:
+            return False
+        return self.errors >= REJECT_ERRORS or self.invalid_lines >= REJECT_LINES or self._splitter.received_bytes >= REJECT_BYTES
+
+    def feed(self, data):
+        self.errors += data.count(0)
+        self._splitter.feed(data)
+
+    def _on_line(self, line):
+        label, separator, _ = line.partition(self._separator)
+        if separator:
+            mode = self._mode or detect_checksum_mode(line)
+            if mode is not None and validate_checksums((line,), mode)[0]:
+                self._mode = mode
+                if label in self._labels:
+                    self.valid_lines += 1
+                return # Valid line of an unknown label, e.g. of a newer meter
+        self.invalid_lines += 1
+
+    def _on_frame_end(self, complete):
+        self.frames += 1
+
+
+def candidates(first=None):
+    """Candidate protocols in the order they are sampled, first is e.g. the protocol of the previous run"""
+    return sorted(CANDIDATES, key=lambda protocol_type: protocol_type != first)
+
+
+def detect_protocol(open_port, timeout=DETECTION_TIMEOUT, first=None, clock=time.monotonic):
+    """Sample the candidates in turn until one is detected, return None after timeout seconds.
+
+    open_port() returns an open pyserial like port in 7E1 with a read
+    timeout, its baud rate is changed for each candidate. Blocking, it is
+    run in an executor.
+    """
+    deadline = clock() + timeout
+    serial_port = open_port()
+    try:
+        while True:
+            for protocol_type in candidates(first):
+                remaining = deadline - clock()
+                if remaining <= 0:
+                    return None
+                score = CandidateScore(protocol_type)
+                serial_port.baudrate = BAUD_RATES[protocol_type]
+                serial_port.reset_input_buffer() # Bytes received at the previous baud rate
+                window_end = clock() + min(DETECTION_WINDOW, remaining)
+                while clock() < window_end and not (score.detected or score.rejected):
+                    data = serial_port.read(max(1, serial_port.in_waiting))
+                    if data:
+                        score.feed(data)
+                logger.debug(f"Protocol {protocol_type}: {score.valid_lines} valid and {score.invalid_lines} invalid lines, {score.errors} errors in {score.received_bytes} bytes")
+                if score.detected:
+                    return protocol_type
+    finally:
+        serial_port.close()
+
+
+def detect_protocol_in(data):
+    """Protocol of captured bytes, scored with the separator and labels of each candidate"""
+    for protocol_type in CANDIDATES:
+        score = CandidateScore(protocol_type)
+        score.feed(data)
+        if score.detected:
+            return protocol_type
+    return None
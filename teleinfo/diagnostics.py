@@ -0,0 +1,21 @@
+from homeassistant import config_entries, core
+from homeassistant.components.diagnostics import async_redact_data
+
+from .const import DOMAIN
+
+# The meter id is the PRM of the delivery point
+TO_REDACT = {"device_id"}
+
+
+async def async_get_config_entry_diagnostics(
+    hass: core.HomeAssistant, entry: config_entries.ConfigEntry
+) -> dict:
+    """Counters and histograms of the frame processing of each meter of the entry."""
+    config = hass.data[DOMAIN][entry.entry_id]
+    broadcaster = config.get("broadcaster")
+    return {
+        "data": dict(entry.data),
+        "options": dict(entry.options),
+        "meters": [async_redact_data(integration.diagnostics(), TO_REDACT) for integration in config.get("integrations", [])],
+        "broadcast": broadcaster and {"clients": broadcaster.clients, "messages": broadcaster.messages, "dropped_frames": broadcaster.dropped_frames},
+    }
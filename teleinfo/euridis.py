@@ -0,0 +1,123 @@
+# Manufacturer and device tables of the EURIDIS meter addresses, only loaded once a meter address is known
+
+EURIDIS_MANUFACTURER = {'01': 'CROUZET / MONETEL',
+ '02': 'SAGEM / SAGEMCOM',
+ '03': 'SCHLUMBERGER / ACTARIS / ITRON',
+ '04': 'LANDIS ET GYR / SIEMENS METERING / LANDIS+GYR',
+ '05': 'SAUTER / STEPPER ENERGIE France / ZELLWEGER',
+ '06': 'ITRON',
+ '07': 'MAEC',
+ '08': 'MATRA-CHAUVIN ARNOUX / ENERDIS',
+ '09': 'FAURE-HERMAN',
+ '10': 'SEVME / SIS',
+ '11': 'MAGNOL / ELSTER / HONEYWELL',
+ '12': 'GAZ THERMIQUE',
+ '14': 'GHIELMETTI / DIALOG E.S. / MICRONIQUE',
+ '15': 'MECELEC',
+ '16': 'LEGRAND / BACO',
+ '17': 'SERD-SCHLUMBERGER',
+ '18': 'SCHNEIDER / MERLIN GERIN / GARDY',
+ '19': 'GENERAL ELECTRIC / POWER CONTROL / ABB',
+ '20': 'NUOVO PIGNONE / DRESSER',
+ '21': 'SCLE',
+ '22': 'EDF',
+ '23': 'GDF / GDF-SUEZ',
+ '24': 'HAGER - GENERAL ELECTRIC',
+ '25': 'DELTA-DORE',
+ '26': 'RIZ',
+ '27': 'ISKRAEMECO',
+ '28': 'GMT',
+ '29': 'ANALOG DEVICE',
+ '30': 'MICHAUD',
+ '31': 'HEXING ELECTRICAL CO. Ltd',
+ '32': 'SIAME',
+ '33': 'LARSEN & TOUBRO Limited',
+ '34': 'ELSTER / HONEYWELL',
+ '35': 'ELECTRONIC AFZAR AZMA',
+ '36': 'ADVANCED ELECTRONIC COMPAGNY Ldt',
+ '37': 'AEM',
+ '38': 'ZHEJIANG CHINT INSTRUMENT & METER CO. Ldt',
+ '39': 'ZIV',
+ '70': 'LANDIS et GYR (export ou régie)',
+ '71': 'STEPPER ENERGIE France (export ou régie)',
+ '81': 'SAGEM / SAGEMCOM',
+ '82': 'LANDIS ET GYR / SIEMENS METERING / LANDIS+GYR',
+ '83': 'ELSTER / HONEYWELL',
+ '84': 'SAGEM / SAGEMCOM',
+ '85': 'ITRON'}
+
+EURIDIS_DEVICE = {'01': 'Compteur bleu monophasé multitarif électronique (BBR) - 1ère génération', 
+			'02': 'Centrale de mesure G3 - Poste HTA/BT', 
+			'03': 'Concentrateur multi-compteurs / électrique + 2 fluides', 
+			'04': 'Concentrateur simplifié / élec', 
+			'05': 'Compteur bleu monophasé simple tarif électronique - 1ère génération', 
+			'06': 'Compteur jaune électronique / tarif modulable', 
+			'07': 'Compteur électronique universel (PRISME ou ICE)', 
+			'08': 'Compteur sauter modifié EURIDIS', 
+			'09': 'Compteur bleu triphasé électronique - 1ère génération', 
+			'10': 'Compteur jaune électronique 2ème génération', 
+			'11': 'Compteur bleu monophasé simple tarif FERRARIS', 
+			'12': 'Compteur prisme', 
+			'13': 'Centrale de mesure G1 - Poste HTA/BT', 
+			'14': 'Analyseur de courbe de charge (panel BT)', 
+			'15': 'Compteur bleu monophasé multitarif électronique sans BBR', 
+			'16': 'Compteur bleu expérimentation « 10000 ICC »', 
+			'17': 'ICC expérimentation « 10000 ICC »', 
+			'18': 'Détecteur de défauts / HTA ', 
+			'19': 'Concentrateur multi-compteurs / 3 fluides indifférenciés', 
+			'20': 'Compteur bleu monophasé multitarif ½ taux - 1ère génération', 
+			'21': 'Compteur bleu triphasé ½ taux - 1ére génération', 
+			'22': 'Compteur bleu monophasé multitarif - 2ème génération', 
+			'23': 'Compteur bleu monophasé multitarif ½ taux - 2ème génération', 
+			'25': 'Compteur bleu monophasé simple tarif - 2ème génération', 
+			'26': 'Compteur bleu triphasé - palier 2000 - 2ème génération', 
+			'27': 'Compteur bleu triphasé - palier 2000 1?2 taux - 2ème génération', 
+			'28': 'Compteur bleu monophasé multitarif - palier 2007 - 3ème génération', 
+			'29': 'Compteur bleu monophasé multitarif ½ taux - palier 2007 - 3ème génération', '30': 'Compteur bleu triphasé - palier 2007 - 3ème génération',
+			'31': 'Compteur bleu triphasé ½ taux - palier 2007 - 3ème génération',
+			'32': 'Compteur bleu triphasé télétotalisation',
+			'33': 'Compteur jaune électronique branchement direct',
+			'34': 'Compteur ICE 4 quadrants',
+			'35': 'Compteur trimaran 2P classe 0',
+			'36': 'Compteur PME-PMI BT > 36kva',
+			'37': 'Compteur prépaiement',
+			'38': 'Compteur triphasé HXE34 de HECL',
+			'40': "Système d'affichage multiusage (SAM)",
+			'42': 'Compteur monophasé export (ACTARIS)',
+			'43': 'Compteur monophasé export (ACTARIS)',
+			'44': 'Compteur triphasé export ACTARIS',
+			'46': 'Modem EURIDIS pour compteur PME-PMI',
+			'52': 'Concentrateur simplifié / gaz ou Transpondeur Gaz EURIDIS',
+			'53': 'Concentrateur multi-compteurs / VGR',
+			'54': 'Concentrateur multi-compteurs / gaz',
+			'58': 'Baie prisme de télétotalisation (1 exemplaire à ce jour) expérimentation Lyon',
+			'60': 'Compteur monophasé 60A LINKY - généralisation G1 - arrivée basse',
+			'61': 'Compteur monophasé 60A LINKY - généralisation G3 - arrivée haute',
+			'62': 'Compteur monophasé 90A LINKY - généralisation G1 - arrivée basse',
+			'63': 'Compteur triphasé 60A LINKY - généralisation G1 - arrivée basse',
+			'64': 'Compteur monophasé 60A LINKY - généralisation G3 - arrivée  basse',
+			'65': 'Compteur monophasé 90A LINKY expérimentation CPL G3 (2000 ex.)',
+			'66': 'Module du compteur modulaire généralisation',
+			'68': 'Compteur triphasé 60A LINKY - pilote G1 - arrivée basse',
+			'70': 'Compteur monophasé 60A LINKY - interopérabilité G3 - arrivée basse',
+			'71': 'Compteur triphasé 60A LINKY - interopérabilité G3 - arrivée basse',
+			'72': 'Compteur monophasé HXE12K 10-80A 4 tarifs (Hexing Electrical co',
+			'74': 'Compteur triphasé HXE34K 230/400V 10-80A 4 tarifs (Hexing Electrical co',
+			'75': 'Compteur monophasé 90A LINKY - palier 1 G3 - arrivée basse',
+			'76': 'Compteur triphasé 60A LINKY - palier 1 G3 - arrivée basse',
+			'86': 'Compteur numérique SEI monophasé 60A 230V - G3 - arrivée basse - 60Hz',
+			'87': 'Compteur numérique SEI triphasé 60A 230/400V - G3 - 60Hz',
+			'88': 'Compteur monophasé PLC DSMR2.2 (Actaris)',
+			'89': 'Compteur triphasé PLC DSMR2.2 (Actaris)',
+			'90': 'Compteur monophasé CPL intégré 1ère génération',
+			'91': 'Compteur triphasé CPL intégré 2ème génération',
+			'92': 'Compteur monophasé 90A LINKY ORES - G3 Palier 1',
+			'93': 'Compteur triphasé 60A 3 fils LINKY ORES - G3 Palier 1',
+			'94': 'Compteur triphasé 60A 4 fils LINKY ORES - G3 Palier 1',
+			'98': 'BCPL  G0 pour compteur CJE et CBE',
+			'AA': 'Coupleur EURIDIS bluetooth (PKE)',
+			'DC': 'BCPL G1 LINKY pour compteur CJE',
+			'45': 'Compteur triphasé AECL',
+			'67': 'Module du compteur modulaire expérimentation (non déployé)'}
+
+LINKY_CODE = ["61", "62", "63", "64", "67", "68", "70", "71", "75", "76"]
\ No newline at end of file
@@ -0,0 +1,193 @@
+import re
+
+from .const import START_FRAME_DELIMITER, END_FRAME_DELIMITER
+
+STX = START_FRAME_DELIMITER[0]
+ETX = END_FRAME_DELIMITER[0]
+LF = ord("\n")
+CR = ord("\r")
+_DELIMITERS = re.compile(b"[\x02\x03\n\r]")
+
+
+class FrameSplitter:
+    """Split a teleinfo byte stream in frames delimited by STX/ETX.
+
+    Bytes are only scanned once, when they are received. A frame fully
+    contained in a received chunk is handed to the callback as a view on
+    that chunk, otherwise it is accumulated in a preallocated buffer which
+    is never resized. In both cases the callback receives a memoryview
+    without the STX/ETX delimiters that is only valid during the call.
+    """
+
+    DEFAULT_CAPACITY = 4096 # Larger than the longest standard frame
+
+    def __init__(self, callback, capacity=DEFAULT_CAPACITY):
+        self._callback = callback
+        self._capacity = capacity
+        self._buffer = bytearray(capacity)
+        self._view = memoryview(self._buffer)
+        self._length = 0 # Bytes of the pending frame stored in the buffer, STX included
+        self.received_bytes = 0
+        self.dropped_bytes = 0
+        self.frames = 0
+        self.resyncs = 0
+        self.high_water = 0 # Largest partial frame buffered
+
+    @property
+    def pending(self):
+        return self._length
+
+    def _clear(self):
+        # The partial frame only grows until it is cleared, its high water is taken here
+        if self._length > self.high_water:
+            self.high_water = self._length
+        self._length = 0
+
+    def _store(self, chunk):
+        end = self._length + len(chunk)
+        if end > self._capacity:
+            # No ETX within capacity, the frame is corrupted
+            self.resyncs += 1
+            self.dropped_bytes += end
+            self._clear()
+            return False
+        self._buffer[self._length:end] = chunk
+        self._length = end
+        return True
+
+    def feed(self, data):
+        size = len(data)
+        self.received_bytes += size
+        length = self._length
+        if length:
+            # Middle of a frame, by far the most frequent case with small serial reads: stored inline
+            end = length + size
+            if end <= self._capacity and ETX not in data and STX not in data:
+                self._buffer[length:end] = data
+                self._length = end
+                return
+        view = memoryview(data)
+        offset = 0
+        while offset < size:
+            if self._length == 0: # Looking for the start of a frame
+                start = data.find(START_FRAME_DELIMITER, offset)
+                if start == -1:
+                    self.dropped_bytes += size - offset
+                    return
+                self.dropped_bytes += start - offset
+                offset = start
+                search_from = start + 1
+            else:
+                search_from = offset
+            stop = data.find(END_FRAME_DELIMITER, search_from)
+            restart = data.find(START_FRAME_DELIMITER, search_from, size if stop == -1 else stop)
+            if restart != -1:
+                # A new frame starts before the end of the current one, resync on it
+                self.resyncs += 1
+                self.dropped_bytes += self._length + restart - offset
+                self._clear()
+                offset = restart
+                continue
+            if stop == -1:
+                self._store(view[offset:])
+                return
+            if self._length == 0:
+                self.frames += 1
+                self._callback(view[offset + 1:stop])
+            elif self._store(view[offset:stop]):
+                self.frames += 1
+                self._callback(self._view[1:self._length])
+                self._clear()
+            offset = stop + 1
+
+
+def frame_bytes(lines):
+    """Frame of lines without their LF/CR, as sent by the meter"""
+    return b"".join((START_FRAME_DELIMITER, *(b"\n" + line + b"\r" for line in lines), END_FRAME_DELIMITER))
+
+
+class LineSplitter:
+    """Split a teleinfo byte stream in lines delimited by LF/CR, as they complete.
+
+    Each line is handed to on_line as soon as its CR is received, without
+    waiting for the end of the frame. A corrupted delimiter only loses the
+    line it belongs to: the next LF starts a new line. on_frame_end(complete)
+    is called on ETX, or on STX when the ETX of the previous frame was lost,
+    complete is False when a line or a delimiter of the frame was lost.
+    """
+
+    DEFAULT_CAPACITY = 256 # Longer than any line
+
+    def __init__(self, on_line, on_frame_end, capacity=DEFAULT_CAPACITY):
+        self._on_line = on_line
+        self._on_frame_end = on_frame_end
+        self._capacity = capacity
+        self._buffer = bytearray() # Start of a line continued in the next chunk
+        self._in_line = False
+        self._in_frame = False
+        self._complete = False
+        self.received_bytes = 0
+        self.dropped_bytes = 0
+        self.lines = 0
+        self.frames = 0
+        self.resyncs = 0
+        self.high_water = 0 # Longest partial line buffered
+
+    def _drop_line(self, size):
+        """A line interrupted by another delimiter than CR is corrupted"""
+        self.resyncs += 1
+        self._complete = False
+        self.dropped_bytes += len(self._buffer) + size
+        self._buffer.clear()
+        self._in_line = False
+
+    def _frame_delimiter(self, delimiter):
+        if delimiter == STX:
+            if self._in_frame: # ETX lost, the frame ends with the next one
+                self.resyncs += 1
+                self.frames += 1
+                self._on_frame_end(False)
+            self._in_frame = True
+            self._complete = True
+        else:
+            if not self._in_frame: # STX lost, the lines received are still a frame
+                self.resyncs += 1
+                self._complete = False
+            self._in_frame = False
+            self.frames += 1
+            self._on_frame_end(self._complete)
+
+    def feed(self, data):
+        self.received_bytes += len(data)
+        buffer = self._buffer
+        line_start = 0
+        for match in _DELIMITERS.finditer(data):
+            position = match.start()
+            delimiter = data[position]
+            if delimiter == LF:
+                if self._in_line:
+                    self._drop_line(position - line_start)
+                self._in_line = True
+                line_start = position + 1
+            elif self._in_line:
+                if delimiter == CR:
+                    if buffer:
+                        buffer += data[line_start:position]
+                        line = bytes(buffer)
+                        buffer.clear()
+                    else:
+                        line = data[line_start:position]
+                    self._in_line = False
+                    self.lines += 1
+                    self._on_line(line)
+                else:
+                    self._drop_line(position - line_start)
+                    self._frame_delimiter(delimiter)
+            elif delimiter != CR:
+                self._frame_delimiter(delimiter)
+        if self._in_line:
+            buffer += data[line_start:]
+            if len(buffer) > self.high_water:
+                self.high_water = len(buffer)
+            if len(buffer) > self._capacity:
+                self._drop_line(0)
@@ -0,0 +1,105 @@
+"""Counters and histograms of the frame processing, for diagnostics.
+
+They are updated on the hot path with a few integer operations per frame,
+rates and summaries are only computed when the diagnostics are read.
+"""
+import array
+import bisect
+import collections
+
+# Upper bounds of the histogram buckets in ms, the last bucket is unbounded
+PARSE_TIME_BOUNDS = (0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 50)
+WRITE_LATENCY_BOUNDS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+RECOVERY_TIME_BOUNDS = (1000, 2000, 5000, 10000, 30000, 60000, 300000)
+MAX_KEYS = 64 # Distinct labels counted, corrupted labels beyond are counted as OTHER_KEY
+OTHER_KEY = "other"
+
+
+class Histogram:
+    """Counts of values (ms) by bucket, with their sum and max"""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = array.array("Q", bytes(8 * (len(bounds) + 1)))
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._mark = (0, 0.0) # Count and total at the previous interval_mean
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def interval_mean(self):
+        """Mean of the values added since the previous call"""
+        count, total = self.count - self._mark[0], self.total - self._mark[1]
+        self._mark = (self.count, self.total)
+        return round(total / count, 3) if count else None
+
+    def percentile(self, percent):
+        """Upper bound of the bucket holding the percentile, max for the last bucket"""
+        if not self.count:
+            return None
+        rank = self.count * percent / 100
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return round(min(bound, self.max), 3)
+        return round(self.max, 3)
+
+    def summary(self):
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 3),
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "max": round(self.max, 3),
+            "buckets": {f"<={bound}": count for bound, count in zip(self.bounds, self.counts)} | {f">{self.bounds[-1]}": self.counts[-1]},
+        }
+
+
+class FrameStats:
+    """Counters of the frames processed by an integration"""
+
+    def __init__(self):
+        self.frames = 0
+        self.state_writes = 0
+        self.parse_time = Histogram(PARSE_TIME_BOUNDS)
+        self.write_latency = Histogram(WRITE_LATENCY_BOUNDS)
+        self.checksum_errors = collections.Counter()
+        self.unknown_keys = collections.Counter()
+        self.reconnects = 0
+        self.recovery_time = Histogram(RECOVERY_TIME_BOUNDS)
+        self.last_recovery_time = None # ms from the failure to the first frame after the reconnection
+        self._last_rates = None # (time, frames, state_writes) of the previous rates
+
+    @staticmethod
+    def count_key(counter, key):
+        if key not in counter and len(counter) >= MAX_KEYS:
+            key = OTHER_KEY
+        counter[key] += 1
+
+    def add_checksum_error(self, label):
+        self.count_key(self.checksum_errors, label.decode("ascii", "replace"))
+
+    def add_unknown_key(self, label):
+        self.count_key(self.unknown_keys, label.decode("ascii", "replace"))
+
+    def add_recovery(self, recovery_time):
+        self.recovery_time.add(recovery_time)
+        self.last_recovery_time = round(recovery_time, 3)
+
+    def rates(self, now):
+        """Frames and state writes per second since the previous call"""
+        last = self._last_rates
+        self._last_rates = (now, self.frames, self.state_writes)
+        if last is None or now <= last[0]:
+            return None, None
+        elapsed = now - last[0]
+        return round((self.frames - last[1]) / elapsed, 3), round((self.state_writes - last[2]) / elapsed, 3)
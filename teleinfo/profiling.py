@@ -0,0 +1,98 @@
+"""Profile of the frame processing of running meters, on demand.
+
+The frame callbacks of the readers are swapped with profiled wrappers for
+the duration of the profile only, nothing is checked on the hot path
+otherwise.
+"""
+import cProfile
+import functools
+import os
+import pstats
+import time
+import tracemalloc
+
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 25
+TRACEMALLOC_FRAMES = 5
+
+
+class FrameProfiler:
+    """cProfile of the frame callbacks, and allocations while profiling if requested"""
+
+    def __init__(self, frames, allocations=False):
+        self.frames = frames
+        self.profiled_frames = 0
+        self.on_done = None
+        self._profile = cProfile.Profile()
+        self._allocations = allocations
+        self._snapshot = None
+        self._started_tracemalloc = False
+        self._started = None
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self._started
+
+    def start(self):
+        if self._allocations:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+                self._started_tracemalloc = True
+            self._snapshot = tracemalloc.take_snapshot()
+        self._started = time.monotonic()
+
+    def wrap(self, callback, frame_end=True):
+        """Profile each call of callback, frame_end counts the call as a profiled frame"""
+        profile = self._profile
+
+        @functools.wraps(callback)
+        def profiled(*args):
+            profile.enable()
+            try:
+                return callback(*args)
+            finally:
+                profile.disable()
+                if frame_end:
+                    self._frame_done()
+        return profiled
+
+    def _frame_done(self):
+        self.profiled_frames += 1
+        if self.profiled_frames >= self.frames and self.on_done:
+            self.on_done()
+
+    def stop(self):
+        """Return the profile and the allocations grown while profiling, None if not traced"""
+        allocations = None
+        if self._allocations:
+            snapshot = tracemalloc.take_snapshot()
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+            allocations = snapshot.compare_to(self._snapshot, "lineno")[:TOP_ALLOCATIONS]
+        return self._profile, allocations
+
+
+def write_report(directory, name, profile, allocations, frames, elapsed):
+    """Write name.pstats, loadable by pstats or snakeviz, and a name.txt summary, return their paths.
+
+    Without any frame profiled, pstats can't load the empty profile: only
+    the summary is written, and the pstats path is None.
+    """
+    os.makedirs(directory, exist_ok=True)
+    report_path = os.path.join(directory, f"{name}.txt")
+    if not frames:
+        with open(report_path, "w") as f:
+            f.write(f"No frame received in {elapsed:.1f}s, nothing profiled. Is the meter sending frames?\n")
+        return None, report_path
+    pstats_path = os.path.join(directory, f"{name}.pstats")
+    profile.dump_stats(pstats_path)
+    with open(report_path, "w") as f:
+        f.write(f"{frames} frames profiled in {elapsed:.1f}s\n\n")
+        stats = pstats.Stats(profile, stream=f)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(TOP_FUNCTIONS)
+        stats.sort_stats(pstats.SortKey.TIME).print_stats(TOP_FUNCTIONS)
+        if allocations is not None:
+            f.write("Top allocations while profiling\n\n")
+            for stat in allocations:
+                f.write(f"{stat}\n")
+    return pstats_path, report_path
@@ -0,0 +1,89 @@
+from array import array
+
+INFINITY = float("inf")
+
+
+class RollingWindow:
+    """Time weighted min, max and mean of a metric over a sliding window.
+
+    The window is split in a fixed number of buckets holding the min, max,
+    value x seconds and seconds of their time slice: memory is bounded
+    whatever the sample rate, and each sample costs an amortized O(1).
+    A value is held until the next one, so the lines skipped because they
+    didn't change still count in the mean.
+    """
+
+    def __init__(self, seconds, buckets):
+        self._width = seconds / buckets
+        self._size = buckets
+        self._min = array("d", [INFINITY] * buckets)
+        self._max = array("d", [-INFINITY] * buckets)
+        self._sum = array("d", bytes(8 * buckets))
+        self._time = array("d", bytes(8 * buckets))
+        self._bucket = None # Absolute number of the current bucket
+        self._value = None
+        self._since = None
+
+    def _clear(self, index):
+        self._min[index] = INFINITY
+        self._max[index] = -INFINITY
+        self._sum[index] = 0
+        self._time[index] = 0
+
+    def _advance(self, bucket):
+        """Move to the bucket, clearing the buckets that left the window"""
+        if self._bucket is None or bucket - self._bucket >= self._size:
+            for index in range(self._size):
+                self._clear(index)
+        else:
+            for expired in range(self._bucket + 1, bucket + 1):
+                self._clear(expired % self._size)
+        self._bucket = bucket
+
+    def _accumulate(self, until):
+        """Add the current value, held since the last sample, to the buckets up to until"""
+        start = max(self._since, until - self._size * self._width)
+        value = self._value
+        while start < until:
+            bucket = int(start // self._width)
+            if bucket != self._bucket:
+                self._advance(bucket)
+            end = min(until, (bucket + 1) * self._width)
+            index = bucket % self._size
+            self._sum[index] += value * (end - start)
+            self._time[index] += end - start
+            if value < self._min[index]:
+                self._min[index] = value
+            if value > self._max[index]:
+                self._max[index] = value
+            start = end
+        self._since = until
+
+    def add(self, value, now):
+        bucket = int(now // self._width)
+        index = bucket % self._size
+        if bucket == self._bucket and self._value is not None:
+            # Same bucket as the previous sample, by far the most frequent case
+            elapsed = now - self._since
+            self._sum[index] += self._value * elapsed
+            self._time[index] += elapsed
+        else:
+            if self._value is not None:
+                self._accumulate(now)
+            if bucket != self._bucket:
+                self._advance(bucket)
+        if value < self._min[index]:
+            self._min[index] = value
+        if value > self._max[index]:
+            self._max[index] = value
+        self._value = value
+        self._since = now
+
+    def stats(self, now):
+        """Return the (min, max, mean) over the window, None without samples"""
+        if self._value is None:
+            return None
+        self._accumulate(now)
+        total_time = sum(self._time)
+        mean = sum(self._sum) / total_time if total_time else self._value
+        return min(self._min), max(self._max), mean
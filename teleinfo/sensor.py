@@ -1,14 +1,28 @@
 import asyncio
+import functools
+import importlib
+import itertools
 import logging
-
-import serial
-import serial_asyncio
+import time
 
 from homeassistant import config_entries, core
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP, EntityCategory
 from homeassistant.helpers.entity import DeviceInfo
-from homeassistant.components.sensor import SensorEntity
-from .utils import StatusRegisterParser
-from .const import TELEINFO_KEY, START_FRAME_DELIMITER, END_FRAME_DELIMITER, DOMAIN, TeleinfoProtocolType, TeleinfoIndex, EURIDIS_MANUFACTURER, EURIDIS_DEVICE, TELEINFO_STATUS_REGISTER
+from homeassistant.helpers.event import async_call_later, async_track_time_interval, async_track_utc_time_change
+from homeassistant.helpers.storage import Store
+from homeassistant.components.sensor import SensorEntity, SensorStateClass
+from .utils import StatusRegisterParser, WriteThrottle
+from .framing import FrameSplitter, LineSplitter, frame_bytes
+from .transport import is_replay_port, is_socket_port, is_rfc2217_port, parse_replay_port, read_capture, create_replay_connection, create_socket_connection, SerialReaderThread
+from .detection import detect_protocol, detect_protocol_in
+from .rolling import RollingWindow
+from .timeseries import TimeSeriesRecorder
+from .instrumentation import FrameStats
+from .supervisor import ConnectionSupervisor
+from .broadcast import FrameBroadcaster
+from .derived import DerivedPowerEngine, ACTIVE_POWER, index_power_key
+from .decoder import get_line_decoders, SEPARATORS, ChecksumValidator, LineCache, Metric
+from .const import TELEINFO_KEY, DOMAIN, STORAGE_VERSION, INITIALIZATION_TIMEOUT, SNAPSHOT_SAVE_DELAY, SNAPSHOT_SAVE_INTERVAL, DERIVED_POWER_WINDOW, ROLLING_WINDOWS, ROLLING_WINDOW_BUCKETS, TIMESERIES_KEYS, TIMESERIES_FLUSH_INTERVAL, TIMESERIES_RETENTION, DIAGNOSTICS_UPDATE_INTERVAL, DIAGNOSTIC_SENSORS, SERIAL_READ_TIMEOUT, DETECTION_TIMEOUT, PROTOCOL_MISMATCH_FRAMES, BAUD_RATES, CONF_READER_THREAD, CONF_STREAMING, CONF_BROADCAST_HOST, CONF_BROADCAST_PORT, CONF_BROADCAST_SOCKET, CONF_BROADCAST_FORMAT, CONF_HOURLY_STATISTICS, HOURLY_STATISTICS_STATE_INTERVAL, CONF_TIMESERIES_RETENTION, CONF_MIN_INTERVAL, CONF_DEADBAND, CONF_RELATIVE_DEADBAND, TeleinfoProtocolType, TeleinfoIndex, TeleinfoPowerMetric, TELEINFO_STATUS_REGISTER
 
 
 logger = logging.getLogger(__name__)
@@ -21,18 +35,134 @@ async def async_setup_entry(
     """Setup sensors from a config entry created in the integrations UI."""
     config = hass.data[DOMAIN][config_entry.entry_id]
     logger.info(f"Setup Teleinfo serial with config {config}")
-    teleinfo_integration_initialyzed = asyncio.Event()
 
-    integration = TeleinfoIntegration(port=config["port"], type=config["type"])
-    integration.on_initialized_change = teleinfo_integration_initialyzed.set
-    await integration.setup_serial()
+    # Entities and last values of each meter saved on the previous run
+    store = Store(hass, STORAGE_VERSION, f"{DOMAIN}.{config_entry.entry_id}")
+    snapshots = await store.async_load() or {}
+
+    types = [config["type"]] * len(config["ports"])
+    restored_types = set() # Ports using the protocol of the previous run, checked with their first frames
+    if config["type"] == TeleinfoProtocolType.AUTO:
+        # The protocol of the previous run is used right away, the other ports are detected concurrently
+        known = {port: snapshots[port]["type"] for port in config["ports"] if snapshots.get(port, {}).get("type")}
+        unknown = [port for port in config["ports"] if port not in known]
+        detected = dict(zip(unknown, await asyncio.gather(*(TeleinfoIntegration.detect_protocol(port) for port in unknown))))
+        types = [known.get(port) or detected[port] for port in config["ports"]]
+        restored_types = set(known)
+
+    # One integration per meter, meters of the same protocol type sharing their decoders
+    integrations = [TeleinfoIntegration(port=port, type=type, options=config["options"]) for port, type in zip(config["ports"], types)]
+    config["integrations"] = integrations
+
+    @core.callback
+    def async_save_snapshots(*_):
+        store.async_delay_save(lambda: snapshots | {i.port: i.snapshot() for i in integrations if i.initialyzed}, SNAPSHOT_SAVE_DELAY)
+
+    # Every sample of a few metrics, in files of the config directory read by the query service
+    timeseries = None
+    if retention := config["options"].get(CONF_TIMESERIES_RETENTION, TIMESERIES_RETENTION):
+        timeseries = TimeSeriesRecorder(hass.config.path(DOMAIN), TIMESERIES_KEYS, retention * 86400)
+        config["timeseries"] = timeseries
+
+    async def async_flush_timeseries(*_):
+        await hass.async_add_executor_job(timeseries.flush)
+
+    @core.callback
+    def async_update_diagnostics(*_):
+        for integration in integrations:
+            integration.update_diagnostics()
+
+    # Meters restored on a port may be received on another one, their entities are moved once released
+    restored_devices = set()
+
+    @core.callback
+    def async_remove_entities(entities):
+        for entity in entities:
+            if entity.hass is not None:
+                hass.async_create_task(entity.async_remove())
 
-    # Wait for the initialized event
-    await teleinfo_integration_initialyzed.wait()
-    logger.info(f"Setup complete of teleinfo platform, metrics list {integration.metrics}")
+    async def async_check_protocol(integration, supervisor):
+        """Detect the protocol again if the one of the previous run gives no valid frame, then supervise the port"""
+        checked = asyncio.Event()
+        integration.on_protocol_mismatch = checked.set
+        remove_listener = integration.add_frame_listener(lambda sequence, changed: checked.set())
+        try:
+            await asyncio.wait_for(checked.wait(), INITIALIZATION_TIMEOUT)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            integration.on_protocol_mismatch = None
+            remove_listener()
+        connected = True
+        if integration.reconcile_pending:
+            logger.warning(f"No valid {integration.type} frame on {integration.port}, detecting its protocol again")
+            await integration.cleanup()
+            integration.set_type(await TeleinfoIntegration.detect_protocol(integration.port, integration.type))
+            try:
+                await integration.setup_serial()
+            except OSError as e:
+                logger.error(f"Unable to open {integration.port}: {e}")
+                connected = False
+        supervisor.start(connected)
+
+    async def async_setup_meter(integration):
+        if timeseries:
+            integration.add_frame_listener(lambda sequence, changed: timeseries.record(integration.device_id, changed))
+        teleinfo_integration_initialyzed = asyncio.Event()
+        integration.on_initialized_change = teleinfo_integration_initialyzed.set
+        integration.on_new_entities = async_add_entities
+        integration.on_removed_entities = async_remove_entities
+        integration.restored_devices = restored_devices
+        integration.on_snapshot_change = async_save_snapshots
+        if snapshot := snapshots.get(integration.port):
+            # Entities are created right away, and reconciled with the first frame received
+            integration.restore(snapshot)
+        try:
+            await integration.setup_serial()
+            connected = True
+        except OSError as e: # SerialException is an OSError, e.g. the USB dongle isn't enumerated yet
+            logger.error(f"Unable to open {integration.port}: {e}")
+            connected = False
+        if not is_replay_port(integration.port):
+            # Reopens the port when it fails or its frames stop, the entities are kept
+            supervisor = ConnectionSupervisor(integration)
+            config_entry.async_on_unload(supervisor.stop)
+            if connected and integration.port in restored_types:
+                config_entry.async_create_background_task(hass, async_check_protocol(integration, supervisor), f"teleinfo protocol check {integration.port}")
+            else:
+                supervisor.start(connected)
+
+        # Wait for the initialized event, entities are added on the first frame if it comes later
+        try:
+            await asyncio.wait_for(teleinfo_integration_initialyzed.wait(), INITIALIZATION_TIMEOUT)
+            logger.info(f"Setup complete of teleinfo meter on {integration.port}, metrics list {list(integration.metrics.values())}")
+        except asyncio.TimeoutError:
+            logger.warning(f"No frame received from {integration.port} after {INITIALIZATION_TIMEOUT}s, its entities will be added on the first frame")
+
+    options = config["options"]
+    if options.get(CONF_BROADCAST_PORT) or options.get(CONF_BROADCAST_SOCKET):
+        # Frames shared with the other local consumers of the meters, the serial ports being held here
+        broadcaster = FrameBroadcaster(integrations, options.get(CONF_BROADCAST_FORMAT, "json"))
+        try:
+            await broadcaster.start(options.get(CONF_BROADCAST_HOST) or None, options.get(CONF_BROADCAST_PORT), options.get(CONF_BROADCAST_SOCKET))
+            config["broadcaster"] = broadcaster
+        except OSError as e:
+            logger.error(f"Unable to start the teleinfo broadcast server: {e}")
+        config_entry.async_on_unload(broadcaster.stop)
 
-    sensors = integration.get_entities()
-    async_add_entities(sensors)
+    if options.get(CONF_HOURLY_STATISTICS):
+        # Recorder only imported by the entries using it
+        from .statistics import HourlyStatistics
+        statistics = HourlyStatistics(hass, integrations)
+        config_entry.async_on_unload(async_track_utc_time_change(hass, statistics.import_hour, minute=0, second=0))
+
+    # Meters are set up concurrently, each adding its entities on its first frame
+    await asyncio.gather(*(async_setup_meter(integration) for integration in integrations))
+    config_entry.async_on_unload(async_track_time_interval(hass, async_save_snapshots, SNAPSHOT_SAVE_INTERVAL))
+    config_entry.async_on_unload(async_track_time_interval(hass, async_update_diagnostics, DIAGNOSTICS_UPDATE_INTERVAL))
+    if timeseries:
+        config_entry.async_on_unload(async_track_time_interval(hass, async_flush_timeseries, TIMESERIES_FLUSH_INTERVAL))
+        config_entry.async_on_unload(hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, async_flush_timeseries))
 
 class TeleinfoChecksumErrorSensor(SensorEntity):
     _attr_has_entity_name = True
@@ -48,6 +178,10 @@ class TeleinfoChecksumErrorSensor(SensorEntity):
     def device_info(self) -> DeviceInfo:
         return self._device_info
 
+    @property
+    def key(self):
+        return "checksum_errors"
+
     @property
     def name(self):
         return f"Teleinfo checksum errors"
@@ -56,14 +190,64 @@ class TeleinfoChecksumErrorSensor(SensorEntity):
     def state(self):
         return self._state
     
-    def increment(self):
-        self._state += 1
+    def increment(self, count=1):
+        self._state += count
+
+    def write_state(self):
         self.async_write_ha_state()
+        return True
+
+
+class TeleinfoDiagnosticSensor(SensorEntity):
+    """Counter of the frame processing, for sizing hosts and spotting degrading links"""
+    _attr_has_entity_name = True
+    _attr_attribution = "Téléinfo"
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_entity_registry_enabled_default = False
+
+    def __init__(self, key, **kwargs):
+        self._key = key
+        self._state = None
+        self._attributes = None
+        self._device_info = kwargs.get("device_info")
+        self._device_serial = kwargs.get("serial")
+        self._attr_unique_id = f"teleinfo_{self._device_serial}_diagnostic_{key}"
+        self._attr_native_unit_of_measurement, self._attr_state_class = DIAGNOSTIC_SENSORS[key]
+
+    @property
+    def device_info(self) -> DeviceInfo:
+        return self._device_info
+
+    @property
+    def key(self):
+        return self._key
+
+    @property
+    def name(self):
+        return f"Teleinfo {self._key.replace('_', ' ')}"
+
+    @property
+    def state(self):
+        return self._state
+
+    @property
+    def extra_state_attributes(self):
+        return self._attributes
+
+    def set_value(self, value, attributes=None):
+        self._state = value
+        self._attributes = attributes
+
+    def write_state(self):
+        self.async_write_ha_state()
+        return True
 
 
 class TeleinfoMetricSensor(SensorEntity):
     _attr_has_entity_name = True
     _attr_attribution = "Téléinfo"
+    # Rolling statistics change on every write, the recorder has the states for history
+    _unrecorded_attributes = frozenset({f"{stat}_{name}" for stat in ("min", "max", "mean") for name in ROLLING_WINDOWS})
 
     def __init__(self, key, value=None, **kwargs):
         self._key = key
@@ -71,6 +255,8 @@ class TeleinfoMetricSensor(SensorEntity):
         self._device_info = kwargs.get("device_info")
         self._device_serial = kwargs.get("serial")
         self._attr_unique_id = f"teleinfo_standard_{self._device_serial}_{self._key}"
+        self._throttle = kwargs.get("throttle")
+        self._pending_write = None
 
         if c := kwargs.get("property"):
             self.property = c
@@ -78,10 +264,21 @@ class TeleinfoMetricSensor(SensorEntity):
             self._attr_native_unit_of_measurement = c._attr_native_unit_of_measurement
             self._attr_state_class = c._attr_state_class
 
+        # Rolling min/max/mean of instantaneous metrics, so dashboards don't query the recorder
+        self._windows = None
+        if c and c._attr_state_class == SensorStateClass.MEASUREMENT:
+            self._windows = {name: RollingWindow(seconds, ROLLING_WINDOW_BUCKETS) for name, seconds in ROLLING_WINDOWS.items()}
+            if value is not None:
+                self.add_sample(value)
+
     @property
     def device_info(self) -> DeviceInfo:
         return self._device_info
 
+    @property
+    def key(self):
+        return self._key
+
     @property
     def name(self):
         return f"Teleinfo {self._key}"
@@ -90,10 +287,68 @@ class TeleinfoMetricSensor(SensorEntity):
     def state(self):
         return self._state
     
+    @property
+    def extra_state_attributes(self):
+        if self._windows is None or self._state is None:
+            return None
+        now = time.monotonic()
+        attributes = {}
+        for name, window in self._windows.items():
+            if stats := window.stats(now):
+                attributes[f"min_{name}"], attributes[f"max_{name}"], mean = stats
+                attributes[f"mean_{name}"] = round(mean, 1)
+        return attributes
+
+    def add_sample(self, value):
+        now = time.monotonic()
+        for window in self._windows.values():
+            window.add(value, now)
+
     def set_value(self, value):
+        """Set the value, return True if it changed and the state must be written"""
         if self._state != value:
             self._state = value
+            if self._windows is not None and value is not None:
+                self.add_sample(value)
+            return True
+        return False
+
+    def write_state(self):
+        """Write the state, return False if it is throttled"""
+        if self._throttle is None:
             self.async_write_ha_state()
+            return True
+        return self.throttled_write()
+
+    def set_throttle(self, throttle):
+        self._throttle = throttle
+
+    def set_imported_statistics(self):
+        """Hourly statistics imported by the integration, none compiled by the recorder from the states"""
+        self._attr_state_class = None
+
+    def throttled_write(self):
+        delay = self._throttle.delay(self._state, time.monotonic())
+        if delay is None: # Within deadband
+            return False
+        if delay == 0:
+            self.cancel_pending_write()
+            self.async_write_ha_state()
+            self._throttle.written(self._state, time.monotonic())
+            return True
+        if self._pending_write is None: # Write the latest value once the interval is elapsed
+            self._pending_write = async_call_later(self.hass, delay, self._write_pending)
+        return False
+
+    @core.callback
+    def _write_pending(self, _now):
+        self._pending_write = None
+        self.throttled_write()
+
+    def cancel_pending_write(self):
+        if self._pending_write is not None:
+            self._pending_write()
+            self._pending_write = None
     
     def set_disabled(self):
         self._attr_entity_registry_enabled_default = False
@@ -101,9 +356,8 @@ class TeleinfoMetricSensor(SensorEntity):
     # async def async_added_to_hass(self):
     #     await self._integration.setup()
 
-    # async def async_will_remove_from_hass(self):
-    #     # Clean up any resources if needed
-    #     pass
+    async def async_will_remove_from_hass(self):
+        self.cancel_pending_write()
 
 class TeleinfoStatusRegisterSensor(TeleinfoMetricSensor):
 
@@ -127,69 +381,67 @@ class TeleinfoStatusRegisterSensor(TeleinfoMetricSensor):
         except (ValueError, TypeError):
             logger.warning(f"Unable to find state {self._state} in {self._value_mapping} for {self._name}")
 
-class ChecksumValidationError(Exception):
-    """Error on checksum line validation"""
-
 class TeleinfoIntegration:
 
-    SERIAL_PARITY = serial.PARITY_EVEN
-    SERIAL_STOP_BITS = serial.STOPBITS_ONE
-    SERIAL_BYTE_SIZE = serial.SEVENBITS
+    # 7E1, pyserial PARITY_EVEN, STOPBITS_ONE and SEVENBITS without importing serial at module load
+    SERIAL_PARITY = "E"
+    SERIAL_STOP_BITS = 1
+    SERIAL_BYTE_SIZE = 7
 
     START_FRAME_DELIMITER = b'\x02'
     END_FRAME_DELIMITER = b'\x03'
 
-    @staticmethod
-    def _validate_checksum(data, check):
-        chksum = sum([ord(c) for c in data])
-        chksum = (chksum & 0x3F) + 0x20
-        if chr(chksum) == check:
-            return True
-        else:
-            raise ChecksumValidationError()
-
-    def validate_checksum(self, data, check):
-        if self._checksum_control_mode and self._checksum_control_mode == 2:
-            return self._validate_checksum(data, check)
-        elif self._checksum_control_mode and self._checksum_control_mode == 1:
-            return self._validate_checksum(data[:-1], check)
-        else:
-            try:
-                result = self._validate_checksum(data, check)
-                if result:
-                    self._checksum_control_mode = 2
-                    logger.debug("Set checksum control methode to mode 2")
-                return result 
-            except ChecksumValidationError:
-                result = self._validate_checksum(data[:-1], check)
-                if result:
-                    self._checksum_control_mode = 1
-                    logger.debug("Set checksum control methode to mode 1")
-                    return result
-                else:
-                    raise
-
-    def __init__(self, port='/dev/ttyUSB0', type=TeleinfoProtocolType.HISTORIQUE):
+    def __init__(self, port='/dev/ttyUSB0', type=TeleinfoProtocolType.HISTORIQUE, options=None):
         self._serial_reader = None
+        self._options = options or {}
+        self._hourly_statistics = self._options.get(CONF_HOURLY_STATISTICS, False) # Applied on restart
         self.port = port
         self.device_id = None
-        self.type = type
         self._device = None
-        self.metrics  = set()
+        self.metrics  = {} # Metric of each label with its last decoded value, by label
         self._sensors = {}
         self._initialized = False
+        self._reconcile_pending = False
+        self._created = time.monotonic()
+        self.time_to_first_entity = None
         self.on_initialized_change = None
+        self.on_new_entities = None
+        self.on_removed_entities = None
+        self.restored_devices = set() # Devices whose restored entities wait for their meter, shared by the meters of an entry
+        self.on_snapshot_change = None
+        self.on_connection_lost = None
+        self.on_protocol_mismatch = None # Called when the restored protocol gives no valid frame
+        self.on_raw_frame = None # Called with the bytes of each frame while set, by the broadcaster
+        self._raw_lines = [] # Streaming mode, lines of the frame for on_raw_frame
         self._frame_buffer = b""
         self._frame_dict_buffer = dict()
         self._received_frames = 0
-        self._checksum_control_mode = None
+        self._frame_sequence = 0
+        self._changed_entities = set()
+        self._frame_listeners = []
         self.checksum_sensor = None
         self.status_parser = StatusRegisterParser()
-        
-        if self.type == TeleinfoProtocolType.STANDARD:
-            self.BAUD_RATE = 9600
-        else:
-            self.BAUD_RATE = 1200
+        self.set_type(type)
+        self._derived = DerivedPowerEngine(DERIVED_POWER_WINDOW)
+        self._frame_context = None
+        self._streamed_entities = set()
+        self._frame_lines = []
+        self.stats = FrameStats()
+        self._frame_received = None # time.perf_counter() of the ETX of the frame being processed
+        self._line_parse_time = 0.0 # Streaming mode, time spent on the lines of the frame
+        self._diagnostic_sensors = {}
+        self._diagnostics = {} # Last values of the diagnostic sensors
+        self._profiled_callbacks = [] # (owner, attribute, callback) swapped by start_profiling
+
+    def set_type(self, type):
+        """Protocol of the meter, changed while the port is closed when the restored one was wrong"""
+        self.type = type
+        self._checksum = ChecksumValidator(type)
+        self._separator = SEPARATORS[type]
+        self._decoders = get_line_decoders(type)
+        self._line_cache = LineCache(self._separator)
+        self._mismatched_frames = 0
+        self.BAUD_RATE = BAUD_RATES[type]
 
     @property
     def initialyzed(self):
@@ -198,18 +450,101 @@ class TeleinfoIntegration:
     @property
     def device_info(self):
         return self._device
+
+    @property
+    def line_cache(self):
+        return self._line_cache
+
+    @property
+    def frame_sequence(self):
+        return self._frame_sequence
+
+    @property
+    def received_frames(self):
+        return self._received_frames
+
+    @property
+    def reconcile_pending(self):
+        """Restored from a snapshot, no valid frame received yet"""
+        return self._reconcile_pending
+
+    @property
+    def splitter(self):
+        if self._serial_reader is None:
+            return None
+        reader, protocol = self._serial_reader
+        return reader.splitter if protocol is None else protocol.splitter
     
     def set_initialized(self, value):
         self._initialized = value
         if self.on_initialized_change:
             self.on_initialized_change()
 
+    @classmethod
+    async def detect_protocol(cls, port, hint=None):
+        """Protocol type of the meter on port, hint is sampled first and used if nothing is detected"""
+        loop = asyncio.get_running_loop()
+        detected = None
+        try:
+            if is_replay_port(port):
+                data = await loop.run_in_executor(None, read_capture, parse_replay_port(port)[0], 4096)
+                detected = detect_protocol_in(data)
+            else:
+                serial = await loop.run_in_executor(None, importlib.import_module, "serial")
+                open_port = functools.partial(
+                    serial.serial_for_url, # Network ports too, the baud rate is only applied by RFC 2217 ones
+                    port,
+                    parity=cls.SERIAL_PARITY,
+                    stopbits=cls.SERIAL_STOP_BITS,
+                    bytesize=cls.SERIAL_BYTE_SIZE,
+                    timeout=SERIAL_READ_TIMEOUT
+                )
+                detected = await loop.run_in_executor(None, detect_protocol, open_port, DETECTION_TIMEOUT, hint)
+        except OSError as e: # SerialException is an OSError
+            logger.error(f"Unable to detect the teleinfo protocol on {port}: {e}")
+        if detected is None:
+            detected = hint or TeleinfoProtocolType.HISTORIQUE
+            logger.warning(f"No teleinfo protocol detected on {port}, using {detected}")
+        else:
+            logger.info(f"Teleinfo protocol {detected} detected on {port}")
+        return detected
+
     async def setup_serial(self):
         # Start the serial reader
+        if is_replay_port(self.port): # Capture file replayed at the line rate, for tests
+            self._serial_reader = await create_replay_connection(
+                asyncio.get_running_loop(),
+                self.protocol_factory,
+                self.port,
+                self.BAUD_RATE
+            )
+            return
+        loop = asyncio.get_running_loop()
+        if is_socket_port(self.port): # ser2net raw port or TIC bridge, the line settings are done remotely
+            self._serial_reader = await create_socket_connection(loop, self.protocol_factory, self.port)
+            return
+        # pyserial is only needed by meters on a real serial port, imported off the event loop
+        if self._options.get(CONF_READER_THREAD) or is_rfc2217_port(self.port):
+            # Framing and checksums in a dedicated thread, not delayed by the event loop.
+            # RFC 2217 ports are read by pyserial's client, that serial_asyncio can't poll
+            serial = await loop.run_in_executor(None, importlib.import_module, "serial")
+            serial_port = await loop.run_in_executor(None, functools.partial(
+                serial.serial_for_url,
+                self.port,
+                baudrate=self.BAUD_RATE,
+                parity=self.SERIAL_PARITY,
+                stopbits=self.SERIAL_STOP_BITS,
+                bytesize=self.SERIAL_BYTE_SIZE,
+                timeout=SERIAL_READ_TIMEOUT
+            ))
+            reader = SerialReaderThread(loop, serial_port, ChecksumValidator(self.type), self.parse_lines, self.connection_lost)
+            self._serial_reader = (reader.start(), None) # (transport, protocol) like the asyncio readers
+            return
+        serial_asyncio = await loop.run_in_executor(None, importlib.import_module, "serial_asyncio")
         self._serial_reader = await serial_asyncio.create_serial_connection(
-            asyncio.get_running_loop(),
+            loop,
             # lambda: SerialProtocol(self.on_data_received),
-            lambda: SerialProtocol(self.on_frame_received),
+            self.protocol_factory,
             self.port,
             baudrate=self.BAUD_RATE,
             parity=self.SERIAL_PARITY,
@@ -217,11 +552,46 @@ class TeleinfoIntegration:
             bytesize=self.SERIAL_BYTE_SIZE
         )
 
+    def protocol_factory(self):
+        if self._options.get(CONF_STREAMING):
+            return StreamingSerialProtocol(self.on_line_received, self.on_frame_end, self.connection_lost)
+        return SerialProtocol(self.on_frame_received, self.connection_lost)
+
+    def connection_lost(self, exc):
+        """The reader stopped on an error, exc is None when it was closed or the replay ended"""
+        if exc is not None:
+            logger.error(f"Connection to {self.port} lost: {exc}")
+            if self.on_connection_lost:
+                self.on_connection_lost(exc)
+
     def get_entities(self):
         return self._sensors.values()
 
+    def get_throttle(self, properties_class):
+        if properties_class == TeleinfoIndex and self._hourly_statistics:
+            # The Energy dashboard reads the imported statistics, the state is only shown
+            return WriteThrottle(HOURLY_STATISTICS_STATE_INTERVAL)
+        option = getattr(properties_class, "throttle_option", None)
+        if option is None: # Index and other metrics keep every change
+            return None
+        min_interval = self._options.get(f"{option}_{CONF_MIN_INTERVAL}", 0)
+        deadband = self._options.get(f"{option}_{CONF_DEADBAND}", 0)
+        relative_deadband = self._options.get(f"{option}_{CONF_RELATIVE_DEADBAND}", 0)
+        if not (min_interval or deadband or relative_deadband):
+            return None
+        return WriteThrottle(min_interval, deadband, relative_deadband)
+
+    def set_options(self, options):
+        self._options = options
+        for sensor in self._sensors.values():
+            if properties_class := getattr(sensor, "property", None):
+                sensor.cancel_pending_write()
+                sensor.set_throttle(self.get_throttle(properties_class))
+
     def on_frame_received(self, frame):
         # logger.debug(f"New frame received: {frame}")
+        if self.on_raw_frame:
+            self.on_raw_frame(self.START_FRAME_DELIMITER + bytes(frame) + self.END_FRAME_DELIMITER)
         sensor_value = self.parse_frame(frame[1:-1])
 
     # def on_data_received(self, data):
@@ -253,85 +623,200 @@ class TeleinfoIntegration:
     def parse_frame(self, frame):
         # Parse the frame and extract the sensor value
         # Return the extracted sensor value
-        # logger.debug(frame)
-        frame_str = frame.decode("ascii")
+        self.parse_lines(bytes(frame).split(b"\r\n")) # frame is a memoryview only valid during the call
+
+    def parse_lines(self, lines, invalid_lines=None, received=None):
+        """Process the lines of a frame.
+
+        invalid_lines is None when the checksums are not validated yet,
+        else only the valid lines are given, validated by the reader thread.
+        received is the time.perf_counter() of the ETX, now if not given.
+        """
+        start = time.perf_counter()
+        self._frame_received = received or start
+        self._received_frames += 1
+        if invalid_lines is not None and self.on_raw_frame: # Reader thread, only the valid lines are left
+            self.on_raw_frame(frame_bytes(lines))
+        if self._reconcile_pending:
+            # Not validated with the shared checksum mode, that lines of another protocol would detect
+            valid_lines = self._checksum.protocol_lines(lines)
+            if not valid_lines:
+                # Noise, or another protocol whose checksums may be valid: the restored entities are kept
+                self._mismatched_frames += 1
+                if self._mismatched_frames == PROTOCOL_MISMATCH_FRAMES and self.on_protocol_mismatch:
+                    self.on_protocol_mismatch()
+                return
+            if not self.reconcile_entities(valid_lines):
+                return
         if self.initialyzed:
-            for l in frame_str.split("\r\n"):
-                if metric := self.parse_line(l):
+            changed_lines = self._line_cache.changed_lines(lines)
+            if invalid_lines is None:
+                valid_lines = self._checksum.validate([line for _, line in changed_lines])
+            else:
+                valid_lines = itertools.repeat(True)
+                if invalid_lines:
+                    self.checksum_sensor.increment(len(invalid_lines))
+                    self._changed_entities.add(self.checksum_sensor)
+                    for line in invalid_lines:
+                        self.stats.add_checksum_error(line.partition(self._separator)[0])
+            for (key, line), valid in zip(changed_lines, valid_lines):
+                if not valid:
+                    self.checksum_sensor.increment()
+                    self._changed_entities.add(self.checksum_sensor)
+                    self.stats.add_checksum_error(key)
+                    continue
+                self._line_cache.store(key, line)
+                if metric := self.decode_line(key, line):
                     self.update_entity(*metric)
+            self.update_derived()
+            self.stats.parse_time.add((time.perf_counter() - start) * 1000)
+            self.flush_entities()
+            if self._received_frames % 1000 == 0:
+                logger.debug(f"Line cache hits: {self._line_cache.hits} misses: {self._line_cache.misses}")
         else: # List the metrics to create Entities
-            logger.debug(f"Initialization frame received: {frame_str}")
-            self.setup_entities(frame_str)
-            
+            logger.debug(f"Initialization frame received: {lines}")
+            if valid_lines := lines if invalid_lines is not None else self.valid_lines(lines):
+                self.setup_entities(valid_lines)
+
+    def valid_lines(self, lines):
+        return [line for line, valid in zip(lines, self._checksum.validate(lines)) if valid]
+
     def parse_line(self, line):
-        ar = line.split() # Standard = "\t" historique = " "
-        key = ar[0]
-        metric_parts_length = len(ar)
+        # line is b"label<sep>[timestamp<sep>]value<sep>checksum" with a valid checksum
+        return self.decode_line(line.partition(self._separator)[0], line)
+
+    def decode_line(self, key, line):
+        decoder = self._decoders.get(key)
+        if decoder is None:
+            logger.debug(f"Found unknown key: {key} | {line}")
+            self.stats.add_unknown_key(key)
+            return None
         try:
-            metadata = TELEINFO_KEY[key]
-            payload_length = metadata["payload_length"]
-            # If line contain timestamp
-            if metric_parts_length == 4:
-                ts = ar[1]
-                value = ar[2]
-                checksum = ar[3]
-            elif metric_parts_length == 3:
-                value = ar[1]
-                checksum = ar[2]
-                ts = None
-            else:
-                logger.debug(f"Error in line {ar}, not composed by 3 or 4 elements")
-                return None
-            self.validate_checksum(line[:payload_length], checksum)
-            # if self.type == TeleinfoProtocolType.STANDARD: # TODO: Implement checksum control for historique
-            #     self.validate_checksum(line[:payload_length], checksum)
-            # else:
-            #     logger.debug(f"Historique data to control: |{line[:payload_length]}|checksum chr: {checksum}")
-            value = value.strip()
-            value = metadata["content_type"](value)
-            return (key, value, ts)
-        except KeyError:
-            logger.debug(f"Found unknown key: {key} | {ar}")
+            return decoder(line[len(key) + 1:-2])
         except ValueError:
-            logger.debug(f'Unable to parse value for {key} {value} in type {metadata["content_type"]}')
-        except IndexError:
-            logger.debug(f"Error in parsing of line in {ar}")
-        except ChecksumValidationError:
-            try:
-                self.checksum_sensor.increment()
-            except AttributeError:
-                pass # Checksum sensor is not initialyzed yet
-            # logger.debug(f"Error in checksum for {ar}")
-        
+            logger.debug(f"Unable to parse value for {key} in line {line}")
 
     def update_entity(self, key, value, timestamp):
         # Update the sensor entity with the new value
+        if metric := self.metrics.get(key): # Live values for the snapshot, the broadcast and the statistics
+            metric.value = value
+            metric.timestamp = timestamp
         try:
             if key != "STGE":
                 entity = self._sensors.get(key)
-                if entity:
-                    # logger.debug(f"Update sensor {key} with value {value}")
-                    entity.set_value(value)
+                if entity and entity.set_value(value):
+                    self._changed_entities.add(entity)
+                self._derived.set_index(key, value)
             else:
-                self.status_parser.parse_str(value)
-                for status_key in TELEINFO_STATUS_REGISTER.keys():
+                # Only the status sensors whose bits flipped since the last STGE are updated
+                for status_key in self.status_parser.parse_str(value):
                     entity = self._sensors.get(f"status_register|{status_key}")
-                    entity.set_value(getattr(self.status_parser, status_key))
+                    if entity.set_value(self.status_parser.field(status_key)):
+                        self._changed_entities.add(entity)
         except Exception:
             logger.debug(f"Unable to update entity key {key} with value: {value}")
 
-    def setup_entities(self, frame_str):
-        metrics_lines = frame_str.split("\r\n")
-        logger.debug(f"Initialyze frame: {frame_str}")
-        logger.debug(f"Splitted frame: {metrics_lines}")
+    def update_derived(self):
+        """Update the sensors derived from the indexes, e.g. the active power"""
+        # Timed by the reception of the frame, frames queued by the reader thread are processed in bursts
+        for key, value in self._derived.compute(self._frame_received):
+            entity = self._sensors.get(key)
+            if entity and entity.set_value(value):
+                self._changed_entities.add(entity)
+
+    def write_entities(self, entities):
+        # States written for a frame share the same context, consumers can group them
+        if self._frame_context is None:
+            self._frame_context = core.Context()
+        written = 0
+        for entity in entities:
+            if entity.hass is None: # Not added yet
+                continue
+            entity.async_set_context(self._frame_context)
+            written += entity.write_state()
+        self.stats.state_writes += written
+
+    def flush_entities(self):
+        """Write the entities changed by the frame, all at once at the end of the frame"""
+        self._frame_sequence += 1
+        self.stats.frames += 1
+        changed = self._changed_entities
+        if changed:
+            self._changed_entities = set()
+            self.write_entities(changed)
+            self.stats.write_latency.add((time.perf_counter() - self._frame_received) * 1000)
+        if self._streamed_entities: # Already written when their line was received
+            changed = changed | self._streamed_entities
+            self._streamed_entities = set()
+        self._frame_context = None
+        for listener in self._frame_listeners:
+            listener(self._frame_sequence, changed)
+
+    def on_line_received(self, line):
+        """Streaming mode: decode a line as soon as it is received, and write its entity right away"""
+        if self.on_raw_frame:
+            self._raw_lines.append(line)
+        if not self.initialyzed or self._reconcile_pending:
+            self._frame_lines.append(line) # Entities are set up at the end of the frame
+            return
+        if not self._line_cache.changed(line):
+            return
+        start = time.perf_counter()
+        key = line.partition(self._separator)[0]
+        if not self._checksum.validate((line,))[0]:
+            self.checksum_sensor.increment()
+            self._changed_entities.add(self.checksum_sensor)
+            self.stats.add_checksum_error(key)
+        else:
+            self._line_cache.store(key, line)
+            if metric := self.decode_line(key, line):
+                self.update_entity(*metric)
+        if self._changed_entities:
+            self.write_entities(self._changed_entities)
+            self._streamed_entities |= self._changed_entities
+            self._changed_entities.clear()
+        self._line_parse_time += time.perf_counter() - start
+
+    def on_frame_end(self, complete):
+        """Streaming mode: the lines were already processed, update what depends on the whole frame"""
+        if self._raw_lines:
+            lines, self._raw_lines = self._raw_lines, []
+            if complete and self.on_raw_frame:
+                self.on_raw_frame(frame_bytes(lines))
+        if not self.initialyzed or self._reconcile_pending:
+            lines, self._frame_lines = self._frame_lines, []
+            if complete: # Entities are only set up from a whole frame
+                self.parse_lines(lines)
+            return
+        start = self._frame_received = time.perf_counter()
+        self._received_frames += 1
+        self.update_derived()
+        self.stats.parse_time.add((self._line_parse_time + time.perf_counter() - start) * 1000)
+        self._line_parse_time = 0.0
+        self.flush_entities()
+
+    def add_frame_listener(self, listener):
+        """Call listener(sequence, changed_entities) after each processed frame, return the remove function"""
+        self._frame_listeners.append(listener)
+        return lambda: self._frame_listeners.remove(listener)
+
+    def setup_entities(self, metrics_lines):
         for l in metrics_lines:
-            if metric := self.parse_line(l):
+            key = l.partition(self._separator)[0]
+            self._line_cache.store(key, l)
+            if metric := self.decode_line(key, l):
                 if metric[0] in ("ADCO", "ADSC"):
+                    if self.device_id and self.device_id != metric[1]:
+                        logger.warning(f"Meter {metric[1]} on {self.port} replaces meter {self.device_id}, creating its entities")
+                        self._sensors = {}
+                        self.checksum_sensor = None
+                        self._diagnostic_sensors = {}
+                        self._derived = DerivedPowerEngine(DERIVED_POWER_WINDOW)
                     self.device_id = metric[1]
                     logger.info("Set teleinfo device id")
                     self.set_device_info()
                 elif not metric[0] in ("DATE", "VTIC"): # , "STGE"
-                    self.metrics.add(metric)
+                    self.metrics[metric[0]] = Metric(*metric)
         self.set_entities()
 
     def set_device_info(self):
@@ -339,6 +824,7 @@ class TeleinfoIntegration:
             manufacturer_code = self.device_id[:2]
             model_code = self.device_id[4:6]
             logger.debug(f"Device id is {self.device_id}, manufacturer code is {manufacturer_code} model code is {model_code}")
+            from .euridis import EURIDIS_MANUFACTURER, EURIDIS_DEVICE
             manufacturer_name = EURIDIS_MANUFACTURER.get(manufacturer_code)
             model_name = EURIDIS_DEVICE.get(model_code)
             self._device = DeviceInfo(
@@ -350,87 +836,231 @@ class TeleinfoIntegration:
             model=model_name
         )
 
+    def restore(self, snapshot):
+        """Create the entities from a snapshot saved on a previous run, before any frame is received"""
+        logger.info(f"Restore teleinfo meter {snapshot['device_id']} on {self.port}")
+        self.device_id = snapshot["device_id"]
+        self.set_device_info()
+        self.metrics = {key: Metric(key, value, timestamp) for key, value, timestamp in snapshot["metrics"]}
+        self._reconcile_pending = True
+        self.restored_devices.add(self.device_id)
+        self.set_entities()
+
+    def frame_device_id(self, valid_lines):
+        for line in valid_lines:
+            key = line.partition(self._separator)[0]
+            if key in (b"ADCO", b"ADSC") and (metric := self.decode_line(key, line)):
+                return metric[1]
+        return None
+
+    def reconcile_entities(self, valid_lines):
+        """Add the entities of the metrics of the first frame missing from the restored snapshot.
+
+        Another meter than the restored one, e.g. USB dongles enumerated in
+        another order, releases the restored entities. Its own entities are
+        created once no other port holds them restored, return False until then.
+        """
+        device_id = self.frame_device_id(valid_lines)
+        if device_id is None:
+            return False
+        if device_id != self.device_id:
+            if self._sensors:
+                logger.warning(f"Meter {device_id} on {self.port} instead of the restored meter {self.device_id}, removing its entities")
+                self.restored_devices.discard(self.device_id)
+                if self.on_removed_entities:
+                    self.on_removed_entities(list(self._sensors.values()))
+                self._sensors = {}
+                self.checksum_sensor = None
+                self._diagnostic_sensors = {}
+                self._derived = DerivedPowerEngine(DERIVED_POWER_WINDOW)
+                self.device_id = None
+            if device_id in self.restored_devices:
+                return False # Restored on another port, not received there yet
+        self.restored_devices.discard(device_id)
+        self._reconcile_pending = False
+        self.metrics = {}
+        self.setup_entities(valid_lines)
+        self._line_cache.clear() # Restored values are updated by the frame
+
+    def snapshot(self):
+        """Device id and metrics with their last value, to restore the entities on the next start"""
+        metrics = [list(metric) for metric in self.metrics.values()]
+        return {"device_id": self.device_id, "type": self.type, "metrics": metrics}
+
     def set_entities(self):
-        for key, value, timestamp in self.metrics:
+        existing_sensors = set(self._sensors)
+        for key, value, timestamp in self.metrics.values():
+            if key in self._sensors:
+                continue
             if not key == "STGE": # Manage alla lines that are not status register
                 properties = TELEINFO_KEY[key]
                 properties_class = properties.get("class")
-                sensor = TeleinfoMetricSensor(key, value, device_info=self.device_info, serial=self.device_id, property=properties_class)
-                if properties_class == TeleinfoIndex and int(value) == 0: #Avoid to create sensor for unused index
-                    sensor.set_disabled()
+                sensor = TeleinfoMetricSensor(key, value, device_info=self.device_info, serial=self.device_id, property=properties_class, throttle=self.get_throttle(properties_class))
                 self._sensors[key] = sensor
+                if properties_class == TeleinfoIndex:
+                    if self._hourly_statistics:
+                        sensor.set_imported_statistics()
+                    # Rate of the index, from which the active power is also derived
+                    self._derived.add_index(key, int(value))
+                    power_sensor = TeleinfoMetricSensor(index_power_key(key), device_info=self.device_info, serial=self.device_id, property=TeleinfoPowerMetric)
+                    self._sensors[index_power_key(key)] = power_sensor
+                    if int(value) == 0: #Avoid to create sensor for unused index
+                        sensor.set_disabled()
+                        power_sensor.set_disabled()
             else: # Manage status register differently since it host multiple sensors
                 self.status_parser.parse_str(value)
                 for status_key in TELEINFO_STATUS_REGISTER.keys():
-                    status_value = getattr(self.status_parser, status_key)
+                    status_value = self.status_parser.field(status_key)
+                    if sensor := self._sensors.get(f"status_register|{status_key}"):
+                        # Restored sensor, the register of the first frame may differ from the snapshot
+                        if sensor.set_value(status_value):
+                            self._changed_entities.add(sensor)
+                        continue
                     # logger.debug(f"Init status {status_key}, with value {status_value}")
                     sensor = TeleinfoStatusRegisterSensor(status_key, value=status_value, device_info=self.device_info, serial=self.device_id)
                     # logger.info(f"Parse status register and check contact sec status {self.status_parser.contact_sec}")
                     self._sensors[f"status_register|{status_key}"] = sensor
+        if self._derived.index_keys and ACTIVE_POWER not in self._sensors:
+            self._sensors[ACTIVE_POWER] = TeleinfoMetricSensor(ACTIVE_POWER, device_info=self.device_info, serial=self.device_id, property=TeleinfoPowerMetric)
         # Setup base checksum error sensor to count checksum error
-        self.checksum_sensor = TeleinfoChecksumErrorSensor(device_info=self.device_info, serial=self.device_id)
-        self._sensors["checksum_errors"] = self.checksum_sensor
-        self.set_initialized(True)
+        if self.checksum_sensor is None:
+            self.checksum_sensor = TeleinfoChecksumErrorSensor(device_info=self.device_info, serial=self.device_id)
+            self._sensors["checksum_errors"] = self.checksum_sensor
+        if not self._diagnostic_sensors:
+            for key in DIAGNOSTIC_SENSORS:
+                self._diagnostic_sensors[key] = TeleinfoDiagnosticSensor(key, device_info=self.device_info, serial=self.device_id)
+                self._sensors[f"diagnostic|{key}"] = self._diagnostic_sensors[key]
+        new_sensors = [sensor for key, sensor in self._sensors.items() if key not in existing_sensors]
+        if new_sensors and self.on_new_entities:
+            if self.time_to_first_entity is None:
+                self.time_to_first_entity = time.monotonic() - self._created
+                logger.info(f"First entities of {self.port} created after {self.time_to_first_entity:.3f}s")
+            self.on_new_entities(new_sensors)
+        if self.on_snapshot_change:
+            self.on_snapshot_change()
+        if not self._initialized:
+            self.set_initialized(True)
             
+    @property
+    def profiling(self):
+        return bool(self._profiled_callbacks)
+
+    def frame_callbacks(self):
+        """(owner, attribute, is frame end) of the callbacks the reader calls with the received frames"""
+        if self._serial_reader is None:
+            return []
+        reader, protocol = self._serial_reader
+        if protocol is None: # Reader thread
+            return [(reader, "_callback", True)]
+        splitter = protocol.splitter
+        if isinstance(splitter, LineSplitter):
+            return [(splitter, "_on_line", False), (splitter, "_on_frame_end", True)]
+        return [(splitter, "_callback", True)]
+
+    def start_profiling(self, profiler):
+        """Swap the frame callbacks with profiled ones until stop_profiling"""
+        for owner, attribute, frame_end in self.frame_callbacks():
+            callback = getattr(owner, attribute)
+            self._profiled_callbacks.append((owner, attribute, callback))
+            setattr(owner, attribute, profiler.wrap(callback, frame_end))
+
+    def stop_profiling(self):
+        for owner, attribute, callback in self._profiled_callbacks:
+            setattr(owner, attribute, callback)
+        self._profiled_callbacks = []
+
+    def update_diagnostics(self):
+        """Compute the diagnostic values and write the enabled diagnostic sensors, called periodically"""
+        frames_per_second, writes_per_second = self.stats.rates(time.monotonic())
+        splitter = self.splitter
+        stats = self.stats
+        self._diagnostics = {
+            "bytes_received": splitter.received_bytes if splitter else None,
+            "frames_per_second": frames_per_second,
+            "framing_resyncs": splitter.resyncs if splitter else None,
+            "buffer_high_water": splitter.high_water if splitter else None,
+            "parse_time": stats.parse_time.interval_mean(),
+            "checksum_errors_by_key": sum(stats.checksum_errors.values()),
+            "unknown_keys": sum(stats.unknown_keys.values()),
+            "state_writes_per_second": writes_per_second,
+            "write_latency": stats.write_latency.interval_mean(),
+            "reconnects": stats.reconnects,
+            "recovery_time": stats.last_recovery_time,
+        }
+        attributes = {
+            "parse_time": {name: stats.parse_time.percentile(percent) for name, percent in (("p50", 50), ("p95", 95))} | {"max": round(stats.parse_time.max, 3)},
+            "write_latency": {name: stats.write_latency.percentile(percent) for name, percent in (("p50", 50), ("p95", 95))} | {"max": round(stats.write_latency.max, 3)},
+            "checksum_errors_by_key": dict(stats.checksum_errors),
+            "unknown_keys": dict(stats.unknown_keys),
+            "recovery_time": {name: stats.recovery_time.percentile(percent) for name, percent in (("p50", 50), ("p95", 95))} | {"max": round(stats.recovery_time.max, 3)},
+        }
+        for key, sensor in self._diagnostic_sensors.items():
+            sensor.set_value(self._diagnostics[key], attributes.get(key))
+            if sensor.hass is not None: # Disabled sensors are never added
+                sensor.write_state()
+
+    def diagnostics(self):
+        """Counters and histograms of the meter, for the diagnostics download"""
+        splitter = self.splitter
+        reader = self._serial_reader[0] if self._serial_reader else None
+        return {
+            "port": self.port,
+            "type": self.type,
+            "device_id": self.device_id,
+            "initialized": self._initialized,
+            "time_to_first_entity": self.time_to_first_entity,
+            "received_frames": self._received_frames,
+            "processed_frames": self.stats.frames,
+            "state_writes": self.stats.state_writes,
+            "line_cache": {"hits": self._line_cache.hits, "misses": self._line_cache.misses},
+            "framing": splitter and {name: getattr(splitter, name) for name in ("received_bytes", "dropped_bytes", "frames", "resyncs", "high_water")},
+            "reader_thread_dropped_frames": getattr(reader, "dropped_frames", None),
+            "parse_time_ms": self.stats.parse_time.summary(),
+            "write_latency_ms": self.stats.write_latency.summary(),
+            "checksum_errors_by_key": dict(self.stats.checksum_errors),
+            "unknown_keys": dict(self.stats.unknown_keys),
+            "reconnects": self.stats.reconnects,
+            "recovery_time_ms": self.stats.recovery_time.summary(),
+            "last_update": self._diagnostics,
+        }
+
     async def cleanup(self):
         if self._serial_reader:
-            self._serial_reader.close()
-            await self._serial_reader.wait_closed()
+            transport, protocol = self._serial_reader
+            self._serial_reader = None
+            if protocol is None: # Reader thread, joined and its port closed out of the event loop
+                await asyncio.get_running_loop().run_in_executor(None, transport.close)
+            else:
+                transport.close()
+        # The next reader starts with a new framer, partial frame discarded
+        self._frame_lines = []
+        self._raw_lines = []
+        self._line_parse_time = 0.0
 
 
 class SerialProtocol(asyncio.Protocol):
-    def __init__(self, callback):
-        self._callback = callback
-        self._buffer = b""
-        self._incomplete_frame = True
+    def __init__(self, callback, on_connection_lost=None):
+        self._splitter = FrameSplitter(callback)
+        self._on_connection_lost = on_connection_lost
 
-    # def data_received(self, data):
-    #     if self._callback:
-    #         self._callback(data)
+    @property
+    def splitter(self):
+        return self._splitter
 
     def data_received(self, data):
-        self._buffer += data
-        self.process_buffer()
-
-    def process_buffer(self):
-        while START_FRAME_DELIMITER in self._buffer:
-            start_index = self._buffer.find(START_FRAME_DELIMITER)
-            self._buffer = self._buffer[start_index:]
-
-            end_index = self._buffer.find(END_FRAME_DELIMITER)
-            if end_index != -1:
-                complete_frame = self._buffer[1:end_index]
-                self._callback(complete_frame)
-                self._buffer = self._buffer[end_index + 1:]
-                self.incomplete_frame = False
-            else:
-                self.incomplete_frame = True
-                break
-
-    #     if START_FRAME_DELIMITER in self._buffer and END_FRAME_DELIMITER in self._buffer: #
-    #         start_frame_index = self._buffer.find(START_FRAME_DELIMITER)
-    #         end_frame_index = self._buffer.find(END_FRAME_DELIMITER)
-    #         # logger.debug(f"INITIALIZATION: start index {start_frame_index} end index {end_frame_index} {self._buffer}")
-    #         if end_frame_index < start_frame_index:
-    #             # logger.debug(f"Strip buffer content: {self._buffer[:start_frame_index]}")
-    #             self._frame_buffer = self._buffer[start_frame_index-2:]
-    #             # logger.debug(f"New buffer content: {self._buffer}")
-    #         # logger.debug(self._frame_buffer)
-    #             frames = self._buffer.split(END_FRAME_DELIMITER)
-    #         else:
-    #             frames = self._buffer.split(END_FRAME_DELIMITER+START_FRAME_DELIMITER)
-    #         complete_frames = frames[:-1]
-    #         self._buffer = frames[-1]
-    #         # Process the complete frames and update the sensor
-    #         for frame in complete_frames:
-    #             self._callback(frame[1:-1])
-                # sensor_value = self.parse_frame(frame[1:-1]) # Strip START_FRAME_DELIMITER and END_FRAME_DELIMITER
-        # while True:
-        #     start_index = self._buffer.find(START_FRAME_DELIMITER)
-        #     end_index = self._buffer.find(END_FRAME_DELIMITER)
-        #     if start_index != -1 and end_index != -1:
-        #         complete_frame = self._buffer[start_index + 1:end_index]
-        #         asyncio.ensure_future(self._callback(complete_frame))
-        #         self._buffer = self._buffer[end_index + 1:]
-        #     else:
-        #         break
+        self._splitter.feed(data)
+
+    def eof_received(self):
+        # Network ports: the bridge closed the connection, a failure unlike a local close
+        if self._on_connection_lost:
+            self._on_connection_lost(ConnectionResetError("Connection closed by the remote end"))
+
+    def connection_lost(self, exc):
+        if self._on_connection_lost:
+            self._on_connection_lost(exc)
+
+
+class StreamingSerialProtocol(SerialProtocol):
+    def __init__(self, on_line, on_frame_end, on_connection_lost=None):
+        self._splitter = LineSplitter(on_line, on_frame_end)
+        self._on_connection_lost = on_connection_lost
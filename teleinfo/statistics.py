@@ -0,0 +1,78 @@
+"""Hourly long-term statistics of the indexes, imported instead of compiled from their states.
+
+The Energy dashboard only reads hourly statistics. On the hour, the value
+of each index of the meters is imported as an external statistic
+(teleinfo:<meter>_<label>) for the hour that ended. Its state is the index,
+its sum a running total of the index increases, starting at 0: the
+dashboard shows the difference of two sums as the consumption of an hour,
+a sum equal to the index would show the whole index on the first hour. A
+decreasing index, e.g. a replaced meter, adds nothing. After a restart the
+sum goes on from the last imported row. The index entities then have no
+state class and their states are written hourly, the recorder neither
+stores every change nor compiles 5 minute statistics from them.
+
+Turning the option on orphans the long-term statistics already compiled
+from the index entities: the sources of the Energy dashboard must be
+replaced by the imported statistics, as explained in the option text.
+"""
+import datetime
+import logging
+
+from homeassistant.components.recorder import get_instance
+from homeassistant.components.recorder.statistics import async_add_external_statistics, get_last_statistics
+from homeassistant.const import UnitOfEnergy
+import homeassistant.util.dt as dt_util
+
+from .const import DOMAIN, TELEINFO_KEY, TeleinfoIndex
+
+logger = logging.getLogger(__name__)
+
+
+def statistic_id(device_id, key):
+    return f"{DOMAIN}:{device_id}_{key.lower()}"
+
+
+class HourlyStatistics:
+
+    def __init__(self, hass, integrations):
+        self._hass = hass
+        self._integrations = integrations
+        self._received_frames = {} # Frames received by each meter at the previous import
+        self._sums = {} # [index, sum] of the last row of each statistic
+        self.imported = 0 # Statistic rows
+
+    async def _last_row(self, statistic_id, index):
+        """[index, sum] of the last imported row, the index with a zero sum if none"""
+        last = await get_instance(self._hass).async_add_executor_job(get_last_statistics, self._hass, 1, statistic_id, False, {"state", "sum"})
+        if rows := last.get(statistic_id):
+            return [rows[0]["state"] or index, rows[0]["sum"] or 0]
+        return [index, 0]
+
+    async def import_hour(self, now):
+        """Import the indexes at the end of the hour before now, called on the hour"""
+        start = dt_util.as_utc(now).replace(minute=0, second=0, microsecond=0) - datetime.timedelta(hours=1)
+        for integration in self._integrations:
+            received_frames = integration.received_frames
+            if not integration.initialyzed or received_frames == self._received_frames.get(integration.port):
+                continue # No frame during the hour, the indexes at its end are unknown
+            self._received_frames[integration.port] = received_frames
+            for key, metric in list(integration.metrics.items()): # Not changed by a frame while the last rows are read
+                if TELEINFO_KEY.get(key, {}).get("class") is not TeleinfoIndex or not metric.value:
+                    continue # Unused indexes are 0
+                metadata = {
+                    "has_mean": False,
+                    "has_sum": True,
+                    "name": f"Teleinfo {integration.device_id} {TELEINFO_KEY[key]['description']}",
+                    "source": DOMAIN,
+                    "statistic_id": statistic_id(integration.device_id, key),
+                    "unit_of_measurement": UnitOfEnergy.WATT_HOUR,
+                }
+                value = int(metric.value)
+                last = self._sums.get(metadata["statistic_id"])
+                if last is None:
+                    last = self._sums[metadata["statistic_id"]] = await self._last_row(metadata["statistic_id"], value)
+                last[1] += max(0, value - last[0])
+                last[0] = value
+                async_add_external_statistics(self._hass, metadata, [{"start": start, "state": value, "sum": last[1]}])
+                self.imported += 1
+        logger.debug(f"Hourly statistics of {start.isoformat()} imported, {self.imported} rows since start")
@@ -0,0 +1,115 @@
+"""Reconnection of the serial port of a meter, without recreating its entities.
+
+The supervisor waits for the reader to report a lost connection, or for
+the frames to stop coming for several times the usual frame interval, e.g.
+after a USB dongle reset. The port is then closed and reopened with a
+jittered exponential backoff. The integration keeps its entities, caches
+and counters: the reader starts a new framer and the entities are written
+again from the first frame received.
+"""
+import asyncio
+import logging
+import random
+
+from .const import INITIALIZATION_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+STALL_CHECK_INTERVAL = 5 # Seconds between two checks of the frame count
+STALL_MIN_TIMEOUT = 15 # Seconds without frame before a stall, historique frames come every 1.5s
+STALL_FRAME_INTERVALS = 10 # Frame intervals without frame before a stall
+RECONNECT_MIN_DELAY = 0.5 # Seconds, a USB dongle takes about a second to be enumerated again
+RECONNECT_MAX_DELAY = 60
+
+
+class ConnectionSupervisor:
+
+    def __init__(self, integration):
+        self._integration = integration
+        self._lost = asyncio.Event()
+        self._task = None
+        self._delay = RECONNECT_MIN_DELAY
+        self._recovery_started = None
+        self._remove_listener = None
+        self.frame_interval = None # Seconds, measured between two checks
+
+    def start(self, connected=True):
+        """Supervise the connection of the integration, opened first if not connected"""
+        self._integration.on_connection_lost = self.connection_lost
+        self._task = asyncio.get_running_loop().create_task(self._run(connected))
+        return self
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._stop_recovery()
+
+    def connection_lost(self, exc):
+        self._lost.set()
+
+    def stall_timeout(self):
+        if self.frame_interval is None:
+            return INITIALIZATION_TIMEOUT
+        return max(STALL_MIN_TIMEOUT, STALL_FRAME_INTERVALS * self.frame_interval)
+
+    async def _run(self, connected):
+        if not connected:
+            await self._reconnect()
+        while True:
+            reason = await self._wait_for_failure()
+            logger.warning(f"{reason} on {self._integration.port}, reconnecting")
+            await self._reconnect()
+
+    async def _wait_for_failure(self):
+        """Return the reason of the failure, the connection lost or a stall of the frames"""
+        loop = asyncio.get_running_loop()
+        frames = self._integration.received_frames
+        last_frame = loop.time()
+        while True:
+            try:
+                await asyncio.wait_for(self._lost.wait(), STALL_CHECK_INTERVAL)
+                return "Connection lost"
+            except asyncio.TimeoutError:
+                pass
+            now = loop.time()
+            received = self._integration.received_frames
+            if received != frames:
+                self.frame_interval = (now - last_frame) / (received - frames)
+                frames, last_frame = received, now
+            elif now - last_frame > self.stall_timeout():
+                return f"No frame received for {now - last_frame:.0f}s"
+
+    async def _reconnect(self):
+        loop = asyncio.get_running_loop()
+        self._stop_recovery()
+        if self._recovery_started is None:
+            self._recovery_started = loop.time()
+        await self._integration.cleanup()
+        self._integration.stats.reconnects += 1
+        while True:
+            await asyncio.sleep(random.uniform(self._delay / 2, self._delay))
+            self._delay = min(2 * self._delay, RECONNECT_MAX_DELAY)
+            self._lost.clear()
+            try:
+                await self._integration.setup_serial()
+                break
+            except OSError as e: # SerialException is an OSError
+                logger.debug(f"Unable to reopen {self._integration.port}: {e}")
+        logger.info(f"Port {self._integration.port} reopened")
+        # Recovered on the first frame processed, if it comes before the next failure
+        self._remove_listener = self._integration.add_frame_listener(self._recovered)
+
+    def _recovered(self, sequence, changed):
+        loop = asyncio.get_running_loop()
+        recovery_time = loop.time() - self._recovery_started
+        self._integration.stats.add_recovery(recovery_time * 1000)
+        logger.info(f"Frames received again on {self._integration.port} after {recovery_time:.1f}s")
+        self._recovery_started = None
+        self._delay = RECONNECT_MIN_DELAY
+        loop.call_soon(self._stop_recovery) # Listeners are being called
+
+    def _stop_recovery(self):
+        if self._remove_listener is not None:
+            self._remove_listener()
+            self._remove_listener = None
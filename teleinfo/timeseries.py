@@ -0,0 +1,287 @@
+"""High resolution time series of a few metrics, kept out of the recorder.
+
+One append-only file per meter and key, made of 4 KiB blocks. A block
+starts with a header: its first sample (time in ms, value) and a summary
+of the block (number of records, duration, last value, min, max, time
+weighted sum), followed by fixed 4 bytes records of (ms since the previous
+sample, value change). A time delta of 65.535s or more, e.g. between two
+CCASN samples, takes an escape record holding its high bits before its
+record. A new block starts when it is full or when a delta doesn't fit.
+Only the changes of the value are stored, a value is held until the next
+sample.
+
+The blocks older than the retention are dropped by rewriting the file,
+once a quarter of the retention has expired so a file isn't rewritten on
+every flush.
+
+Queries bisect the block headers through mmap. Blocks inside a single
+down-sampling bucket are read from their summary, only the blocks across
+bucket boundaries are decoded.
+"""
+import bisect
+import itertools
+import logging
+import mmap
+import operator
+import os
+import struct
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+BLOCK_SIZE = 4096
+# Start time in ms, start value, number of records, duration in ms, last value, min, max, sum of value x ms
+HEADER = struct.Struct("<qiIIiiid")
+DELTA = struct.Struct("<Hh") # ms since the previous sample, value change
+DELTAS_PER_BLOCK = (BLOCK_SIZE - HEADER.size) // DELTA.size
+WIDE_DELTA = 0xFFFF # Time of an escape record, its value change field is the high bits of the next time delta
+MAX_DELTA = 0x7FFF << 16 | 0xFFFF # About 24 days
+
+
+class SeriesFile:
+    """Append-only series of integer samples, written by flush() out of the event loop"""
+
+    def __init__(self, path):
+        self.path = path
+        self._pending = []
+        self._block = None # Index and header fields of the last block of the file
+
+    def append(self, timestamp, value):
+        self._pending.append((timestamp, value))
+
+    def _read_last(self, fd):
+        size = os.fstat(fd).st_size
+        if size < HEADER.size:
+            return None
+        index = (size - 1) // BLOCK_SIZE
+        return [index, *HEADER.unpack(os.pread(fd, HEADER.size, index * BLOCK_SIZE))]
+
+    def _write_block(self, fd, block, records):
+        offset = block[0] * BLOCK_SIZE
+        if records:
+            os.pwrite(fd, records, offset + HEADER.size + block[3] * DELTA.size - len(records))
+        # The header is written last, a crash never exposes a partial record
+        os.pwrite(fd, HEADER.pack(*block[1:]), offset)
+
+    def flush(self):
+        samples, self._pending = self._pending, []
+        if not samples:
+            return
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if self._block is None:
+                self._block = self._read_last(fd)
+            block = self._block
+            records = bytearray()
+            for timestamp, value in samples:
+                if block is not None:
+                    index, start, _, count, duration, last, minimum, maximum, weighted = block
+                    dt = timestamp - start - duration
+                    dv = value - last
+                    wide = dt >= WIDE_DELTA
+                    if count + wide < DELTAS_PER_BLOCK and 0 <= dt <= MAX_DELTA and -0x8000 <= dv <= 0x7FFF:
+                        if wide:
+                            records += DELTA.pack(WIDE_DELTA, dt >> 16)
+                        records += DELTA.pack(dt & 0xFFFF, dv)
+                        block[3:] = count + 1 + wide, duration + dt, value, min(minimum, value), max(maximum, value), weighted + last * dt
+                        continue
+                    self._write_block(fd, block, records)
+                    records = bytearray()
+                index = block[0] + 1 if block is not None else 0
+                block = [index, timestamp, value, 0, 0, value, value, value, 0.0]
+            self._write_block(fd, block, records)
+            self._block = block
+        finally:
+            os.close(fd)
+
+    def trim(self, before, margin):
+        """Drop the blocks ended before the before time (ms) once the first one started margin ms earlier, return their number"""
+        try:
+            fd = os.open(self.path, os.O_RDONLY)
+        except FileNotFoundError:
+            return 0
+        try:
+            size = os.fstat(fd).st_size
+            if size < HEADER.size or HEADER.unpack(os.pread(fd, HEADER.size, 0))[0] >= before - margin:
+                return 0
+            blocks = (size + BLOCK_SIZE - 1) // BLOCK_SIZE
+            # The last block starting before the before time is kept, it holds the value at that time
+            dropped = bisect.bisect_right(range(blocks), before, key=lambda index: HEADER.unpack(os.pread(fd, HEADER.size, index * BLOCK_SIZE))[0]) - 1
+            if dropped <= 0:
+                return 0
+            kept = os.pread(fd, size - dropped * BLOCK_SIZE, dropped * BLOCK_SIZE)
+        finally:
+            os.close(fd)
+        # Replaced at once, a query reading the previous file keeps it until it is done
+        with open(f"{self.path}.tmp", "wb") as f:
+            f.write(kept)
+        os.replace(f"{self.path}.tmp", self.path)
+        if self._block is not None:
+            self._block[0] -= dropped
+        return dropped
+
+
+def unescape(times, changes):
+    """Time deltas and value changes of the records of a block with escape records"""
+    deltas = []
+    values = []
+    high = None
+    for dt, dv in zip(times, changes):
+        if high is not None:
+            deltas.append(high << 16 | dt)
+            values.append(dv)
+            high = None
+        elif dt == WIDE_DELTA:
+            high = dv
+        else:
+            deltas.append(dt)
+            values.append(dv)
+    return deltas, values
+
+
+def query_series(path, start, end, points):
+    """Return the min, max and time weighted mean of the samples in points buckets between start and end (ms)"""
+    width = max(1, (end - start) / points)
+    buckets = {}
+
+    def bucket_of(timestamp):
+        bucket = int((timestamp - start) // width)
+        return bucket + 1 if start + (bucket + 1) * width <= timestamp else bucket # Float rounding at the boundary
+
+    def add(bucket, minimum, maximum, weighted, weight):
+        values = buckets.get(bucket)
+        if values is None:
+            buckets[bucket] = [minimum, maximum, weighted, weight]
+        else:
+            if minimum < values[0]:
+                values[0] = minimum
+            if maximum > values[1]:
+                values[1] = maximum
+            values[2] += weighted
+            values[3] += weight
+
+    def hold(value, held_from, held_to):
+        """Add a value held between two times to the buckets it spans"""
+        held_from = max(held_from, start)
+        held_to = min(held_to, end)
+        while True:
+            bucket = bucket_of(held_from)
+            bucket_end = min(held_to, start + (bucket + 1) * width)
+            weight = max(0, bucket_end - held_from)
+            add(bucket, value, value, value * weight, weight)
+            if bucket_end >= held_to:
+                break
+            held_from = bucket_end
+
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < HEADER.size:
+            return []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            blocks = (size + BLOCK_SIZE - 1) // BLOCK_SIZE
+            # Last block starting before start, the value it holds is the one at start
+            first = bisect.bisect_right(range(blocks), start, key=lambda index: HEADER.unpack_from(data, index * BLOCK_SIZE)[0])
+            previous = None
+            for index in range(max(0, first - 1), blocks):
+                offset = index * BLOCK_SIZE
+                timestamp, value, count, duration, last, minimum, maximum, weighted = HEADER.unpack_from(data, offset)
+                if previous is not None and timestamp >= start:
+                    hold(previous[1], previous[0], timestamp) # Held until the first sample of the block
+                    previous = None
+                if timestamp > end:
+                    break
+                bucket = bucket_of(timestamp)
+                if timestamp >= start and timestamp + duration <= min(end, start + (bucket + 1) * width):
+                    # The whole block is in one bucket, its summary is enough
+                    add(bucket, minimum, maximum, weighted, duration)
+                    previous = (timestamp + duration, last)
+                    continue
+                # Sample times and values of the block, accumulated in C
+                deltas = memoryview(data)[offset + HEADER.size:offset + HEADER.size + count * DELTA.size]
+                time_deltas, changes = deltas.cast("H")[::2], deltas.cast("h")[1::2]
+                if WIDE_DELTA in time_deltas:
+                    time_deltas, changes = unescape(time_deltas, changes)
+                times = list(itertools.accumulate(time_deltas, initial=timestamp))
+                values = list(itertools.accumulate(changes, initial=value))
+                durations = list(map(operator.sub, times[1:], times[:-1]))
+                del time_deltas, changes # Views of the mmap, released before it is closed
+                deltas.release()
+                low = bisect.bisect_left(times, start)
+                high = bisect.bisect_right(times, end)
+                if low > 0:
+                    previous = (times[low - 1], values[low - 1])
+                if previous is not None and low < len(times):
+                    hold(previous[1], previous[0], times[low])
+                    previous = None
+                k = low
+                while k < high:
+                    bucket = bucket_of(times[k])
+                    j = bisect.bisect_left(times, start + (bucket + 1) * width, k, high)
+                    add(bucket, min(values[k:j]), max(values[k:j]), sum(map(operator.mul, values[k:j - 1], durations[k:j - 1])), times[j - 1] - times[k])
+                    if j < len(times):
+                        hold(values[j - 1], times[j - 1], times[j]) # Held across the bucket boundary
+                    else:
+                        previous = (times[j - 1], values[j - 1]) # Held until the next block
+                    k = j
+                if high < len(times): # End of the range
+                    previous = None
+                    break
+            if previous is not None and start <= previous[0] <= end:
+                hold(previous[1], previous[0], previous[0]) # Last sample, held for an unknown time
+
+    result = []
+    for bucket in sorted(buckets):
+        minimum, maximum, weighted, weight = buckets[bucket]
+        result.append({
+            "time": int(start + bucket * width),
+            "min": minimum,
+            "max": maximum,
+            "mean": round(weighted / weight, 1) if weight else (minimum + maximum) / 2,
+        })
+    return result
+
+
+class TimeSeriesRecorder:
+    """Series files of the recorded keys of every meter, under a base directory"""
+
+    def __init__(self, directory, keys, retention=None):
+        self.directory = directory
+        self.keys = frozenset(keys)
+        self.retention = retention # Seconds, None to keep every sample
+        self._series = {}
+        self._lock = threading.Lock() # Flushed by the timer, the query service and the stop listener in executor threads
+
+    def path(self, device_id, key):
+        return os.path.join(self.directory, device_id, f"{key}.bin")
+
+    def record(self, device_id, entities):
+        """Append the values of the changed entities of a frame"""
+        if device_id is None:
+            return
+        timestamp = time.time_ns() // 1_000_000
+        for entity in entities:
+            if entity.key in self.keys and isinstance(entity.state, int):
+                series = self._series.get((device_id, entity.key))
+                if series is None:
+                    series = self._series[(device_id, entity.key)] = SeriesFile(self.path(device_id, entity.key))
+                series.append(timestamp, entity.state)
+
+    def flush(self):
+        retention = self.retention and self.retention * 1000
+        now = time.time_ns() // 1_000_000
+        with self._lock: # A trim replaces the file another flush would be writing
+            for series in list(self._series.values()):
+                os.makedirs(os.path.dirname(series.path), exist_ok=True)
+                try:
+                    series.flush()
+                    if retention:
+                        series.trim(now - retention, retention // 4)
+                except OSError as e:
+                    logger.error(f"Unable to write time series {series.path}: {e}")
+
+    def query(self, device_id, key, start, end, points):
+        path = self.path(device_id, key)
+        if not os.path.exists(path):
+            return []
+        return query_series(path, start, end, points)
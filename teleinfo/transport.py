@@ -0,0 +1,198 @@
+import asyncio
+import collections
+import logging
+import socket
+import threading
+import time
+import urllib.parse
+
+from .const import NETWORK_CONNECT_TIMEOUT, NETWORK_KEEPALIVE, NETWORK_READ_SIZE
+from .framing import FrameSplitter
+
+logger = logging.getLogger(__name__)
+
+# Port of a capture file replayed instead of a serial port: replay:///path/to/capture?speed=10
+REPLAY_SCHEME = "replay"
+# Raw TCP stream of a remote serial port, ser2net raw mode or TIC bridge: socket://host:port
+SOCKET_SCHEME = "socket"
+# Remote serial port with its line settings: rfc2217://host:port, read with pyserial
+RFC2217_SCHEME = "rfc2217"
+
+# 7E1: start bit, 7 data bits, parity bit and stop bit
+BITS_PER_BYTE = 10
+
+
+def is_replay_port(port):
+    return port.startswith(f"{REPLAY_SCHEME}://")
+
+
+def is_socket_port(port):
+    return port.startswith(f"{SOCKET_SCHEME}://")
+
+
+def is_rfc2217_port(port):
+    return port.startswith(f"{RFC2217_SCHEME}://")
+
+
+def parse_socket_port(port):
+    url = urllib.parse.urlsplit(port)
+    if not url.hostname or not url.port:
+        raise ValueError(f"Invalid network port {port}, expected {SOCKET_SCHEME}://host:port")
+    return url.hostname, url.port
+
+
+def parse_replay_port(port):
+    url = urllib.parse.urlsplit(port)
+    query = urllib.parse.parse_qs(url.query)
+    speed = float(query.get("speed", ["1"])[0])
+    return url.path, speed
+
+
+class ReplayTransport(asyncio.ReadTransport):
+    """Feed a protocol with captured serial bytes at the line rate multiplied by speed"""
+
+    CHUNK_SIZE = 64
+
+    def __init__(self, loop, protocol, data, baudrate, speed=1.0):
+        super().__init__()
+        self._loop = loop
+        self._protocol = protocol
+        self._data = data
+        self._chunk_period = self.CHUNK_SIZE * BITS_PER_BYTE / baudrate / speed
+        self._closing = False
+        self._protocol.connection_made(self)
+        self._task = loop.create_task(self._replay())
+
+    async def _replay(self):
+        start = self._loop.time()
+        for index, offset in enumerate(range(0, len(self._data), self.CHUNK_SIZE)):
+            self._protocol.data_received(self._data[offset:offset + self.CHUNK_SIZE])
+            # Sleep until the chunk would have been received, without accumulating drift
+            await asyncio.sleep(max(0, start + (index + 1) * self._chunk_period - self._loop.time()))
+        logger.info("End of the replayed capture")
+        self.close()
+
+    def close(self):
+        if self._closing:
+            return
+        self._closing = True
+        if self._task is not asyncio.current_task():
+            self._task.cancel()
+        self._loop.call_soon(self._protocol.connection_lost, None)
+
+    def is_closing(self):
+        return self._closing
+
+
+def read_capture(path, size=-1):
+    with open(path, "rb") as f:
+        return f.read(size)
+
+
+async def create_replay_connection(loop, protocol_factory, port, baudrate):
+    path, speed = parse_replay_port(port)
+    data = await loop.run_in_executor(None, read_capture, path)
+    protocol = protocol_factory()
+    transport = ReplayTransport(loop, protocol, data, baudrate, speed)
+    return transport, protocol
+
+
+def tune_socket(sock):
+    """Low latency and early detection of a dead bridge on the socket of a network port"""
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    idle, interval, count = NETWORK_KEEPALIVE
+    # Keepalive timings are Linux options, the system defaults (hours) are kept elsewhere
+    for option, value in (("TCP_KEEPIDLE", idle), ("TCP_KEEPINTVL", interval), ("TCP_KEEPCNT", count)):
+        if hasattr(socket, option):
+            sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+
+
+async def create_socket_connection(loop, protocol_factory, port):
+    """Feed a protocol with the raw TCP stream of a socket:// port, like a serial port"""
+    host, tcp_port = parse_socket_port(port)
+    try:
+        transport, protocol = await asyncio.wait_for(loop.create_connection(protocol_factory, host, tcp_port), NETWORK_CONNECT_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise TimeoutError(f"No connection to {host}:{tcp_port} after {NETWORK_CONNECT_TIMEOUT}s") from None # An OSError like the other connection errors
+    tune_socket(transport.get_extra_info("socket"))
+    if hasattr(transport, "max_size"): # Selector transports recv max_size bytes at once
+        transport.max_size = NETWORK_READ_SIZE
+    return transport, protocol
+
+
+class SerialReaderThread:
+    """Read a serial port in a dedicated thread, off the event loop.
+
+    Frames are split and their checksums validated in the thread, only the
+    valid lines of each frame are handed to the loop through a bounded deque
+    drained by a single call_soon_threadsafe callback. A stalled loop delays
+    the frames instead of letting the kernel buffer overflow.
+    """
+
+    READ_SIZE = 4096
+    MAX_PENDING_FRAMES = 64 # About a minute of frames, the oldest are dropped beyond
+
+    def __init__(self, loop, serial_port, validator, callback, on_connection_lost=None):
+        """callback(valid_lines, invalid_lines, received) is called on the loop for each frame,
+        received being the time.perf_counter() of its ETX. on_connection_lost(exc) is called
+        on the loop if the port fails, e.g. the USB dongle is unplugged"""
+        self._loop = loop
+        self._serial = serial_port
+        self._validator = validator
+        self._callback = callback
+        self._on_connection_lost = on_connection_lost
+        self._pending = collections.deque(maxlen=self.MAX_PENDING_FRAMES) # Appended by the thread, drained on the loop
+        self._scheduled = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"teleinfo-{serial_port.port}", daemon=True)
+        self.splitter = FrameSplitter(self._on_frame)
+        self.read_bytes = 0
+        self.dropped_frames = 0
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        serial_port = self._serial
+        while not self._stop.is_set():
+            try:
+                # Wait for a byte up to the port timeout, then take everything received
+                data = serial_port.read(min(serial_port.in_waiting, self.READ_SIZE) or 1)
+            except OSError as e: # SerialException is an OSError
+                if not self._stop.is_set():
+                    logger.error(f"Serial reader of {serial_port.port} stopped: {e}")
+                    if self._on_connection_lost:
+                        self._loop.call_soon_threadsafe(self._on_connection_lost, e)
+                return
+            if data:
+                self.read_bytes += len(data)
+                self.splitter.feed(data)
+
+    def _on_frame(self, frame):
+        received = time.perf_counter()
+        lines = bytes(frame[1:-1]).split(b"\r\n")
+        valid_lines = []
+        invalid_lines = []
+        for line, valid in zip(lines, self._validator.validate(lines)):
+            (valid_lines if valid else invalid_lines).append(line)
+        if len(self._pending) == self._pending.maxlen: # The append drops the oldest frame
+            self.dropped_frames += 1
+        self._pending.append((valid_lines, invalid_lines, received))
+        if not self._scheduled:
+            self._scheduled = True
+            self._loop.call_soon_threadsafe(self._drain)
+
+    def _drain(self):
+        self._scheduled = False
+        pending = self._pending
+        while pending:
+            self._callback(*pending.popleft())
+
+    def close(self):
+        self._stop.set()
+        if hasattr(self._serial, "cancel_read"):
+            self._serial.cancel_read()
+        self._thread.join(timeout=1)
+        self._serial.close()
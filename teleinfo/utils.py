@@ -1,4 +1,10 @@
 
+def field_mask(position):
+    # Positions are bit ranges [start, end[ of the register, bit 0 being the least significant
+    width = position[1] - position[0] if len(position) > 1 else 1
+    return position[0], (1 << width) - 1
+
+
 class StatusRegisterParser:
 
     POSITION_CONTACT_SEC_POSITION = (0,)
@@ -21,112 +27,169 @@ class StatusRegisterParser:
     POSITION_PM = (30,32)
 
 
+    FIELDS = {
+        "contact_sec": field_mask(POSITION_CONTACT_SEC_POSITION),
+        "organe_coupure": field_mask(POSITION_ORGANE_COUPURE),
+        "cache_borne_distri": field_mask(POSITION_CACHE_BORNE_DISTRI),
+        "surtension": field_mask(POSITION_SURTENSION),
+        "depassement_puissance": field_mask(POSITION_DEPASEMENT_PUISSANCE),
+        "fonctionnement_prod_conso": field_mask(POSITION_FONCTIONNEMENT8PROD_CONSO),
+        "sens_energie_active": field_mask(POSITION_SENS_ENERGIE_ACTIVE),
+        "tarif_fourn": field_mask(POSITION_TARIF_FOURN),
+        "tarif_distri": field_mask(POSITION_TARIF_DISTRI),
+        "horloge_degrade": field_mask(POSITION_HORLOGE_DEGRADE),
+        "mode_teleinfo": field_mask(POSITION_MODE_TELEINFO),
+        "sortie_com_euridis": field_mask(POSITION_SORTIE_COM_EURIDIS),
+        "status_cpl": field_mask(POSITION_STATUS_CPL),
+        "synchro_cpl": field_mask(POSITION_SYNCHRO_CPL),
+        "couleur_jour": field_mask(POSITION_COULEUR_JOUR),
+        "couleur_demain": field_mask(POSITION_COULEUR_DEMAIN),
+        "preavis_pm": field_mask(POSITION_PREAVIS_PM),
+        "pm": field_mask(POSITION_PM),
+    }
+
     def __init__(self, status_str="") -> None:
         self._str = status_str
-        self._bits_str = ""
+        self._value = None
         if status_str:
             self.parse_str(status_str)
 
+    @property
+    def register(self):
+        return self._str
 
-    @staticmethod
-    def parse_value(position, str):
-        try:
-            if len(position) == 1:
-                val =str[position[0]]
-            else:
-                val = str[position[0]:position[1]]
-            return int(val, 2)
-        except ValueError:
-            pass
+    def field(self, name):
+        if self._value is not None:
+            shift, mask = self.FIELDS[name]
+            return (self._value >> shift) & mask
 
     @staticmethod
     def register_value(position):
+        shift, mask = field_mask(position)
         def decorator(func):
             @property
             def wrapper(self):
-                return self.parse_value(position, self._bits_str)
+                if self._value is not None:
+                    return (self._value >> shift) & mask
             return wrapper
         return decorator
 
     @register_value(POSITION_ORGANE_COUPURE)
     def organe_coupure(self):
-        return self._bits_str
+        pass
         
     @register_value(POSITION_CONTACT_SEC_POSITION)
     def contact_sec(self):
-        return self._bits_str
+        pass
     
     @register_value(POSITION_CACHE_BORNE_DISTRI)
     def cache_borne_distri(self):
-        return self._bits_str
+        pass
     
     @register_value(POSITION_SURTENSION)
     def surtension(self):
-        return self._bits_str
+        pass
     
     @register_value(POSITION_DEPASEMENT_PUISSANCE)
     def depassement_puissance(self):
-        return self._bits_str
+        pass
     
     @register_value(POSITION_FONCTIONNEMENT8PROD_CONSO)
     def fonctionnement_prod_conso(self):
-        return self._bits_str
+        pass
     
     @register_value(POSITION_SENS_ENERGIE_ACTIVE)
     def sens_energie_active(self):
-        return self._bits_str
+        pass
     
     @register_value(POSITION_TARIF_FOURN)
     def tarif_fourn(self):
-        return self._bits_str
+        pass
     
     @register_value(POSITION_TARIF_DISTRI)
     def tarif_distri(self):
-        return self._bits_str
+        pass
 
     @register_value(POSITION_HORLOGE_DEGRADE)
     def horloge_degrade(self):
-        return self._bits_str
+        pass
 
     @register_value(POSITION_MODE_TELEINFO)
     def mode_teleinfo(self):
-        return self._bits_str
+        pass
 
     @register_value(POSITION_SORTIE_COM_EURIDIS)
     def sortie_com_euridis(self):
-        return self._bits_str
+        pass
 
     @register_value(POSITION_STATUS_CPL)
     def status_cpl(self):
-        return self._bits_str
+        pass
 
     @register_value(POSITION_SYNCHRO_CPL)
     def synchro_cpl(self):
-        return self._bits_str
+        pass
 
     @register_value(POSITION_COULEUR_JOUR)
     def couleur_jour(self):
-        return self._bits_str
+        pass
 
     @register_value(POSITION_COULEUR_DEMAIN)
     def couleur_demain(self):
-        return self._bits_str
+        pass
 
     @register_value(POSITION_PREAVIS_PM)
     def preavis_pm(self):
-        return self._bits_str
+        pass
 
     @register_value(POSITION_PM)
     def pm(self):
-        return self._bits_str
+        pass
 
     def parse_str(self, s):
+        """Parse the hexadecimal register and return the names of the fields that changed"""
+        previous = self._value
+        self._value = int(s, 16)
         self._str = s
-        binary_string = ""
-        for char in self._str:
-            binary_string += bin(int(char,16))[2:].zfill(4)
-        s = binary_string[::-1] # Reverse the binary string order to map bits as listed in documentation
-        self._bits_str = s
+        if previous is None:
+            return list(self.FIELDS)
+        flipped = previous ^ self._value
+        if not flipped:
+            return []
+        return [name for name, (shift, mask) in self.FIELDS.items() if (flipped >> shift) & mask]
+
+
+class WriteThrottle:
+    """Rate limit the state writes of a frequently changing metric.
+
+    A value is not written while it stays within the deadband of the last
+    written value (absolute, or relative in percent, the largest applies),
+    and not sooner than min_interval seconds after the previous write.
+    """
+
+    def __init__(self, min_interval=0, deadband=0, relative_deadband=0):
+        self.min_interval = min_interval
+        self.deadband = deadband
+        self.relative_deadband = relative_deadband
+        self._last_value = None
+        self._last_write = None
+
+    def delay(self, value, now):
+        """Return None if value must not be written, else the seconds to wait before writing it"""
+        last = self._last_value
+        if last is not None:
+            try:
+                if abs(value - last) < max(self.deadband, abs(last) * self.relative_deadband / 100):
+                    return None
+            except TypeError:
+                pass # Not a number, only throttled by time
+        if self._last_write is None:
+            return 0
+        return max(0, self._last_write + self.min_interval - now)
+
+    def written(self, value, now):
+        self._last_value = value
+        self._last_write = now
 
 
 if __name__ == "__main__":